@@ -0,0 +1,123 @@
+"""
+Ready-to-send responses of the most popular searches.
+
+Scraper runs store the responses of the most frequent searches as a new
+generation of the precomputed_searches table (app.search.warmup). API
+processes check for a new generation every
+SEARCH_PRECOMPUTED_REFRESH_SECONDS and load it into memory, and searches
+for those queries (without facets) are answered from it with no query
+parsing or database work. Streamed searches for them send its parameters
+and results as their first page and read only the listings after it. A
+response is served until the next warm-up replaces it, so listings changed
+between scrapes by other means show up in it only then. A body answers the
+queries that lower-case to the query it was parsed from, as the parser reads
+them alike.
+"""
+
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import CallbackMetric
+from app.db.crud import get_precomputed_search_bodies, get_precomputed_search_generation
+from app.db.session import AsyncSessionLocal
+from app.search.warmup import dumps_json
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class PrecomputedSearches:
+    """
+    Precomputed search response bodies of the latest generation, by the lower-cased query parsed
+    """
+
+    def __init__(self):
+        self.generation: Optional[int] = None
+        self._bodies: Dict[str, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, query: str) -> Optional[bytes]:
+        """
+        Body of the response to query without its query member, counting the hit or miss
+        """
+        # Only queries reading as the text parsed; other spacing can parse differently
+        tail = self._bodies.get(query.lower())
+        if tail is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return tail
+
+    def get(self, query: str) -> Optional[bytes]:
+        """
+        Response body of a search for query, or None when it wasn't precomputed
+        """
+        tail = self._lookup(query)
+        if tail is None:
+            return None
+        return b'{"query":' + dumps_json(query) + b"," + tail
+
+    def get_search(self, query: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Search parameters and first page of results of query, or None when it wasn't precomputed
+        """
+        tail = self._lookup(query)
+        if tail is None:
+            return None
+        body = json.loads(b"{" + tail)
+        return body["parameters"], body["results"]
+
+    async def refresh(self, session: AsyncSession):
+        """
+        Load the latest generation if it changed
+        """
+        generation = await get_precomputed_search_generation(session)
+        if generation == self.generation:
+            return
+        bodies = await get_precomputed_search_bodies(generation, session) if generation is not None else {}
+        self._bodies = bodies
+        self.generation = generation
+        logger.info(f"Loaded {len(bodies)} precomputed searches of generation {generation}")
+
+    @property
+    def size(self) -> int:
+        return len(self._bodies)
+
+
+@lru_cache(maxsize=None)
+def get_precomputed_searches() -> PrecomputedSearches:
+    """
+    Precomputed searches shared by the process's requests
+    """
+    return PrecomputedSearches()
+
+
+CallbackMetric(
+    "nlstayfinder_precomputed_search_total",
+    "Searches answered from precomputed responses, and those computed",
+    "counter",
+    ["outcome"],
+    lambda: {
+        ("hit",): get_precomputed_searches().hits,
+        ("miss",): get_precomputed_searches().misses,
+    },
+)
+
+
+async def run_precomputed_refresh(searches: PrecomputedSearches, interval_seconds: float):
+    """
+    Load new generations of precomputed searches until cancelled
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await searches.refresh(session)
+        except Exception as e:
+            logger.error(f"Error loading precomputed searches: {str(e)}")
+        await asyncio.sleep(interval_seconds)
@@ -1,46 +1,236 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+import asyncio
+import json
+import logging
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Union
 
-from app.nlp.processor import NLPProcessor
-from app.db.crud import get_listings
+from app.api.precomputed import PrecomputedSearches, get_precomputed_searches
+from app.api.search import coalescing_stats, find_facets, find_listings, parse_query, stream_search_results
+from app.core.config import settings
+from app.core.export import encode_export, get_export_encoder
+from app.nlp.processor import NLPProcessor, get_nlp_processor
+from app.nlp.suggest import SuggestIndex, get_suggest_index
+from app.db.crud import (
+    claim_saved_search_matches,
+    create_saved_search,
+    deactivate_saved_search,
+    EXPORT_COLUMNS,
+    get_export_watermark,
+    listing_to_dict,
+    stream_listing_rows,
+)
 from app.db.models import Listing
+from app.db.session import get_db
+
+# Set up logging
+logger = logging.getLogger(__name__)
 
 api_router = APIRouter()
 
 @api_router.post("/search", response_model=Dict[str, Any])
-async def search_apartments(query: str):
+async def search_apartments(
+    query: str,
+    facets: bool = False,
+    nlp_processor: NLPProcessor = Depends(get_nlp_processor),
+    suggest_index: SuggestIndex = Depends(get_suggest_index),
+    precomputed_searches: PrecomputedSearches = Depends(get_precomputed_searches),
+):
     """
     Process natural language query and return matching apartments
+    
+    Popular searches are answered with the response precomputed after the
+    last scrape. Identical searches in flight at the same time share one
+    query parse and one database lookup. With facets, counts of all matching
+    listings by bedrooms, bathrooms, price bucket and city are included.
     """
     if not query:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Query cannot be empty",
         )
+    suggest_index.record_query(query)
     
-    # Process NLP query
-    nlp_processor = NLPProcessor()
-    search_params = nlp_processor.process_query(query)
+    if not facets:
+        body = precomputed_searches.get(query)
+        if body is not None:
+            return Response(body, media_type="application/json")
     
-    # Get listings from database
-    listings = await get_listings(search_params)
+    search_params = await parse_query(nlp_processor, query)
     
-    return {
+    # Get listings from database, filtering only on the parameters found
+    filters = {k: v for k, v in search_params.items() if v is not None}
+    if facets:
+        listings, facet_counts = await asyncio.gather(find_listings(filters), find_facets(filters))
+    else:
+        listings = await find_listings(filters)
+    
+    response = {
         "query": query,
         "parameters": search_params,
         "results": listings,
         "count": len(listings)
     }
+    if facets:
+        response["facets"] = facet_counts
+    return response
+
+def _format_event(event: Dict[str, Any], server_sent_events: bool) -> str:
+    """
+    Encode a stream event as an NDJSON line or a server-sent event
+    """
+    data = json.dumps(event, separators=(",", ":"))
+    if server_sent_events:
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+@api_router.api_route("/search/stream", methods=["GET", "POST"])
+async def stream_search_apartments(
+    request: Request,
+    query: str,
+    nlp_processor: NLPProcessor = Depends(get_nlp_processor),
+    session: AsyncSession = Depends(get_db),
+    suggest_index: SuggestIndex = Depends(get_suggest_index),
+    precomputed_searches: PrecomputedSearches = Depends(get_precomputed_searches),
+):
+    """
+    Process natural language query and stream matching apartments as they are read
+    
+    The response is NDJSON, or server-sent events when the client accepts
+    text/event-stream (GET is allowed for EventSource). Events are a
+    "parameters" event with the parsed query, "results" events with batches
+    of listings, then a "done" event with the total count, or an "error" event.
+    Popular searches send the parameters and first page precomputed after the
+    last scrape, and read only the listings after it.
+    """
+    if not query:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query cannot be empty",
+        )
+    
+    suggest_index.record_query(query)
+    server_sent_events = "text/event-stream" in request.headers.get("accept", "")
+    
+    async def events() -> AsyncIterator[str]:
+        first_page = None
+        precomputed = precomputed_searches.get_search(query)
+        if precomputed is not None:
+            search_params, first_page = precomputed
+        else:
+            search_params = await parse_query(nlp_processor, query)
+        yield _format_event({"type": "parameters", "query": query, "parameters": search_params}, server_sent_events)
+        
+        filters = {k: v for k, v in search_params.items() if v is not None}
+        count = 0
+        try:
+            async for listings in stream_search_results(
+                filters, session, limit=settings.SEARCH_STREAM_LIMIT, batch_size=settings.SEARCH_STREAM_BATCH_SIZE,
+                first_page=first_page,
+            ):
+                count += len(listings)
+                yield _format_event({"type": "results", "results": listings}, server_sent_events)
+        except Exception as e:
+            # Headers are already sent, so the failure is reported in the stream
+            logger.error(f"Error streaming search results for {query!r}: {str(e)}")
+            yield _format_event({"type": "error", "detail": "Search failed"}, server_sent_events)
+            return
+        
+        yield _format_event({"type": "done", "count": count}, server_sent_events)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if server_sent_events else "application/x-ndjson",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_router.get("/suggest", response_model=Dict[str, Any])
+async def suggest(
+    q: str = "",
+    limit: int = Query(settings.SUGGEST_LIMIT, ge=1),
+    suggest_index: SuggestIndex = Depends(get_suggest_index),
+):
+    """
+    Suggest locations and popular past searches for a partially typed query
+    """
+    return {"query": q, **suggest_index.suggest(q, min(limit, settings.SUGGEST_LIMIT))}
+
+@api_router.post("/saved-searches", response_model=Dict[str, Any], status_code=status.HTTP_201_CREATED)
+async def save_search(
+    query: str,
+    nlp_processor: NLPProcessor = Depends(get_nlp_processor),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Save a natural language search to be alerted of listings that match it
+    
+    Listings scraped after the search is saved are matched against the
+    parameters parsed from the query now. The response's token is only
+    returned here; reading alerts and deleting the search require it in the
+    X-Saved-Search-Token header.
+    """
+    if not query:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query cannot be empty",
+        )
+    
+    search_params = await parse_query(nlp_processor, query)
+    token = secrets.token_urlsafe(32)
+    saved_search = await create_saved_search(query, search_params, token, session)
+    return {"id": saved_search.id, "token": token, "query": query, "parameters": search_params}
 
-@api_router.get("/listings", response_model=List[Dict[str, Any]])
+@api_router.delete("/saved-searches/{saved_search_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_saved_search(
+    saved_search_id: int,
+    token: str = Header("", alias="X-Saved-Search-Token"),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Stop alerting a saved search
+    """
+    # A wrong token is answered like a missing search, so ids can't be probed
+    if not await deactivate_saved_search(saved_search_id, token, session):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Saved search not found")
+
+@api_router.get("/saved-searches/{saved_search_id}/alerts", response_model=Dict[str, Any])
+async def get_saved_search_alerts(
+    saved_search_id: int,
+    limit: int = Query(100, ge=1),
+    token: str = Header("", alias="X-Saved-Search-Token"),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Deliver the listings matched by a saved search since its alerts were last fetched
+    """
+    matches = await claim_saved_search_matches(saved_search_id, token, min(limit, 1000), session)
+    if matches is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Saved search not found")
+    return {
+        "saved_search_id": saved_search_id,
+        "alerts": [
+            {"matched_at": match.matched_at.isoformat(), "listing": listing_to_dict(listing)}
+            for match, listing in matches
+        ],
+    }
+
+@api_router.get("/listings", response_model=Union[List[Dict[str, Any]], Dict[str, Any]])
 async def get_all_listings(
     city: str = None,
     min_bedrooms: int = None,
     max_price: float = None,
-    limit: int = 10
+    limit: int = 10,
+    facets: bool = False,
 ):
     """
     Get apartment listings with optional filters
+    
+    With facets, the response is an object with the listings under "results"
+    and their facet counts under "facets", as in search responses.
     """
     search_params = {
         "city": city,
@@ -52,6 +242,88 @@ async def get_all_listings(
     search_params = {k: v for k, v in search_params.items() if v is not None}
     
     # Get listings from database
-    listings = await get_listings(search_params, limit=limit)
+    if facets:
+        listings, facet_counts = await asyncio.gather(
+            find_listings(search_params, limit=limit), find_facets(search_params)
+        )
+        return {"results": listings, "count": len(listings), "facets": facet_counts}
+    
+    return await find_listings(search_params, limit=limit)
+
+@api_router.get("/export")
+async def export_listings(
+    format: str = "csv",
+    since: datetime = None,
+    city: str = None,
+    state: str = None,
+    source: str = None,
+    min_price: float = None,
+    max_price: float = None,
+    min_bedrooms: int = None,
+    min_bathrooms: float = None,
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Download every listing matching the filters as CSV, NDJSON, an Arrow IPC stream or Parquet
+    
+    The file is streamed as listings are read, in update order, unavailable
+    listings and duplicates included. The X-Export-Watermark header is the
+    update time the export covers listings up to; passing it as since to the
+    next export fetches the listings updated from then on, each update once.
+    """
+    try:
+        encoder = get_export_encoder(format, EXPORT_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    filters = {
+        "city": city,
+        "state": state,
+        "source": source,
+        "min_price": min_price,
+        "max_price": max_price,
+        "min_bedrooms": min_bedrooms,
+        "min_bathrooms": min_bathrooms,
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    # Listings updated while the export runs, or just before, are left for the next one
+    until = get_export_watermark()
+    
+    async def chunks() -> AsyncIterator[bytes]:
+        batches = stream_listing_rows(filters, since, until, session, batch_size=settings.EXPORT_BATCH_SIZE)
+        try:
+            async for chunk in encode_export(batches, encoder):
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; aborting the response tells the client the file is incomplete
+            logger.error(f"Error exporting listings: {str(e)}")
+            raise
+    
+    headers = {
+        "Content-Disposition": f'attachment; filename="listings.{encoder.extension}"',
+        "X-Export-Watermark": until.isoformat(),
+    }
+    return StreamingResponse(chunks(), media_type=encoder.media_type, headers=headers)
+
+@api_router.get("/admin/scheduler", response_model=Dict[str, Any])
+async def get_scheduler_status(request: Request):
+    """
+    Get the next run and last run duration of each scraper source
+    """
+    scheduler = getattr(request.app.state, "scheduler", None)
+    if scheduler is None:
+        return {"enabled": False, "sources": []}
     
-    return listings 
\ No newline at end of file
+    return {
+        "enabled": True,
+        "running": scheduler.is_running,
+        "sources": scheduler.status()
+    }
+
+@api_router.get("/admin/coalescing", response_model=Dict[str, Any])
+async def get_coalescing_status():
+    """
+    Get how many search steps were executed and how many were coalesced into
+    an identical call already in flight
+    """
+    return {"enabled": settings.SEARCH_COALESCING, "steps": coalescing_stats()}
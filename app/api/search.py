@@ -0,0 +1,139 @@
+"""
+Search steps shared by identical concurrent requests.
+
+During traffic spikes many users send the same search at once. Query parsing
+is coalesced on the normalized query text and the listings lookup on its
+filters and limit, so a burst of identical searches costs one spaCy pass and
+one database round trip. Streamed searches share the first page lookup with
+/api/search, or send a precomputed first page; only listings past it are
+read per request. Facet counts are
+also cached per filter set for SEARCH_FACET_CACHE_SECONDS, since they change
+only as scrapes land.
+"""
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import CallbackMetric, timed
+from app.core.singleflight import SingleFlight
+from app.db.crud import get_listing_facets, get_listings, stream_listings
+from app.db.session import AsyncSessionLocal
+from app.search.warmup import RESULT_LIMIT
+
+query_flight = SingleFlight("parse_query")
+listings_flight = SingleFlight("get_listings")
+facets_flight = SingleFlight("get_listing_facets")
+
+facet_cache = TTLCache(settings.SEARCH_FACET_CACHE_SIZE, settings.SEARCH_FACET_CACHE_SECONDS)
+
+CallbackMetric(
+    "nlstayfinder_search_calls_total",
+    "Search steps executed, and calls coalesced into an identical step in flight",
+    "counter",
+    ["step", "outcome"],
+    lambda: {
+        (flight.name, outcome): getattr(flight, outcome)
+        for flight in (query_flight, listings_flight, facets_flight)
+        for outcome in ("executed", "coalesced")
+    },
+)
+CallbackMetric(
+    "nlstayfinder_facet_cache_total",
+    "Facet count lookups served from the cache and computed",
+    "counter",
+    ["outcome"],
+    lambda: {("hit",): facet_cache.hits, ("miss",): facet_cache.misses},
+)
+
+
+async def parse_query(nlp_processor, query: str) -> Dict[str, Any]:
+    """
+    Search parameters of a natural language query
+
+    The result is shared between callers and must not be modified.
+    """
+    # process_query lowercases the query itself
+    key = " ".join(query.lower().split())
+    # spaCy is CPU-bound, so it runs off the event loop
+    with timed("nlp"):
+        return await query_flight.do(key, lambda: run_in_threadpool(nlp_processor.process_query, query))
+
+
+async def find_listings(filters: Dict[str, Any], limit: int = RESULT_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Available listings matching search filters
+
+    The lookup uses its own session, since it can outlive the request that
+    started it. The result is shared between callers and must not be modified.
+    """
+    key = (tuple(sorted(filters.items())), limit)
+
+    async def lookup():
+        async with AsyncSessionLocal() as session:
+            return await get_listings(filters, session, limit=limit)
+
+    with timed("listings"):
+        return await listings_flight.do(key, lookup)
+
+
+async def stream_search_results(
+    filters: Dict[str, Any],
+    session: AsyncSession,
+    limit: int,
+    batch_size: int,
+    first_page: Optional[List[Dict[str, Any]]] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Available listings matching search filters in batches, up to limit
+
+    The first page is the coalesced lookup /api/search makes, so identical
+    streamed searches in flight share it, unless a precomputed first_page
+    is given; the listings after it are streamed from the request's own session.
+    """
+    if first_page is None:
+        first_page = await find_listings(filters, min(limit, RESULT_LIMIT))
+    else:
+        first_page = first_page[:limit]
+    for start in range(0, len(first_page), batch_size):
+        yield first_page[start:start + batch_size]
+    if len(first_page) < RESULT_LIMIT or limit <= RESULT_LIMIT:
+        return
+
+    async for listings in stream_listings(
+        filters, session, limit=limit - len(first_page), batch_size=batch_size,
+        exclude_ids=[listing["id"] for listing in first_page],
+    ):
+        yield listings
+
+
+async def find_facets(filters: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Counts of the listings matching search filters by bedrooms, bathrooms, price bucket and city
+
+    The result is shared between callers and must not be modified.
+    """
+    key = tuple(sorted(filters.items()))
+    facets = facet_cache.get(key)
+    if facets is not None:
+        return facets
+
+    async def lookup():
+        async with AsyncSessionLocal() as session:
+            facets = await get_listing_facets(
+                filters, settings.SEARCH_FACET_PRICE_EDGES, settings.SEARCH_FACET_CITY_LIMIT, session
+            )
+        facet_cache.set(key, facets)
+        return facets
+
+    return await facets_flight.do(key, lookup)
+
+
+def coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Executed, coalesced and in-flight counts of each coalesced step
+    """
+    return {flight.name: flight.stats() for flight in (query_flight, listings_flight, facets_flight)}
@@ -1,5 +1,5 @@
 import os
-from typing import List, Union
+from typing import Dict, List, Union
 from pydantic import BaseSettings, AnyHttpUrl, validator
 
 class Settings(BaseSettings):
@@ -7,6 +7,53 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "NLStayFinder"
     API_PREFIX: str = "/api"
     
+    # Let identical concurrent searches share one query parse and database lookup
+    SEARCH_COALESCING: bool = os.getenv("SEARCH_COALESCING", "true").lower() == "true"
+    # Most listings a streamed search returns, and listings per streamed batch
+    SEARCH_STREAM_LIMIT: int = int(os.getenv("SEARCH_STREAM_LIMIT", 1000))
+    SEARCH_STREAM_BATCH_SIZE: int = int(os.getenv("SEARCH_STREAM_BATCH_SIZE", 50))
+    # Facet counts of searches: price bucket edges, cities listed, and how long
+    # and for how many distinct filter sets they are cached
+    SEARCH_FACET_PRICE_EDGES: List[float] = [1000, 1500, 2000, 2500, 3000, 4000, 5000]
+    SEARCH_FACET_CITY_LIMIT: int = int(os.getenv("SEARCH_FACET_CITY_LIMIT", 20))
+    SEARCH_FACET_CACHE_SECONDS: float = float(os.getenv("SEARCH_FACET_CACHE_SECONDS", 300))
+    SEARCH_FACET_CACHE_SIZE: int = int(os.getenv("SEARCH_FACET_CACHE_SIZE", 4096))
+    # Searches whose responses are precomputed after each scrape: the most frequent
+    # (0 turns this off) of those searched at least SEARCH_WARMUP_MIN_COUNT times in the
+    # last SEARCH_WARMUP_DAYS days, and seconds between API checks for a new set
+    SEARCH_WARMUP_QUERIES: int = int(os.getenv("SEARCH_WARMUP_QUERIES", 200))
+    SEARCH_WARMUP_MIN_COUNT: int = int(os.getenv("SEARCH_WARMUP_MIN_COUNT", 2))
+    SEARCH_WARMUP_DAYS: float = float(os.getenv("SEARCH_WARMUP_DAYS", 7))
+    SEARCH_PRECOMPUTED_REFRESH_SECONDS: float = float(os.getenv("SEARCH_PRECOMPUTED_REFRESH_SECONDS", 30))
+    # Listings read per batch by exports, and rows per Parquet row group or Arrow record batch
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+    EXPORT_ROW_GROUP_SIZE: int = int(os.getenv("EXPORT_ROW_GROUP_SIZE", 100000))
+    # Suggestions returned per kind, seconds between index refreshes, and how
+    # often a past query must have been searched (and how many are kept) to be suggested
+    SUGGEST_LIMIT: int = int(os.getenv("SUGGEST_LIMIT", 8))
+    SUGGEST_REFRESH_SECONDS: float = float(os.getenv("SUGGEST_REFRESH_SECONDS", 60))
+    SUGGEST_MIN_QUERY_COUNT: int = int(os.getenv("SUGGEST_MIN_QUERY_COUNT", 2))
+    SUGGEST_MAX_QUERIES: int = int(os.getenv("SUGGEST_MAX_QUERIES", 10000))
+    # Match listings added or updated by scrapers against saved searches, and
+    # seconds between reloads of saved searches created or deleted elsewhere
+    SAVED_SEARCH_ALERTS: bool = os.getenv("SAVED_SEARCH_ALERTS", "true").lower() == "true"
+    SAVED_SEARCH_REFRESH_SECONDS: float = float(os.getenv("SAVED_SEARCH_REFRESH_SECONDS", 60))
+    # Incremental reads of rows changed since a watermark start this many seconds
+    # before it, so rows stamped before a slow commit (or by a clock behind) aren't missed
+    CHANGE_WATERMARK_LAG_SECONDS: float = float(os.getenv("CHANGE_WATERMARK_LAG_SECONDS", 300))
+    # Misspelled place names in queries are resolved within this many edits
+    # (fewer for short names), comparing the first LOCATION_PREFIX_LENGTH characters
+    # for candidates. An optional CSV of "name,weight" rows adds places beyond listing cities.
+    LOCATION_MAX_EDIT_DISTANCE: int = int(os.getenv("LOCATION_MAX_EDIT_DISTANCE", 2))
+    LOCATION_PREFIX_LENGTH: int = int(os.getenv("LOCATION_PREFIX_LENGTH", 7))
+    LOCATION_GAZETTEER_PATH: str = os.getenv("LOCATION_GAZETTEER_PATH", "")
+    # Save sampled stacks of requests slower than this many seconds (0 turns sampling off)
+    PROFILE_SLOW_REQUEST_SECONDS: float = float(os.getenv("PROFILE_SLOW_REQUEST_SECONDS", 0))
+    PROFILE_SAMPLE_INTERVAL: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+    PROFILE_OUTPUT_DIR: str = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+    # Responses smaller than this many bytes are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 500))
+    
     # CORS settings
     CORS_ORIGINS: List[AnyHttpUrl] = []
 
@@ -23,31 +70,84 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = os.getenv("POSTGRES_USER", "postgres")
     POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "postgres")
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "nlstayfinder")
-    SQLALCHEMY_DATABASE_URI: str = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}"
+    # DATABASE_URL overrides the Postgres settings, e.g. sqlite:///./nlstayfinder.db for local runs
+    SQLALCHEMY_DATABASE_URI: str = os.getenv(
+        "DATABASE_URL",
+        f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}/{POSTGRES_DB}",
+    )
+    # Set once listings and amenities are list partitioned by state (see
+    # migrations/); searches for a city then name its states so only their
+    # partitions are read, with the city's states reloaded this often
+    LISTINGS_PARTITIONED: bool = os.getenv("LISTINGS_PARTITIONED", "false").lower() == "true"
+    LISTINGS_PARTITION_REFRESH_SECONDS: float = float(os.getenv("LISTINGS_PARTITION_REFRESH_SECONDS", 300))
+    # Monthly listing history partitions created ahead of time (PostgreSQL only)
+    LISTING_HISTORY_MONTHS_AHEAD: int = int(os.getenv("LISTING_HISTORY_MONTHS_AHEAD", 3))
     
     # Scraper settings
     SCRAPER_INTERVAL_HOURS: int = int(os.getenv("SCRAPER_INTERVAL_HOURS", 24))
+    # Learn each city's change rate and divide the requests of crawling every city every
+    # SCRAPER_INTERVAL_HOURS among them to keep the most listings fresh, within the min/max bounds
+    SCRAPER_ADAPTIVE_INTERVALS: bool = os.getenv("SCRAPER_ADAPTIVE_INTERVALS", "true").lower() == "true"
+    SCRAPER_MIN_INTERVAL_HOURS: float = float(os.getenv("SCRAPER_MIN_INTERVAL_HOURS", 2))
+    SCRAPER_MAX_INTERVAL_HOURS: float = float(os.getenv("SCRAPER_MAX_INTERVAL_HOURS", 168))
+    # Weight of the latest crawl in the smoothed change rate
+    SCRAPER_CHANGE_RATE_SMOOTHING: float = float(os.getenv("SCRAPER_CHANGE_RATE_SMOOTHING", 0.3))
+    # Per-source overrides of the interval, e.g. {"zillow.com": 12}
+    SCRAPER_SOURCE_INTERVAL_HOURS: Dict[str, float] = {}
+    # Random delay added to each scheduled run so sources don't start in lockstep
+    SCRAPER_JITTER_SECONDS: float = float(os.getenv("SCRAPER_JITTER_SECONDS", 300))
+    # Scrapers allowed to run at the same time
+    SCRAPER_MAX_CONCURRENCY: int = int(os.getenv("SCRAPER_MAX_CONCURRENCY", 2))
+    # Seconds running scrapers get to finish on shutdown before they are cancelled
+    SCRAPER_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("SCRAPER_SHUTDOWN_GRACE_SECONDS", 30))
+    # Distributed scrape jobs: lease length, retry limit and base retry backoff in seconds
+    SCRAPER_JOB_LEASE_SECONDS: int = int(os.getenv("SCRAPER_JOB_LEASE_SECONDS", 300))
+    SCRAPER_JOB_MAX_ATTEMPTS: int = int(os.getenv("SCRAPER_JOB_MAX_ATTEMPTS", 5))
+    SCRAPER_JOB_BACKOFF_SECONDS: int = int(os.getenv("SCRAPER_JOB_BACKOFF_SECONDS", 60))
+    # Seconds an idle worker waits before looking for jobs again
+    SCRAPER_WORKER_POLL_SECONDS: float = float(os.getenv("SCRAPER_WORKER_POLL_SECONDS", 5))
+    # Run the scheduler inside the API process
+    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
     SCRAPER_URLS: List[str] = [
         "https://www.zillow.com/homes/for_rent/"
     ]
-    
-    # Zillow robots.txt rules to follow
-    ZILLOW_ROBOTS_RULES = {
-        "allowed_paths": [
-            "/homes/for_rent/",
-            "/homes/for_sale/",
-            "/apartments/"
-        ],
-        "disallowed_paths": [
-            "/homedetails/",
-            "/myzillow/",
-            "/profile/",
-            "/reviews/",
-            "/user/",
-            "/forum/"
-        ],
-        "crawl_delay": 5  # seconds between requests
-    }
+    # Cities to search for rentals, as "<city>-<state>" slugs
+    SCRAPER_CITIES: List[str] = [
+        "san-francisco-ca",
+        "los-angeles-ca",
+        "new-york-ny",
+        "chicago-il",
+        "seattle-wa",
+    ]
+    # HTML parser backend: "auto", "selectolax", "lxml" or "html.parser"
+    SCRAPER_PARSER_BACKEND: str = os.getenv("SCRAPER_PARSER_BACKEND", "auto")
+    # Processes used for parsing pages (0 parses in the event loop)
+    SCRAPER_PARSE_WORKERS: int = int(os.getenv("SCRAPER_PARSE_WORKERS", 2))
+    # Result pages fetched per city
+    SCRAPER_MAX_PAGES: int = int(os.getenv("SCRAPER_MAX_PAGES", 20))
+    # Scraped pages buffered ahead of the database writer
+    SCRAPER_QUEUE_SIZE: int = int(os.getenv("SCRAPER_QUEUE_SIZE", 4))
+    # Listings written per transaction
+    SCRAPER_BATCH_SIZE: int = int(os.getenv("SCRAPER_BATCH_SIZE", 100))
+    # Cross-source duplicate detection: MinHash signature length, LSH bands (which
+    # must divide it) and the estimated similarity above which listings are the same unit
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", 64))
+    DEDUP_BANDS: int = int(os.getenv("DEDUP_BANDS", 16))
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", 0.5))
+    # "live" fetches from the site, "record" also saves fetched pages and
+    # "replay" serves saved pages offline, from SCRAPER_RECORDINGS_DIR/<source>
+    SCRAPER_FETCH_MODE: str = os.getenv("SCRAPER_FETCH_MODE", "live")
+    SCRAPER_RECORDINGS_DIR: str = os.getenv("SCRAPER_RECORDINGS_DIR", "recordings")
+
+    # robots.txt files to follow and the product token matched against their User-agent groups
+    ZILLOW_ROBOTS_TXT: str = os.getenv(
+        "ZILLOW_ROBOTS_TXT",
+        os.path.join(os.path.dirname(os.path.dirname(__file__)), "scraper", "config", "robots.txt"),
+    )
+    SCRAPER_ROBOTS_AGENT: str = os.getenv("SCRAPER_ROBOTS_AGENT", "NLStayFinder")
+    # Seconds between requests when robots.txt sets no Crawl-delay
+    SCRAPER_CRAWL_DELAY: float = float(os.getenv("SCRAPER_CRAWL_DELAY", 5))
     
     # AWS settings
     AWS_ACCESS_KEY_ID: str = os.getenv("AWS_ACCESS_KEY_ID", "")
@@ -0,0 +1,238 @@
+"""
+Encoders for bulk listing exports.
+
+Exports are written batch by batch as rows are read from the database, so
+memory stays constant however many listings are exported. CSV and NDJSON
+encode each batch as it comes; Arrow IPC streams and Parquet files collect
+rows into record batches (row groups, for Parquet) of EXPORT_ROW_GROUP_SIZE
+rows, converted column by column, and hand over the bytes written for each
+one. Arrow and Parquet need the optional pyarrow package.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV and NDJSON are always available
+    pa = None
+
+# Arrow types of the export columns; the rest are strings
+ARROW_COLUMN_TYPES = {
+    "id": "int64",
+    "price": "float64",
+    "bedrooms": "int64",
+    "bathrooms": "float64",
+    "square_footage": "float64",
+    "latitude": "float64",
+    "longitude": "float64",
+    "is_available": "bool",
+    "canonical_id": "int64",
+    "created_at": "timestamp",
+    "updated_at": "timestamp",
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__} values")
+
+
+# One encoder for every row; json.dumps with options builds a new one per call
+_json_encoder = json.JSONEncoder(default=_json_default)
+
+
+class ExportEncoder:
+    """
+    Turns batches of row tuples into the bytes of an export file
+    """
+
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class CSVEncoder(ExportEncoder):
+    """
+    CSV with a header row; times are written as "YYYY-MM-DD HH:MM:SS[.ffffff]",
+    as PostgreSQL's COPY writes them
+    """
+
+    media_type = "text/csv"
+    extension = "csv"
+
+    def header(self) -> bytes:
+        return self.encode([self.columns])
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class NDJSONEncoder(ExportEncoder):
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        columns = self.columns
+        encode = _json_encoder.encode
+        return "".join([encode(dict(zip(columns, row))) + "\n" for row in rows]).encode()
+
+
+class _Sink(io.RawIOBase):
+    """
+    Write-only file that hands over what was written since the last drain,
+    while reporting the total written as its position
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _ArrowEncoder(ExportEncoder):
+    """
+    Collects rows into record batches of row_group_size rows
+    """
+
+    def __init__(self, columns: Sequence[str], row_group_size: int = None):
+        super().__init__(columns)
+        self.row_group_size = row_group_size or settings.EXPORT_ROW_GROUP_SIZE
+        self.schema = pa.schema([
+            (column, self._arrow_type(ARROW_COLUMN_TYPES.get(column, "string"))) for column in self.columns
+        ])
+        self._rows: List[tuple] = []
+        self._sink = _Sink()
+        self._writer = None
+
+    @staticmethod
+    def _arrow_type(name: str):
+        if name == "timestamp":
+            return pa.timestamp("us")
+        return getattr(pa, name)()
+
+    def _open_writer(self):
+        raise NotImplementedError
+
+    def _record_batch(self, rows: List[tuple]):
+        # Transposed once, so each column is converted to Arrow in one call
+        columns = list(zip(*rows))
+        return pa.record_batch(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+
+    def header(self) -> bytes:
+        self._writer = self._open_writer()
+        return self._sink.drain()
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        self._rows.extend(rows)
+        while len(self._rows) >= self.row_group_size:
+            self._writer.write_batch(self._record_batch(self._rows[:self.row_group_size]))
+            del self._rows[:self.row_group_size]
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        if self._rows:
+            self._writer.write_batch(self._record_batch(self._rows))
+            self._rows = []
+        self._writer.close()
+        return self._sink.drain()
+
+
+class ArrowEncoder(_ArrowEncoder):
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+
+    def _open_writer(self):
+        return pa.ipc.new_stream(self._sink, self.schema)
+
+
+class ParquetEncoder(_ArrowEncoder):
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def _open_writer(self):
+        return pq.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+
+EXPORT_ENCODERS: Dict[str, type] = {
+    "csv": CSVEncoder,
+    "ndjson": NDJSONEncoder,
+    "arrow": ArrowEncoder,
+    "parquet": ParquetEncoder,
+}
+
+
+def available_formats() -> List[str]:
+    return [name for name in EXPORT_ENCODERS if pa is not None or name not in ("arrow", "parquet")]
+
+
+def get_export_encoder(name: str, columns: Sequence[str], row_group_size: Optional[int] = None) -> ExportEncoder:
+    """
+    Encoder for an export format
+
+    Raises:
+        ValueError: for unknown formats, or Arrow and Parquet without pyarrow
+    """
+    if name not in available_formats():
+        raise ValueError(f"Unsupported export format {name!r}; available: {', '.join(available_formats())}")
+    encoder_class = EXPORT_ENCODERS[name]
+    if issubclass(encoder_class, _ArrowEncoder):
+        return encoder_class(columns, row_group_size)
+    return encoder_class(columns)
+
+
+async def encode_export(batches: AsyncIterator[List[tuple]], encoder: ExportEncoder) -> AsyncIterator[bytes]:
+    """
+    Bytes of an export file, yielded as each batch of rows is encoded
+    """
+    header = encoder.header()
+    if header:
+        yield header
+    async for rows in batches:
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
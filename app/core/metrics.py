@@ -0,0 +1,251 @@
+"""
+Latency histograms and counters in the Prometheus text format.
+
+Stages of request handling and scraping are timed with timed(), which
+records into a histogram and, during an HTTP request, into that request's
+Server-Timing header. MetricsMiddleware counts and times requests, adds the
+header, and hands requests slower than PROFILE_SLOW_REQUEST_SECONDS to the
+sampling profiler when it is enabled. Metrics are kept per process.
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+# Stage durations of the HTTP request being handled, in seconds
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry.append(self)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, per combination of label values
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        for labelvalues, value in sorted(self._values.items()):
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets, per combination of label values
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: [count per bucket (the last one +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        state = self._values.get(labelvalues)
+        if state is None:
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for labelvalues, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class CallbackMetric(_Metric):
+    """
+    Metric whose values are read from a callback when metrics are rendered
+
+    The callback returns a dict of label values tuples to values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Dict[Tuple[str, ...], float]],
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.type = metric_type
+        self.callback = callback
+
+    def samples(self):
+        for labelvalues, value in sorted(self.callback().items()):
+            yield self.name, _format_labels(self.labelnames, labelvalues), value
+
+
+def render_metrics() -> str:
+    """
+    Every registered metric in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "nlstayfinder_stage_seconds",
+    "Time spent in each stage of handling a search",
+    ["stage"],
+)
+SCRAPER_STAGE_SECONDS = Histogram(
+    "nlstayfinder_scraper_stage_seconds",
+    "Time spent fetching, parsing and ingesting result pages",
+    ["source", "stage"],
+)
+HTTP_REQUESTS = Counter(
+    "nlstayfinder_http_requests_total",
+    "HTTP requests handled, by handler and status code",
+    ["method", "handler", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "nlstayfinder_http_request_seconds",
+    "Time from receiving an HTTP request to sending its last byte",
+    ["handler"],
+)
+
+
+@contextmanager
+def timed(stage: str, histogram: Histogram = STAGE_SECONDS, *labelvalues: str):
+    """
+    Time a block into a histogram, labelled with the stage after any other
+    label values, and into the current request's Server-Timing header
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, *labelvalues, stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse that times encoding its content as the "render" stage
+    """
+
+    def render(self, content) -> bytes:
+        with timed("render"):
+            return super().render(content)
+
+
+def _handler_name(scope: Scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "none"
+    return getattr(endpoint, "__name__", type(endpoint).__name__)
+
+
+class MetricsMiddleware:
+    """
+    Count and time HTTP requests and report their stage timings in a Server-Timing header
+    """
+
+    def __init__(self, app: ASGIApp, profiler=None):
+        self.app = app
+        # SlowRequestProfiler, or None when profiling is off
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                metrics = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings.items()]
+                metrics.append(f"total;dur={(time.perf_counter() - started) * 1000:.2f}")
+                MutableHeaders(scope=message).append("server-timing", ", ".join(metrics))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            elapsed = time.perf_counter() - started
+            handler = _handler_name(scope)
+            HTTP_REQUESTS.inc(scope["method"], handler, str(status_code))
+            HTTP_REQUEST_SECONDS.observe(elapsed, handler)
+            if self.profiler is not None and elapsed >= self.profiler.threshold_seconds:
+                # Folding the samples and writing them out would otherwise block the event loop
+                await run_in_threadpool(self.profiler.capture, f"{scope['method']} {scope['path']}", started, elapsed)
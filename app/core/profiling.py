@@ -0,0 +1,117 @@
+"""
+Sampling profiler for slow requests.
+
+When PROFILE_SLOW_REQUEST_SECONDS is set, a background thread samples the
+stacks of every other thread (the event loop and the threadpool running
+spaCy) every PROFILE_SAMPLE_INTERVAL seconds into a ring buffer. Requests
+that take longer than the threshold get the samples taken while they ran
+written out as folded stacks, one "frame;frame;frame count" line per stack,
+ready for flamegraph.pl or speedscope. Other requests handled at the same
+time show up in the same samples.
+
+Nothing is sampled while the threshold is 0, the default.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Innermost frames kept per sampled stack
+MAX_STACK_DEPTH = 64
+
+
+def _folded_stack(frame) -> str:
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class SlowRequestProfiler:
+    """
+    Samples thread stacks continuously and saves those taken during slow requests
+    """
+
+    def __init__(self, threshold_seconds: float, interval_seconds: float, output_dir: str, buffer_seconds: float = 60):
+        self.threshold_seconds = threshold_seconds
+        self.interval_seconds = interval_seconds
+        self.output_dir = output_dir
+        # (perf_counter time, folded stacks of every thread) per sample
+        self._samples = deque(maxlen=max(int(buffer_seconds / interval_seconds), 1))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Profiling requests slower than {self.threshold_seconds}s "
+            f"every {self.interval_seconds * 1000:.0f}ms into {self.output_dir}"
+        )
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            stacks = [
+                _folded_stack(frame) for thread_id, frame in sys._current_frames().items() if thread_id != own_id
+            ]
+            self._samples.append((time.perf_counter(), stacks))
+
+    def capture(self, name: str, started: float, elapsed: float) -> Optional[str]:
+        """
+        Write the stacks sampled between started and started + elapsed (perf_counter times)
+
+        Returns:
+            Path of the folded stacks file, or None when no samples fell in the window
+        """
+        ended = started + elapsed
+        stacks = Counter(
+            stack
+            for sampled_at, sample in list(self._samples)
+            if started <= sampled_at <= ended
+            for stack in sample
+            # Idle threads are waiting in the selector or on the threadpool queue
+            if not stack.endswith(("selectors.py:select", "threading.py:wait", "queue.py:get"))
+        )
+        if not stacks:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = "".join(character if character.isalnum() else "_" for character in name).strip("_")
+        path = os.path.join(self.output_dir, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{slug}.folded")
+        with open(path, "w") as output:
+            output.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        logger.warning(f"Slow request {name} took {elapsed:.2f}s; profile written to {path}")
+        return path
+
+
+def get_slow_request_profiler() -> Optional[SlowRequestProfiler]:
+    """
+    Profiler configured by the settings, or None when slow request profiling is off
+    """
+    if settings.PROFILE_SLOW_REQUEST_SECONDS <= 0:
+        return None
+    return SlowRequestProfiler(
+        settings.PROFILE_SLOW_REQUEST_SECONDS,
+        settings.PROFILE_SAMPLE_INTERVAL,
+        settings.PROFILE_OUTPUT_DIR,
+    )
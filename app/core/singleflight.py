@@ -0,0 +1,62 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+While a call for a key is in flight, further calls for the same key wait for
+its result instead of starting their own. The call runs in its own task, so
+a caller that goes away (a client disconnecting) doesn't cancel it for the
+callers still waiting.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key, counting calls executed and coalesced
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0
+        self.coalesced = 0
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await call(), or the in-flight call for the same key if there is one
+        """
+        if not settings.SEARCH_COALESCING:
+            self.executed += 1
+            return await call()
+
+        task = self._calls.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Calls executed and coalesced so far, and calls in flight
+        """
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+        }
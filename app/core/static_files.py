@@ -0,0 +1,92 @@
+"""
+Static files with content-hash ETags and long-lived caching.
+
+Templates link static files through versioned_url(), which appends a hash of
+the file's content. Requests for the current version are cacheable for a year
+as immutable; any other request must revalidate, which the strong content ETag
+answers with 304 Not Modified when the file is unchanged.
+"""
+
+import hashlib
+import os
+from functools import lru_cache
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Content hash of a file, recomputed only when its mtime or size change
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as static_file:
+        for chunk in iter(lambda: static_file.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with content ETags and immutable caching of versioned URLs
+    """
+
+    def __init__(self, *args, mount_path: str = "/static", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mount_path = mount_path
+
+    def file_digest(self, full_path: str, stat_result: os.stat_result) -> str:
+        return _file_digest(str(full_path), stat_result.st_mtime_ns, stat_result.st_size)
+
+    def versioned_url(self, path: str) -> str:
+        """
+        URL of a static file with its content hash, for use in templates
+        """
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None:
+            return f"{self.mount_path}/{path}"
+        return f"{self.mount_path}/{path}?v={self.file_digest(full_path, stat_result)}"
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        digest = self.file_digest(full_path, stat_result)
+        version = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v", [None])[0]
+        headers = {
+            "etag": f'"{digest}"',
+            "cache-control": IMMUTABLE_CACHE_CONTROL if version == digest else REVALIDATE_CACHE_CONTROL,
+        }
+
+        request_headers = Headers(scope=scope)
+        if etag_matches(request_headers.get("if-none-match", ""), headers["etag"]):
+            return NotModifiedResponse(Headers(headers))
+        return FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, method=scope["method"], headers=headers
+        )
@@ -1,27 +1,76 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, and_
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from sqlalchemy import String, insert, update, delete, and_, case, cast, func, literal, or_, tuple_, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from typing import AsyncIterator, Dict, Iterable, List, Any, Optional, Set, Tuple
+from collections import defaultdict
+from datetime import datetime, timedelta
+import hashlib
 
-from app.db.models import Listing, Amenity, ScraperLog
+from app.core.config import settings
+from app.core.metrics import timed
+from app.db.models import (
+    Listing, Amenity, ListingLSHBucket, ScraperLog, ScraperCheckpoint, ScrapeJob, HostRateLimit, CityCrawlStats,
+    SearchQuery, SavedSearch, SavedSearchMatch, ListingHistory, PrecomputedSearch,
+)
+from app.db.partitions import get_city_states
+from app.db.records import ListingRecord, listing_rows
 
-async def get_listings(
-    filters: Dict[str, Any],
-    session: AsyncSession = None,
-    limit: int = 100
-) -> List[Dict[str, Any]]:
-    """
-    Get apartment listings with optional filters
+# Scraped fields compared to decide whether an existing listing changed
+LISTING_TRACKED_FIELDS = (
+    "title", "price", "address", "bedrooms", "bathrooms", "square_footage", "image_url", "is_available"
+)
+
+# Fields a listing's duplicate signature is built from; changing one signs it again
+LISTING_DEDUP_FIELDS = ("title", "price", "address", "bedrooms", "square_footage")
+
+# Search parameters stored with a saved search
+SAVED_SEARCH_FIELDS = ("city", "min_bedrooms", "min_bathrooms", "min_price", "max_price")
+
+def _shown_listings_condition():
     """
-    query = select(Listing).where(Listing.is_available == True)
+    Condition for the listings search returns: one available listing per unit
     
-    # Apply filters
+    Duplicates of a unit are hidden behind its canonical listing, which has the
+    lowest id of the unit's listings, while it is available. Once it isn't, the
+    unit's oldest available duplicate stands in for it.
+    """
+    # Named, so query plans tell its scans from the search's own
+    other = aliased(Listing, name="older_listings")
+    unit = func.coalesce(Listing.canonical_id, Listing.id)
+    older_available = (
+        select(other.id)
+        .where(
+            other.is_available == True,
+            other.id < Listing.id,
+            # Two index lookups, by id and canonical_id, rather than a scan of coalesce(...)
+            or_(other.id == unit, other.canonical_id == unit),
+        )
+        .exists()
+    )
+    return and_(Listing.is_available == True, ~older_available)
+
+def _available_listings_query(filters: Dict[str, Any]):
+    """
+    Query for available listings matching search filters, one per unit
+    """
+    query = select(Listing).where(_shown_listings_condition())
+    return filter_listings_query(query, filters)
+
+def filter_listings_query(query, filters: Dict[str, Any]):
+    """
+    Restrict a query over listings to those matching search filters
+    """
     if "city" in filters:
         query = query.where(Listing.city.ilike(f"%{filters['city']}%"))
     
     if "state" in filters:
-        query = query.where(Listing.state == filters["state"])
+        # A list of states when the partition key was added for a city
+        if isinstance(filters["state"], list):
+            query = query.where(Listing.state.in_(filters["state"]))
+        else:
+            query = query.where(Listing.state == filters["state"])
     
     if "min_price" in filters:
         query = query.where(Listing.price >= filters["min_price"])
@@ -35,35 +84,243 @@ async def get_listings(
     if "min_bathrooms" in filters:
         query = query.where(Listing.bathrooms >= filters["min_bathrooms"])
     
-    # Apply limit
-    query = query.limit(limit)
+    return query
+
+async def _with_partition_key(filters: Dict[str, Any], session: AsyncSession) -> Dict[str, Any]:
+    """
+    Add the states of the searched city to filters when listings are
+    partitioned by state, so only those states' partitions are read
+    """
+    if not settings.LISTINGS_PARTITIONED or "city" not in filters or "state" in filters:
+        return filters
+    
+    city_states = get_city_states()
+    if city_states.refresh_due(settings.LISTINGS_PARTITION_REFRESH_SECONDS):
+        await city_states.refresh(session)
+    states = city_states.states_for(filters["city"])
+    return filters if states is None else {**filters, "state": states}
+
+def listing_to_dict(listing: Listing) -> Dict[str, Any]:
+    """
+    Convert a listing to its API representation
+    """
+    return {
+        "id": listing.id,
+        "title": listing.title,
+        "description": listing.description,
+        "url": listing.url,
+        "price": listing.price,
+        "bedrooms": listing.bedrooms,
+        "bathrooms": listing.bathrooms,
+        "square_footage": listing.square_footage,
+        "address": listing.address,
+        "city": listing.city,
+        "state": listing.state,
+        "zip_code": listing.zip_code,
+        "image_url": listing.image_url,
+        "source": listing.source,
+        "created_at": listing.created_at.isoformat(),
+        "updated_at": listing.updated_at.isoformat(),
+    }
+
+async def get_listings(
+    filters: Dict[str, Any],
+    session: AsyncSession = None,
+    limit: int = 100
+) -> List[Dict[str, Any]]:
+    """
+    Get apartment listings with optional filters
+    """
+    filters = await _with_partition_key(filters, session)
+    query = _available_listings_query(filters).limit(limit)
     
     # Execute query
-    result = await session.execute(query)
-    listings = result.scalars().all()
+    with timed("sql"):
+        result = await session.execute(query)
+    with timed("orm"):
+        listings = result.scalars().all()
     
     # Convert to dictionary
-    return [
-        {
-            "id": listing.id,
-            "title": listing.title,
-            "description": listing.description,
-            "url": listing.url,
-            "price": listing.price,
-            "bedrooms": listing.bedrooms,
-            "bathrooms": listing.bathrooms,
-            "square_footage": listing.square_footage,
-            "address": listing.address,
-            "city": listing.city,
-            "state": listing.state,
-            "zip_code": listing.zip_code,
-            "image_url": listing.image_url,
-            "source": listing.source,
-            "created_at": listing.created_at.isoformat(),
-            "updated_at": listing.updated_at.isoformat(),
-        }
-        for listing in listings
+    with timed("to_dict"):
+        return [listing_to_dict(listing) for listing in listings]
+
+# Listing columns counted by value in search facets
+FACET_COLUMNS = ("bedrooms", "bathrooms", "city")
+
+def _facet_rows_query(filters: Dict[str, Any], price_edges: List[float], dialect: str):
+    """
+    Query for (facet, value, count) rows of listings matching search filters
+
+    Price values are bucket numbers: bucket i holds prices below price_edges[i]
+    and at or above the edge before it, the last bucket everything above.
+    """
+    price_bucket = case(
+        *((Listing.price < edge, index) for index, edge in enumerate(price_edges)),
+        else_=len(price_edges),
+    )
+    matching = (
+        _available_listings_query(filters)
+        .with_only_columns(*(getattr(Listing, column) for column in FACET_COLUMNS), price_bucket.label("price"))
+        .cte("matching")
+    )
+    columns = [matching.c[column] for column in FACET_COLUMNS + ("price",)]
+
+    if dialect == "postgresql":
+        # One grouping per facet over a single scan. GROUPING() tells the sets
+        # apart: its bitmask marks every column except the one grouped on.
+        grouping = func.grouping(*columns)
+        masks = [(1 << len(columns)) - 1 - (1 << (len(columns) - 1 - index)) for index in range(len(columns))]
+        return (
+            select(
+                case(*((grouping == mask, column.name) for mask, column in zip(masks, columns))),
+                case(*((grouping == mask, cast(column, String)) for mask, column in zip(masks, columns))),
+                func.count(),
+            )
+            .select_from(matching)
+            .group_by(func.grouping_sets(*(tuple_(column) for column in columns)))
+        )
+
+    # Elsewhere the facets are unioned over the same CTE, still one statement
+    return union_all(*(
+        select(literal(column.name), cast(column, String), func.count())
+        .select_from(matching)
+        .group_by(column)
+        for column in columns
+    ))
+
+async def get_listing_facets(
+    filters: Dict[str, Any],
+    price_edges: List[float],
+    city_limit: int = 20,
+    session: AsyncSession = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Count listings matching search filters by bedrooms, bathrooms, price bucket and city in one query
+    
+    Returns:
+        Facet values with their counts, bedrooms and bathrooms ascending, price
+        buckets as min/max ranges, and the city_limit cities with the most listings
+    """
+    dialect = session.bind.dialect.name
+    filters = await _with_partition_key(filters, session)
+    with timed("facets"):
+        rows = (await session.execute(_facet_rows_query(filters, price_edges, dialect))).all()
+    
+    values = defaultdict(list)
+    for facet, value, count in rows:
+        if value is not None:
+            values[facet].append((value, count))
+    
+    facets = {
+        "bedrooms": [
+            {"value": int(value), "count": count}
+            for value, count in sorted(values["bedrooms"], key=lambda item: float(item[0]))
+        ],
+        "bathrooms": [
+            {"value": float(value), "count": count}
+            for value, count in sorted(values["bathrooms"], key=lambda item: float(item[0]))
+        ],
+    }
+    edges = [None] + list(price_edges) + [None]
+    facets["price"] = [
+        {"min": edges[bucket], "max": edges[bucket + 1], "count": count}
+        for bucket, count in sorted((int(value), count) for value, count in values["price"])
+    ]
+    facets["city"] = [
+        {"value": city, "count": count}
+        for city, count in sorted(values["city"], key=lambda item: (-item[1], item[0]))[:city_limit]
     ]
+    return facets
+
+async def stream_listings(
+    filters: Dict[str, Any],
+    session: AsyncSession = None,
+    limit: int = 1000,
+    batch_size: int = 50,
+    exclude_ids: Iterable[int] = ()
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield apartment listings with optional filters in batches, as they are read
+    
+    Rows come from a server-side cursor, so the first batch is available
+    before the rest of the result set has been fetched. Listings in
+    exclude_ids, already sent, are skipped.
+    """
+    filters = await _with_partition_key(filters, session)
+    query = _available_listings_query(filters)
+    exclude_ids = list(exclude_ids)
+    if exclude_ids:
+        query = query.where(Listing.id.notin_(exclude_ids))
+    query = query.limit(limit).execution_options(yield_per=batch_size)
+    result = await session.stream_scalars(query)
+    try:
+        async for listings in result.partitions(batch_size):
+            yield [listing_to_dict(listing) for listing in listings]
+    finally:
+        # Release the cursor if the client goes away mid-stream
+        await result.close()
+
+# Listing columns written by bulk exports, in order
+EXPORT_COLUMNS = (
+    "id", "title", "description", "url", "price", "bedrooms", "bathrooms", "square_footage", "address", "city",
+    "state", "zip_code", "latitude", "longitude", "image_url", "source", "is_available", "canonical_id",
+    "created_at", "updated_at",
+)
+
+def get_change_watermark() -> datetime:
+    """
+    Watermark for the next incremental read of rows changed after a read starting now
+    
+    Rows are stamped before the transaction that writes them commits, so
+    those stamped in the last CHANGE_WATERMARK_LAG_SECONDS may not be visible
+    yet. The next read starts that far back and reads them then; rows within
+    the lag are read more than once.
+    """
+    return datetime.utcnow() - timedelta(seconds=settings.CHANGE_WATERMARK_LAG_SECONDS)
+
+def get_export_watermark() -> datetime:
+    """
+    Update time an export starting now covers listings up to (excluded)
+    
+    Listings stamped later may not be visible yet (see get_change_watermark);
+    they are left for the next export, which starts at this watermark.
+    """
+    return get_change_watermark()
+
+async def stream_listing_rows(
+    filters: Dict[str, Any],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    session: AsyncSession = None,
+    batch_size: int = 5000
+) -> AsyncIterator[List[tuple]]:
+    """
+    Yield every listing matching search filters as tuples of EXPORT_COLUMNS, in batches
+    
+    Unlike searches, unavailable listings and duplicates are included. With
+    since and until, only listings updated at or after since and before until
+    are read, so consecutive exports with one's until as the next one's since
+    cover every update once. Rows come from a server-side cursor in update
+    order, through the session's connection so they stay plain tuples without
+    ORM loading.
+    """
+    filters = await _with_partition_key(filters, session)
+    query = filter_listings_query(select(*(getattr(Listing, column) for column in EXPORT_COLUMNS)), filters)
+    if "source" in filters:
+        query = query.where(Listing.source == filters["source"])
+    if since is not None:
+        query = query.where(Listing.updated_at >= since)
+    if until is not None:
+        query = query.where(Listing.updated_at < until)
+    query = query.order_by(Listing.updated_at, Listing.id).execution_options(yield_per=batch_size)
+    
+    connection = await session.connection()
+    result = await connection.stream(query)
+    try:
+        async for rows in result.partitions(batch_size):
+            yield rows
+    finally:
+        await result.close()
 
 async def create_listing(
     listing_data: Dict[str, Any],
@@ -87,24 +344,302 @@ async def create_listing(
     await session.refresh(listing)
     return listing
 
+async def _add_listings(records: List[ListingRecord], now: datetime, session: AsyncSession) -> List[Listing]:
+    """
+    Insert a batch of listings and their amenities, created at now, without committing
+    
+    Rows are inserted in bulk with their ids returned, in the order of the
+    records, bypassing the session's per-object flush.
+    """
+    result = await session.scalars(
+        insert(Listing).returning(Listing, sort_by_parameter_order=True),
+        listing_rows(records, now),
+    )
+    listings = result.all()
+    
+    # Add amenities now that listing ids are assigned
+    amenities = [
+        {"listing_id": listing.id, "name": amenity_name, "state": listing.state}
+        for listing, record in zip(listings, records)
+        for amenity_name in record.amenities
+    ]
+    if amenities:
+        await session.execute(insert(Amenity), amenities)
+    return listings
+
+async def create_listings(
+    records: List[ListingRecord],
+    session: AsyncSession = None
+) -> List[Listing]:
+    """
+    Create a batch of apartment listings in a single transaction
+    """
+    listings = await _add_listings(records, datetime.utcnow(), session)
+    await session.commit()
+    return listings
+
+def _history_row(
+    listing_id: int,
+    recorded_at: datetime,
+    price: float,
+    is_available: Optional[bool],
+    previous_price: Optional[float] = None
+) -> Dict[str, Any]:
+    return {
+        "listing_id": listing_id,
+        "recorded_at": recorded_at,
+        "price": price,
+        "previous_price": previous_price,
+        "is_available": is_available,
+    }
+
+async def _get_listings_by_url(by_url: Dict[str, ListingRecord], session: AsyncSession) -> Dict[str, Listing]:
+    """
+    Get the existing listings of scraped records, keyed by URL
+    
+    When listings are partitioned by state, URLs are looked up in the
+    partition of their scraped state, one lookup per state, and only those
+    not found there in every partition, in case a listing's state changed.
+    """
+    if not settings.LISTINGS_PARTITIONED:
+        result = await session.execute(select(Listing).where(Listing.url.in_(list(by_url))))
+        return {listing.url: listing for listing in result.scalars().all()}
+    
+    by_state = defaultdict(list)
+    for url, record in by_url.items():
+        by_state[record.state].append(url)
+    
+    existing = {}
+    for state, urls in by_state.items():
+        in_partition = Listing.state.is_(None) if state is None else Listing.state == state
+        result = await session.execute(select(Listing).where(in_partition, Listing.url.in_(urls)))
+        existing.update((listing.url, listing) for listing in result.scalars().all())
+    
+    missing = [url for url in by_url if url not in existing]
+    if missing:
+        result = await session.execute(select(Listing).where(Listing.url.in_(missing)))
+        existing.update((listing.url, listing) for listing in result.scalars().all())
+    return existing
+
+async def upsert_listings(
+    records: List[ListingRecord],
+    session: AsyncSession = None,
+    changed: Optional[List[Listing]] = None
+) -> Dict[str, int]:
+    """
+    Create new listings and update existing ones, matched by URL
+    
+    Existing listings are only written when a tracked field changed. Listings
+    created or updated are appended to changed, when given. New listings, and
+    changes of price or availability, are appended to the listing history in
+    the same transaction.
+    
+    Returns:
+        Counts of added, updated and unchanged listings
+    """
+    # Later duplicates of a URL within the batch win
+    by_url = {record.url: record for record in records}
+    existing = await _get_listings_by_url(by_url, session)
+    
+    counts = {"added": 0, "updated": 0, "unchanged": 0}
+    new_listings = []
+    history = []
+    now = datetime.utcnow()
+    for url, record in by_url.items():
+        listing = existing.get(url)
+        if listing is None:
+            new_listings.append(record)
+            continue
+        
+        changes = {
+            field: getattr(record, field)
+            for field in LISTING_TRACKED_FIELDS
+            if getattr(listing, field) != getattr(record, field)
+        }
+        if changes:
+            if "price" in changes or "is_available" in changes:
+                history.append(_history_row(
+                    listing.id, now, changes.get("price", listing.price), changes.get("is_available", listing.is_available),
+                    previous_price=listing.price if "price" in changes else None,
+                ))
+            for field, value in changes.items():
+                setattr(listing, field, value)
+            listing.updated_at = now
+            if any(field in changes for field in LISTING_DEDUP_FIELDS):
+                listing.minhash = None
+            counts["updated"] += 1
+            if changed is not None:
+                changed.append(listing)
+        else:
+            counts["unchanged"] += 1
+    
+    if new_listings:
+        if settings.LISTINGS_PARTITIONED:
+            # Rows of one partition after another
+            new_listings.sort(key=lambda record: record.state or "")
+        created = await _add_listings(new_listings, now, session)
+        history.extend(_history_row(listing.id, now, listing.price, listing.is_available) for listing in created)
+        counts["added"] = len(new_listings)
+        if changed is not None:
+            changed.extend(created)
+    if history:
+        await session.execute(insert(ListingHistory), history)
+    await session.commit()
+    return counts
+
+async def get_undeduplicated_listings(limit: int, session: AsyncSession = None) -> List[Listing]:
+    """
+    Get listings that have no duplicate signature yet, oldest first
+    """
+    result = await session.execute(
+        select(Listing).where(Listing.minhash.is_(None)).order_by(Listing.id).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_lsh_bucket_matches(
+    buckets: Iterable[Tuple[int, int]],
+    session: AsyncSession = None
+) -> List[Tuple[int, int, int]]:
+    """
+    Get (listing_id, band, bucket) rows of every listing sharing one of the LSH keys
+    """
+    by_band = defaultdict(set)
+    for band, bucket in buckets:
+        by_band[band].add(bucket)
+    if not by_band:
+        return []
+    
+    # One bucket list per band keeps the lookup on the (band, bucket) index
+    # and the expression shallow, unlike a row-value IN or a flat OR per key
+    result = await session.execute(
+        select(ListingLSHBucket.listing_id, ListingLSHBucket.band, ListingLSHBucket.bucket)
+        .where(or_(*[
+            and_(ListingLSHBucket.band == band, ListingLSHBucket.bucket.in_(list(band_buckets)))
+            for band, band_buckets in by_band.items()
+        ]))
+    )
+    return result.all()
+
+async def get_listings_by_id(listing_ids: Iterable[int], session: AsyncSession = None) -> Dict[int, Listing]:
+    """
+    Get listings keyed by id
+    """
+    listing_ids = list(listing_ids)
+    if not listing_ids:
+        return {}
+    result = await session.execute(select(Listing).where(Listing.id.in_(listing_ids)))
+    return {listing.id: listing for listing in result.scalars().all()}
+
+async def get_shown_listing_ids(listing_ids: Iterable[int], session: AsyncSession = None) -> Set[int]:
+    """
+    Get the ids, among listing_ids, of listings search returns
+    """
+    listing_ids = list(listing_ids)
+    if not listing_ids:
+        return set()
+    result = await session.execute(select(Listing.id).where(Listing.id.in_(listing_ids), _shown_listings_condition()))
+    return set(result.scalars().all())
+
+async def replace_lsh_buckets(
+    buckets_by_listing: Dict[int, List[Tuple[int, int]]],
+    session: AsyncSession = None
+):
+    """
+    Replace the LSH (band, bucket) keys of listings, without committing
+    """
+    await session.execute(
+        delete(ListingLSHBucket).where(ListingLSHBucket.listing_id.in_(list(buckets_by_listing)))
+    )
+    rows = [
+        {"listing_id": listing_id, "band": band, "bucket": bucket}
+        for listing_id, buckets in buckets_by_listing.items()
+        for band, bucket in buckets
+    ]
+    if rows:
+        await session.execute(insert(ListingLSHBucket), rows)
+
 async def update_listing(
     listing_id: int,
     listing_data: Dict[str, Any],
     session: AsyncSession = None
 ) -> bool:
     """
-    Update an existing apartment listing
+    Update an existing apartment listing, recording changes of price or availability in its history
     """
+    now = datetime.utcnow()
+    if "price" in listing_data or "is_available" in listing_data:
+        current = (await session.execute(
+            select(Listing.price, Listing.is_available).where(Listing.id == listing_id)
+        )).first()
+        if current is not None:
+            price = listing_data.get("price", current.price)
+            is_available = listing_data.get("is_available", current.is_available)
+            if price != current.price or is_available != current.is_available:
+                await session.execute(insert(ListingHistory), [_history_row(
+                    listing_id, now, price, is_available,
+                    previous_price=current.price if price != current.price else None,
+                )])
+    
     stmt = (
         update(Listing)
         .where(Listing.id == listing_id)
         .values(**listing_data)
-        .values(updated_at=datetime.utcnow())
+        .values(updated_at=now)
     )
     result = await session.execute(stmt)
     await session.commit()
     return result.rowcount > 0
 
+async def get_listing_history(listing_id: int, session: AsyncSession = None) -> List[ListingHistory]:
+    """
+    Get the price and availability changes of a listing, oldest first
+    """
+    result = await session.execute(
+        select(ListingHistory).where(ListingHistory.listing_id == listing_id).order_by(ListingHistory.recorded_at)
+    )
+    return result.scalars().all()
+
+async def get_price_drops(
+    min_drop: float,
+    days: float,
+    limit: int = 100,
+    session: AsyncSession = None
+) -> List[Tuple[Listing, float]]:
+    """
+    Get available listings whose price is now at least min_drop (a fraction,
+    0.1 for 10%) below their highest price of the last days, largest drops first
+    
+    The highest earlier price is the largest previous price among the price
+    changes recorded in the period, so only the history of those days is read,
+    from the covering index of price changes (and only their partitions, on
+    PostgreSQL).
+    
+    Returns:
+        (listing, highest earlier price) pairs
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    peaks = (
+        select(ListingHistory.listing_id, func.max(ListingHistory.previous_price).label("peak_price"))
+        .where(ListingHistory.recorded_at >= cutoff, ListingHistory.previous_price.is_not(None))
+        .group_by(ListingHistory.listing_id)
+        # SQLite otherwise walks the primary key for its listing_id order, reading all history
+        .with_hint(ListingHistory, "INDEXED BY ix_listing_history_price_changes", "sqlite")
+        .subquery()
+    )
+    query = (
+        select(Listing, peaks.c.peak_price)
+        .join(peaks, peaks.c.listing_id == Listing.id)
+        .where(
+            _shown_listings_condition(),
+            Listing.price <= peaks.c.peak_price * (1 - min_drop),
+        )
+        .order_by((Listing.price / peaks.c.peak_price).asc(), Listing.id)
+        .limit(limit)
+    )
+    with timed("price_drops"):
+        result = await session.execute(query)
+    return result.all()
+
 async def create_scraper_log(
     log_data: Dict[str, Any],
     session: AsyncSession = None
@@ -116,4 +651,566 @@ async def create_scraper_log(
     session.add(log)
     await session.commit()
     await session.refresh(log)
-    return log 
\ No newline at end of file
+    return log 
+
+async def get_scraper_checkpoint(
+    source: str,
+    session: AsyncSession = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Get the checkpoint of an unfinished scraper run, if any
+    """
+    result = await session.execute(
+        select(ScraperCheckpoint).where(ScraperCheckpoint.source == source)
+    )
+    checkpoint = result.scalars().first()
+    if not checkpoint:
+        return None
+    return {"city": checkpoint.city, "page": checkpoint.page}
+
+async def save_scraper_checkpoint(
+    source: str,
+    city: str,
+    page: int,
+    session: AsyncSession = None
+) -> None:
+    """
+    Record the last fully ingested page of a scraper run
+    """
+    result = await session.execute(
+        select(ScraperCheckpoint).where(ScraperCheckpoint.source == source)
+    )
+    checkpoint = result.scalars().first()
+    if checkpoint:
+        checkpoint.city = city
+        checkpoint.page = page
+    else:
+        session.add(ScraperCheckpoint(source=source, city=city, page=page))
+    await session.commit()
+
+async def delete_scraper_checkpoint(
+    source: str,
+    session: AsyncSession = None
+) -> None:
+    """
+    Clear the checkpoint once a scraper run completes
+    """
+    await session.execute(
+        delete(ScraperCheckpoint).where(ScraperCheckpoint.source == source)
+    )
+    await session.commit()
+
+async def enqueue_scrape_jobs(
+    source: str,
+    cities: List[str],
+    page: int = 1,
+    session: AsyncSession = None
+) -> int:
+    """
+    Queue a page of each city for scraping, skipping cities with that page already pending or running
+    
+    Finished jobs for the same page are reset to pending. Returns the number of jobs queued.
+    """
+    result = await session.execute(
+        select(ScrapeJob).where(
+            ScrapeJob.source == source,
+            ScrapeJob.city.in_(cities),
+            ScrapeJob.page == page,
+        )
+    )
+    existing = {job.city: job for job in result.scalars().all()}
+    
+    now = datetime.utcnow()
+    queued = 0
+    for city in cities:
+        job = existing.get(city)
+        if job is None:
+            session.add(ScrapeJob(source=source, city=city, page=page, status="pending", next_attempt_at=now))
+        elif job.status in ("done", "failed"):
+            job.status = "pending"
+            job.attempts = 0
+            job.next_attempt_at = now
+            job.last_error = None
+        else:
+            continue
+        queued += 1
+    
+    await session.commit()
+    return queued
+
+async def claim_scrape_job(
+    worker_id: str,
+    lease_seconds: int,
+    sources: Optional[List[str]] = None,
+    session: AsyncSession = None,
+    max_attempts: Optional[int] = None
+) -> Optional[ScrapeJob]:
+    """
+    Claim the next due job, or a running job whose lease has expired
+    
+    On PostgreSQL the candidate row is locked with FOR UPDATE SKIP LOCKED so
+    concurrent workers pick different jobs. The claim itself is a conditional
+    update, which keeps it safe on databases without row locks such as SQLite.
+    
+    A job whose lease expired after max_attempts attempts, such as a page that
+    kills its worker every time, is marked failed instead of claimed again.
+    """
+    while True:
+        now = datetime.utcnow()
+        expired = and_(ScrapeJob.status == "running", ScrapeJob.lease_expires_at <= now)
+        query = (
+            select(ScrapeJob.id, ScrapeJob.status, ScrapeJob.attempts)
+            .where(
+                or_(
+                    and_(ScrapeJob.status == "pending", ScrapeJob.next_attempt_at <= now),
+                    expired,
+                )
+            )
+            .order_by(ScrapeJob.next_attempt_at, ScrapeJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if sources:
+            query = query.where(ScrapeJob.source.in_(sources))
+        
+        candidate = (await session.execute(query)).first()
+        if candidate is None:
+            await session.rollback()
+            return None
+        job_id, status, attempts = candidate
+        
+        if status == "running" and max_attempts is not None and attempts >= max_attempts:
+            await session.execute(
+                update(ScrapeJob)
+                .where(ScrapeJob.id == job_id, expired)
+                .values(
+                    status="failed",
+                    lease_expires_at=None,
+                    last_error=f"Lease expired on attempt {attempts} of {max_attempts}",
+                    updated_at=now,
+                )
+            )
+            await session.commit()
+            continue
+        
+        result = await session.execute(
+            update(ScrapeJob)
+            .where(ScrapeJob.id == job_id, or_(ScrapeJob.status == "pending", expired))
+            .values(
+                status="running",
+                worker_id=worker_id,
+                attempts=ScrapeJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                updated_at=now,
+            )
+        )
+        await session.commit()
+        
+        # Another worker got there first, try the next job
+        if result.rowcount == 0:
+            continue
+        
+        job = await session.get(ScrapeJob, job_id, populate_existing=True)
+        return job
+
+async def heartbeat_scrape_job(
+    job_id: int,
+    worker_id: str,
+    lease_seconds: int,
+    session: AsyncSession = None
+) -> bool:
+    """
+    Extend the lease of a running job; False if the worker no longer holds it
+    """
+    now = datetime.utcnow()
+    result = await session.execute(
+        update(ScrapeJob)
+        .where(ScrapeJob.id == job_id, ScrapeJob.worker_id == worker_id, ScrapeJob.status == "running")
+        .values(lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+async def complete_scrape_job(
+    job_id: int,
+    worker_id: str,
+    listings_found: int,
+    session: AsyncSession = None
+) -> bool:
+    """
+    Mark a job done; False if the worker no longer holds it
+    """
+    result = await session.execute(
+        update(ScrapeJob)
+        .where(ScrapeJob.id == job_id, ScrapeJob.worker_id == worker_id, ScrapeJob.status == "running")
+        .values(
+            status="done",
+            listings_found=listings_found,
+            lease_expires_at=None,
+            last_error=None,
+            updated_at=datetime.utcnow(),
+        )
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+async def fail_scrape_job(
+    job: ScrapeJob,
+    worker_id: str,
+    error: str,
+    max_attempts: int,
+    backoff_seconds: int,
+    session: AsyncSession = None
+) -> bool:
+    """
+    Record a failed attempt, retrying with exponential backoff until max_attempts is reached
+    """
+    now = datetime.utcnow()
+    if job.attempts >= max_attempts:
+        values = {"status": "failed"}
+    else:
+        delay = backoff_seconds * 2 ** (job.attempts - 1)
+        values = {"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)}
+    
+    result = await session.execute(
+        update(ScrapeJob)
+        .where(ScrapeJob.id == job.id, ScrapeJob.worker_id == worker_id, ScrapeJob.status == "running")
+        .values(**values, lease_expires_at=None, last_error=error, updated_at=now)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+async def acquire_host_slot(
+    host: str,
+    interval_seconds: float,
+    session: AsyncSession = None
+) -> float:
+    """
+    Try to take the next request slot for a host, shared by all workers
+    
+    Returns 0 if the caller may send a request now, otherwise the seconds to
+    wait before trying again.
+    """
+    now = datetime.utcnow()
+    result = await session.execute(
+        update(HostRateLimit)
+        .where(HostRateLimit.host == host, HostRateLimit.next_allowed_at <= now)
+        .values(next_allowed_at=now + timedelta(seconds=interval_seconds))
+    )
+    await session.commit()
+    if result.rowcount > 0:
+        return 0
+    
+    next_allowed_at = (
+        await session.execute(select(HostRateLimit.next_allowed_at).where(HostRateLimit.host == host))
+    ).scalar()
+    if next_allowed_at is None:
+        # First request to this host
+        session.add(HostRateLimit(host=host, next_allowed_at=now + timedelta(seconds=interval_seconds)))
+        try:
+            await session.commit()
+            return 0
+        except IntegrityError:
+            await session.rollback()
+            return interval_seconds
+    
+    await session.rollback()
+    return max((next_allowed_at - now).total_seconds(), 0.01)
+
+async def add_city_crawl_progress(
+    source: str,
+    city: str,
+    found: int,
+    added: int,
+    updated: int,
+    session: AsyncSession = None
+) -> None:
+    """
+    Add the counts of one ingested page to the city's crawl in progress
+    """
+    result = await session.execute(
+        select(CityCrawlStats).where(CityCrawlStats.source == source, CityCrawlStats.city == city)
+    )
+    stats = result.scalars().first()
+    if stats is None:
+        stats = CityCrawlStats(source=source, city=city, crawls=0)
+        session.add(stats)
+    if stats.pending_started_at is None:
+        stats.pending_started_at = datetime.utcnow()
+        stats.pending_found = 0
+        stats.pending_added = 0
+        stats.pending_updated = 0
+    
+    stats.pending_found += found
+    stats.pending_added += added
+    stats.pending_updated += updated
+    await session.commit()
+
+async def get_city_crawl_stats(
+    source: str,
+    cities: Optional[List[str]] = None,
+    session: AsyncSession = None
+) -> Dict[str, CityCrawlStats]:
+    """
+    Get the crawl stats of a source's cities, keyed by city
+    """
+    query = select(CityCrawlStats).where(CityCrawlStats.source == source)
+    if cities is not None:
+        query = query.where(CityCrawlStats.city.in_(cities))
+    result = await session.execute(query)
+    return {stats.city: stats for stats in result.scalars().all()}
+
+async def get_city_crawl_logs(
+    source: Optional[str] = None,
+    session: AsyncSession = None
+) -> List[ScraperLog]:
+    """
+    Get the per-city crawl logs in chronological order
+    """
+    query = select(ScraperLog).where(ScraperLog.city.isnot(None), ScraperLog.success == True)
+    if source:
+        query = query.where(ScraperLog.source == source)
+    result = await session.execute(query.order_by(ScraperLog.end_time))
+    return result.scalars().all()
+
+async def get_listing_city_counts(
+    since: Optional[datetime] = None,
+    session: AsyncSession = None
+) -> Tuple[List[Tuple[str, Optional[str], int]], datetime]:
+    """
+    Count available listings per (city, state), one per unit
+    
+    With since, only cities with a listing updated at or after it are
+    counted, so callers can refresh just the cities a scrape touched.
+    
+    Returns:
+        (city, state, count) rows and the watermark to pass as since next time,
+        which lags this read (see get_change_watermark)
+    """
+    watermark = get_change_watermark()
+    
+    query = (
+        select(Listing.city, Listing.state, func.count(Listing.id))
+        .where(_shown_listings_condition())
+        .group_by(Listing.city, Listing.state)
+    )
+    counts = {}
+    if since is not None:
+        touched = (
+            await session.execute(select(Listing.city, Listing.state).where(Listing.updated_at >= since).distinct())
+        ).all()
+        if not touched:
+            return [], watermark
+        # Cities whose listings all went away still need their count set to zero
+        counts = {(city, state): 0 for city, state in touched}
+        query = query.where(Listing.city.in_({city for city, _ in touched}))
+    
+    for city, state, count in (await session.execute(query)).all():
+        counts[(city, state)] = count
+    return [(city, state, count) for (city, state), count in counts.items()], watermark
+
+async def add_search_query_counts(counts: Dict[str, int], session: AsyncSession = None) -> None:
+    """
+    Add to the counts of normalized search queries
+    """
+    if not counts:
+        return
+    now = datetime.utcnow()
+    result = await session.execute(select(SearchQuery).where(SearchQuery.query.in_(list(counts))))
+    existing = {search_query.query: search_query for search_query in result.scalars().all()}
+    for query, count in counts.items():
+        search_query = existing.get(query)
+        if search_query is None:
+            session.add(SearchQuery(query=query, count=count, last_searched_at=now))
+        else:
+            search_query.count += count
+            search_query.last_searched_at = now
+    await session.commit()
+
+async def get_search_query_counts(
+    since: Optional[datetime] = None,
+    min_count: int = 1,
+    limit: Optional[int] = None,
+    session: AsyncSession = None
+) -> List[SearchQuery]:
+    """
+    Get search queries made at least min_count times by descending count,
+    optionally only those searched since a time
+    """
+    query = select(SearchQuery).where(SearchQuery.count >= min_count).order_by(SearchQuery.count.desc())
+    if since is not None:
+        query = query.where(SearchQuery.last_searched_at >= since)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await session.execute(query)
+    return result.scalars().all()
+
+async def get_precomputed_search_generation(session: AsyncSession = None) -> Optional[int]:
+    """
+    Get the latest generation of precomputed search responses, None before the first
+    """
+    result = await session.execute(select(func.max(PrecomputedSearch.generation)))
+    return result.scalar()
+
+async def get_precomputed_search_bodies(generation: int, session: AsyncSession = None) -> Dict[str, bytes]:
+    """
+    Get the precomputed response bodies of a generation by normalized query
+    """
+    result = await session.execute(
+        select(PrecomputedSearch.query, PrecomputedSearch.body).where(PrecomputedSearch.generation == generation)
+    )
+    return {query: body for query, body in result.all()}
+
+async def replace_precomputed_searches(bodies: Dict[str, bytes], session: AsyncSession = None) -> int:
+    """
+    Store precomputed response bodies as a new generation, deleting the older ones
+    in the same transaction
+
+    Returns:
+        The new generation
+    """
+    generation = (await get_precomputed_search_generation(session) or 0) + 1
+    await session.execute(delete(PrecomputedSearch).where(PrecomputedSearch.generation < generation))
+    if bodies:
+        await session.execute(
+            insert(PrecomputedSearch),
+            [{"generation": generation, "query": query, "body": body} for query, body in bodies.items()],
+        )
+    await session.commit()
+    return generation
+
+def hash_owner_token(token: str) -> str:
+    """
+    Stored form of a saved search's owner token
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+async def create_saved_search(
+    query: str,
+    params: Dict[str, Any],
+    owner_token: str,
+    session: AsyncSession = None
+) -> SavedSearch:
+    """
+    Save a search with the parameters parsed from its query, owned by the holder of owner_token
+    """
+    saved_search = SavedSearch(
+        query=query,
+        owner_token_hash=hash_owner_token(owner_token),
+        **{field: params.get(field) for field in SAVED_SEARCH_FIELDS},
+    )
+    session.add(saved_search)
+    await session.commit()
+    return saved_search
+
+async def deactivate_saved_search(saved_search_id: int, owner_token: str, session: AsyncSession = None) -> bool:
+    """
+    Stop matching a saved search
+    
+    Returns:
+        Whether an active saved search with that owner token was deactivated
+    """
+    result = await session.execute(
+        update(SavedSearch)
+        .where(
+            SavedSearch.id == saved_search_id,
+            SavedSearch.owner_token_hash == hash_owner_token(owner_token),
+            SavedSearch.is_active == True,
+        )
+        .values(is_active=False, updated_at=datetime.utcnow())
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+async def get_saved_search_changes(
+    since: Optional[datetime] = None,
+    session: AsyncSession = None
+) -> Tuple[List[Tuple], datetime]:
+    """
+    Get saved searches created or deactivated since a time, or all active ones
+    
+    Rows are plain tuples rather than SavedSearch objects, since a first load
+    can read millions of them. The watermark returned for the next call lags
+    this read (see get_change_watermark), so a change stamped before it but
+    committed after it is still read next time.
+    
+    Returns:
+        (id, is_active, city, min_bedrooms, min_bathrooms, min_price, max_price) rows
+        and the watermark to pass as since next time
+    """
+    watermark = get_change_watermark()
+    query = select(
+        SavedSearch.id,
+        SavedSearch.is_active,
+        *(getattr(SavedSearch, field) for field in SAVED_SEARCH_FIELDS),
+    )
+    if since is None:
+        query = query.where(SavedSearch.is_active == True)
+    else:
+        query = query.where(SavedSearch.updated_at >= since)
+    
+    rows = [tuple(row) for row in (await session.execute(query)).all()]
+    return rows, watermark
+
+async def add_saved_search_matches(matches: Iterable[Tuple[int, int]], session: AsyncSession = None) -> int:
+    """
+    Queue (saved search id, listing id) matches for delivery, skipping pairs queued before
+    
+    Returns:
+        Number of matches queued
+    """
+    matches = set(matches)
+    if not matches:
+        return 0
+    
+    listing_ids = {listing_id for _, listing_id in matches}
+    result = await session.execute(
+        select(SavedSearchMatch.saved_search_id, SavedSearchMatch.listing_id)
+        .where(SavedSearchMatch.listing_id.in_(list(listing_ids)))
+    )
+    new_matches = matches - set(result.all())
+    if new_matches:
+        now = datetime.utcnow()
+        await session.execute(insert(SavedSearchMatch), [
+            {"saved_search_id": saved_search_id, "listing_id": listing_id, "matched_at": now}
+            for saved_search_id, listing_id in sorted(new_matches)
+        ])
+    await session.commit()
+    return len(new_matches)
+
+async def claim_saved_search_matches(
+    saved_search_id: int,
+    owner_token: str,
+    limit: int = 100,
+    session: AsyncSession = None
+) -> Optional[List[Tuple[SavedSearchMatch, Listing]]]:
+    """
+    Get the oldest undelivered matches of a saved search with their listings and mark them delivered
+    
+    Returns:
+        The matches, or None when no saved search has that id and owner token
+    """
+    owned = await session.execute(
+        select(SavedSearch.id).where(
+            SavedSearch.id == saved_search_id, SavedSearch.owner_token_hash == hash_owner_token(owner_token)
+        )
+    )
+    if owned.scalar() is None:
+        return None
+    
+    result = await session.execute(
+        select(SavedSearchMatch, Listing)
+        .join(Listing, Listing.id == SavedSearchMatch.listing_id)
+        .where(SavedSearchMatch.saved_search_id == saved_search_id, SavedSearchMatch.delivered_at.is_(None))
+        .order_by(SavedSearchMatch.id)
+        .limit(limit)
+    )
+    matches = result.all()
+    if matches:
+        await session.execute(
+            update(SavedSearchMatch)
+            .where(SavedSearchMatch.id.in_([match.id for match, _ in matches]))
+            .values(delivered_at=datetime.utcnow())
+        )
+    await session.commit()
+    return matches
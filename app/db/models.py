@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import (
+    BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index, LargeBinary,
+    UniqueConstraint, event, text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
+from app.db.partitions import create_history_partitions_ddl
+
 Base = declarative_base()
 
 class Listing(Base):
@@ -14,7 +19,7 @@ class Listing(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text)
-    url = Column(String, nullable=False)
+    url = Column(String, nullable=False, index=True)
     price = Column(Float, nullable=False)
     bedrooms = Column(Integer)
     bathrooms = Column(Float)
@@ -29,7 +34,11 @@ class Listing(Base):
     source = Column(String)  # Which website the listing was scraped from
     is_available = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Listing of the same unit this one duplicates, None for canonical listings
+    canonical_id = Column(Integer, ForeignKey("listings.id"), index=True)
+    # MinHash signature, None until the listing has been deduplicated
+    minhash = Column(LargeBinary)
     
     amenities = relationship("Amenity", back_populates="listing")
     
@@ -45,12 +54,31 @@ class Amenity(Base):
     id = Column(Integer, primary_key=True, index=True)
     listing_id = Column(Integer, ForeignKey("listings.id"))
     name = Column(String, nullable=False)
+    # The listing's state, the partition key when listings are partitioned by state
+    state = Column(String)
     
     listing = relationship("Listing", back_populates="amenities")
     
     def __repr__(self):
         return f"<Amenity {self.name}>"
 
+class ListingLSHBucket(Base):
+    """
+    Database model for one LSH band of a listing's MinHash signature
+    """
+    __tablename__ = "listing_lsh_buckets"
+    __table_args__ = (
+        Index("ix_listing_lsh_buckets_lookup", "band", "bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False, index=True)
+    band = Column(Integer, nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f"<ListingLSHBucket {self.listing_id} - band {self.band}>"
+
 class ScraperLog(Base):
     """
     Database model for tracking scraper runs
@@ -59,6 +87,7 @@ class ScraperLog(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     source = Column(String, nullable=False)  # Which website was scraped
+    city = Column(String, index=True)  # Set on per-city crawl logs, None for whole runs
     start_time = Column(DateTime, default=datetime.utcnow)
     end_time = Column(DateTime)
     listings_found = Column(Integer, default=0)
@@ -68,4 +97,192 @@ class ScraperLog(Base):
     error_message = Column(Text)
     
     def __repr__(self):
-        return f"<ScraperLog {self.source} - {self.start_time}>" 
\ No newline at end of file
+        return f"<ScraperLog {self.source} - {self.start_time}>"
+
+class CityCrawlStats(Base):
+    """
+    Database model for the learned change rate and re-crawl schedule of a city
+    """
+    __tablename__ = "city_crawl_stats"
+    __table_args__ = (
+        UniqueConstraint("source", "city", name="uq_city_crawl_stats_source_city"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    crawls = Column(Integer, default=0)
+    change_rate = Column(Float)  # Estimated changes per listing per hour, None until two crawls
+    listings_found = Column(Integer)  # Listings the last crawl found, its share of the request budget
+    interval_hours = Column(Float)
+    last_crawled_at = Column(DateTime)
+    next_crawl_at = Column(DateTime, index=True)
+    # Counts of the crawl in progress, accumulated page by page
+    pending_started_at = Column(DateTime)
+    pending_found = Column(Integer, default=0)
+    pending_added = Column(Integer, default=0)
+    pending_updated = Column(Integer, default=0)
+    
+    def __repr__(self):
+        return f"<CityCrawlStats {self.source} - {self.city} every {self.interval_hours}h>" 
+
+class ScraperCheckpoint(Base):
+    """
+    Database model for the progress of an unfinished scraper run
+    """
+    __tablename__ = "scraper_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False, unique=True)
+    city = Column(String, nullable=False)  # Last city with a fully ingested page
+    page = Column(Integer, nullable=False)  # Last fully ingested page of that city
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ScraperCheckpoint {self.source} - {self.city} page {self.page}>"
+
+class ScrapeJob(Base):
+    """
+    Database model for a (source, city, page) unit of scraping work shared by workers
+    """
+    __tablename__ = "scrape_jobs"
+    __table_args__ = (
+        UniqueConstraint("source", "city", "page", name="uq_scrape_jobs_source_city_page"),
+        Index("ix_scrape_jobs_claim", "status", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, nullable=False)
+    city = Column(String, nullable=False)
+    page = Column(Integer, nullable=False, default=1)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    lease_expires_at = Column(DateTime)  # Running jobs past their lease can be claimed again
+    worker_id = Column(String)
+    listings_found = Column(Integer, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ScrapeJob {self.source} - {self.city} page {self.page} - {self.status}>"
+
+class HostRateLimit(Base):
+    """
+    Database model for the next time any worker may send a request to a host
+    """
+    __tablename__ = "host_rate_limits"
+    
+    host = Column(String, primary_key=True)
+    next_allowed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<HostRateLimit {self.host} - {self.next_allowed_at}>"
+
+class SearchQuery(Base):
+    """
+    Database model for how often a normalized search query has been made
+    """
+    __tablename__ = "search_queries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, nullable=False, unique=True)
+    count = Column(Integer, nullable=False, default=0)
+    last_searched_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<SearchQuery {self.query!r} x{self.count}>"
+
+class PrecomputedSearch(Base):
+    """
+    Database model for the serialized response of a popular search, computed after a scrape
+    """
+    __tablename__ = "precomputed_searches"
+    __table_args__ = (UniqueConstraint("generation", "query"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Warm-up that computed the response; only the latest generation is kept
+    generation = Column(Integer, nullable=False)
+    # Normalized query text
+    query = Column(String, nullable=False)
+    # The response without its "query" member, as sent (UTF-8 JSON)
+    body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PrecomputedSearch {self.query!r} generation {self.generation}>"
+
+class SavedSearch(Base):
+    """
+    Database model for a natural language search saved to be alerted of new matches
+    """
+    __tablename__ = "saved_searches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, nullable=False)
+    # SHA-256 of the token issued to its owner, required to read alerts or delete it
+    owner_token_hash = Column(String, nullable=False)
+    # Search parameters parsed from the query, None where the query sets none
+    city = Column(String)
+    min_bedrooms = Column(Integer)
+    min_bathrooms = Column(Float)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<SavedSearch {self.query!r}>"
+
+class SavedSearchMatch(Base):
+    """
+    Database model for a listing matching a saved search, queued until delivered
+    """
+    __tablename__ = "saved_search_matches"
+    __table_args__ = (
+        UniqueConstraint("saved_search_id", "listing_id", name="uq_saved_search_matches_search_listing"),
+        Index("ix_saved_search_matches_pending", "saved_search_id", "delivered_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    saved_search_id = Column(Integer, ForeignKey("saved_searches.id"), nullable=False)
+    listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False)
+    matched_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<SavedSearchMatch {self.saved_search_id} - {self.listing_id}>"
+
+class ListingHistory(Base):
+    """
+    Database model for a change of a listing's price or availability, appended as scraped
+    
+    On PostgreSQL the table is range partitioned by month of recorded_at (see
+    app.db.partitions), so old months can be detached without touching the rest.
+    """
+    __tablename__ = "listing_history"
+    __table_args__ = (
+        # Price changes by time, covering the price drop query so it reads no table rows
+        Index(
+            "ix_listing_history_price_changes", "recorded_at", "listing_id", "previous_price",
+            postgresql_where=text("previous_price IS NOT NULL"),
+            sqlite_where=text("previous_price IS NOT NULL"),
+        ),
+        {"postgresql_partition_by": "RANGE (recorded_at)"},
+    )
+    
+    # The partition key has to be part of the primary key
+    listing_id = Column(Integer, ForeignKey("listings.id"), primary_key=True)
+    recorded_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    price = Column(Float, nullable=False)
+    # Price before this change, None when the price did not change or was first seen
+    previous_price = Column(Float)
+    is_available = Column(Boolean)
+    
+    def __repr__(self):
+        return f"<ListingHistory {self.listing_id} - {self.recorded_at} - ${self.price}>"
+
+# Monthly partitions around the current month are created with the table
+event.listen(ListingHistory.__table__, "after_create", create_history_partitions_ddl)
@@ -0,0 +1,302 @@
+"""
+Table partitioning on PostgreSQL: listing history by month, and optionally
+listings and amenities by state.
+
+Each month of history is its own table, named listing_history_yYYYYmMM, so
+queries over recent history only read recent months, and an old month can be
+detached in one statement and then archived, compacted or dropped on its own.
+Partitions are created LISTING_HISTORY_MONTHS_AHEAD months ahead when the
+table is created, at the start of every scraper run and whenever city jobs
+are queued. A default partition keeps inserts from failing should that ever
+lag behind; while it holds rows of a month, that month's partition can't be
+created.
+
+Listings and amenities are converted to tables list partitioned by state by
+a migration (migrations/versions), with a partition per US state and a
+default one for other or missing states. Partitioned tables can't be the
+target of foreign keys on id alone, so the foreign keys to listings are
+dropped, and id is unique through its sequence and a unique (id, state)
+constraint. Searches only skip other states' partitions when they name the
+state, so CityStates maps the cities searched to their states.
+
+Other databases get plain tables, and these functions do nothing there.
+"""
+
+import logging
+import re
+from datetime import datetime
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+HISTORY_TABLE = "listing_history"
+HISTORY_PARTITION_PATTERN = re.compile(rf"^{HISTORY_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+# Tables list partitioned by state, both with a state column
+STATE_PARTITIONED_TABLES = ("listings", "amenities")
+# A partition each, the rest share the default partition
+US_STATES = (
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "DC", "FL", "GA", "HI", "ID", "IL", "IN", "IA", "KS",
+    "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
+    "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+)
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def history_partition_name(month: datetime) -> str:
+    return f"{HISTORY_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def history_partition_statements(first_month: datetime, months: int) -> List[str]:
+    """
+    DDL creating the default partition and the partitions of months starting at first_month
+    """
+    statements = [f"CREATE TABLE IF NOT EXISTS {HISTORY_TABLE}_default PARTITION OF {HISTORY_TABLE} DEFAULT"]
+    month = month_start(first_month)
+    for _ in range(months):
+        next_month = add_months(month, 1)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {history_partition_name(month)} PARTITION OF {HISTORY_TABLE} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        )
+        month = next_month
+    return statements
+
+
+def _current_statements() -> List[str]:
+    # Last month too, for history recorded just before a month boundary
+    return history_partition_statements(
+        add_months(month_start(datetime.utcnow()), -1), settings.LISTING_HISTORY_MONTHS_AHEAD + 2
+    )
+
+
+def create_history_partitions_ddl(target, connection, **kw):
+    """
+    after_create listener of the listing_history table
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for statement in _current_statements():
+        connection.execute(text(statement))
+
+
+async def create_history_partitions(session: AsyncSession = None) -> None:
+    """
+    Create the partitions of this month and the next LISTING_HISTORY_MONTHS_AHEAD months that don't exist yet
+    """
+    if session.bind.dialect.name != "postgresql":
+        return
+    try:
+        for statement in _current_statements():
+            await session.execute(text(statement))
+        await session.commit()
+    except Exception as e:
+        # History is still written, to the default partition
+        await session.rollback()
+        logger.error(f"Error creating listing history partitions: {str(e)}")
+
+
+async def detach_history_partitions(before: datetime, session: AsyncSession = None) -> List[str]:
+    """
+    Detach the monthly partitions of history recorded before a month
+
+    The detached tables keep their rows, and can be archived or dropped.
+
+    Returns:
+        Names of the partitions detached
+    """
+    if session.bind.dialect.name != "postgresql":
+        return []
+    result = await session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": HISTORY_TABLE},
+    )
+    cutoff = month_start(before)
+    detached = []
+    for name in sorted(result.scalars().all()):
+        match = HISTORY_PARTITION_PATTERN.match(name)
+        if match and datetime(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+            await session.execute(text(f"ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {name}"))
+            detached.append(name)
+    await session.commit()
+    return detached
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return connection.execute(
+        text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "JOIN pg_class ON pg_class.oid = pg_partitioned_table.partrelid "
+            "WHERE pg_class.relname = :table AND pg_table_is_visible(pg_class.oid))"
+        ),
+        {"table": table},
+    ).scalar()
+
+
+def _rebuild_table(connection, table: str, partition_by_state: bool):
+    """
+    Replace a table with a copy of its rows in a table partitioned by state, or in a plain table
+    """
+    from app.db.models import Base
+
+    old = f"{table}_old"
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+    sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": old}).scalar()
+
+    if partition_by_state:
+        connection.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY LIST (state)"))
+        for state in US_STATES:
+            connection.execute(text(f"CREATE TABLE {table}_{state.lower()} PARTITION OF {table} FOR VALUES IN ('{state}')"))
+        connection.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+    else:
+        connection.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)"))
+
+    connection.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+    if sequence:
+        # The sequence goes with the column that owns it
+        connection.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+    connection.execute(text(f"DROP TABLE {old}"))
+
+    # Keys and indexes are built after the copy, which is faster than maintaining them row by row
+    if partition_by_state:
+        # Unique constraints of partitioned tables have to include the partition key
+        connection.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_id_state_key UNIQUE (id, state)"))
+    else:
+        connection.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id)"))
+    for index in Base.metadata.tables[table].indexes:
+        index.create(connection)
+    connection.execute(text(f"ANALYZE {table}"))
+
+
+def _listing_foreign_keys():
+    """
+    (table, column) of the foreign keys to listings.id in the models
+    """
+    from app.db.models import Base
+
+    return [
+        (table.name, foreign_key.parent.name)
+        for table in Base.metadata.sorted_tables
+        for foreign_key in table.foreign_keys
+        if foreign_key.column.table.name == "listings"
+    ]
+
+
+def partition_listings_by_state(connection):
+    """
+    Rebuild listings and amenities as tables list partitioned by state
+
+    Every row is copied, under an exclusive lock, so large tables need a
+    maintenance window. Does nothing to tables already partitioned.
+    """
+    if is_partitioned(connection, "listings"):
+        return
+
+    # Amenities of listings created before amenities had a state
+    connection.execute(text("ALTER TABLE amenities ADD COLUMN IF NOT EXISTS state VARCHAR"))
+    connection.execute(text(
+        "UPDATE amenities SET state = listings.state FROM listings "
+        "WHERE listings.id = amenities.listing_id AND amenities.state IS NULL"
+    ))
+
+    # Partitions' copies of a foreign key go with the partitioned table's
+    foreign_keys = connection.execute(text(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+        "WHERE contype = 'f' AND confrelid = 'listings'::regclass AND conparentid = 0"
+    )).all()
+    for table, name in foreign_keys:
+        connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+
+    for table in STATE_PARTITIONED_TABLES:
+        _rebuild_table(connection, table, partition_by_state=True)
+    logger.info(f"Partitioned {', '.join(STATE_PARTITIONED_TABLES)} by state")
+
+
+def unpartition_listings(connection):
+    """
+    Rebuild listings and amenities as plain tables, with their foreign keys
+    """
+    if not is_partitioned(connection, "listings"):
+        return
+
+    for table in STATE_PARTITIONED_TABLES:
+        _rebuild_table(connection, table, partition_by_state=False)
+    for table, column in _listing_foreign_keys():
+        connection.execute(text(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES listings (id)"
+        ))
+    logger.info(f"Rebuilt {', '.join(STATE_PARTITIONED_TABLES)} without partitions")
+
+
+class CityStates:
+    """
+    States of the cities listings are in, by lowercased city name
+    """
+
+    def __init__(self):
+        self._states: Dict[str, Set[Optional[str]]] = {}
+        self._matches: Dict[str, Optional[List[str]]] = {}
+        self._refreshed_at = None
+
+    async def refresh(self, session: AsyncSession):
+        from app.db.models import Listing
+
+        # Set first, so concurrent searches don't all reload
+        self._refreshed_at = time.monotonic()
+        result = await session.execute(select(func.lower(Listing.city), Listing.state).distinct())
+        states = {}
+        for city, state in result.all():
+            states.setdefault(city, set()).add(state)
+        self._states = states
+        self._matches = {}
+
+    def refresh_due(self, interval_seconds: float) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval_seconds
+
+    def states_for(self, city: str) -> Optional[List[str]]:
+        """
+        States of every city a search for city matches (by substring, as searches
+        do), or None when that can't restrict the search: no known city matches,
+        or some listings of a matching city have no state
+        """
+        key = city.lower()
+        if "%" in key or "_" in key:
+            # LIKE wildcards, which substrings can't follow
+            return None
+        if key not in self._matches:
+            states = set()
+            for name, name_states in self._states.items():
+                if key in name:
+                    states |= name_states
+            self._matches[key] = sorted(states) if states and None not in states else None
+        return self._matches[key]
+
+
+@lru_cache(maxsize=None)
+def get_city_states() -> CityStates:
+    """
+    City states shared by the process's searches
+    """
+    return CityStates()
@@ -0,0 +1,93 @@
+"""
+Typed records of scraped listings.
+
+A listing is built once, when its card is parsed, as a slotted ListingRecord:
+its fields are converted and checked there, and it is passed unchanged to
+ingestion, with no per-listing dict or timestamps. Ingestion converts a batch
+of records to insert parameters in one pass (listing_rows) and stamps every
+row of the batch with the same time.
+"""
+
+import math
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Listing columns a record carries, in the order of the model
+LISTING_RECORD_FIELDS = (
+    "title", "url", "price", "bedrooms", "bathrooms", "square_footage", "address", "city", "state",
+    "image_url", "source", "is_available",
+)
+
+
+def _optional_number(value, kind, name: str):
+    if value is None:
+        return None
+    number = kind(value)
+    if not number >= 0 or not math.isfinite(number):
+        raise ValueError(f"Listing {name} must be a finite number of at least 0, not {value!r}")
+    return number
+
+
+class ListingRecord:
+    """
+    A scraped listing, validated when it is built
+
+    Raises ValueError, from the constructor, for listings without a URL, title
+    or city, and for prices or sizes that aren't finite numbers of at least 0.
+    """
+
+    __slots__ = LISTING_RECORD_FIELDS + ("amenities",)
+
+    def __init__(
+        self,
+        url: str,
+        title: str,
+        price: float,
+        city: str,
+        state: Optional[str] = None,
+        address: Optional[str] = None,
+        bedrooms: Optional[int] = None,
+        bathrooms: Optional[float] = None,
+        square_footage: Optional[float] = None,
+        image_url: Optional[str] = None,
+        source: Optional[str] = None,
+        is_available: bool = True,
+        amenities: Sequence[str] = (),
+    ):
+        if not url:
+            raise ValueError("Listing has no URL")
+        if not title:
+            raise ValueError(f"Listing {url} has no title")
+        if not city:
+            raise ValueError(f"Listing {url} has no city")
+        self.url = url
+        self.title = title
+        self.price = _optional_number(price, float, "price")
+        if self.price is None:
+            raise ValueError(f"Listing {url} has no price")
+        self.city = city
+        self.state = state
+        self.address = address
+        self.bedrooms = _optional_number(bedrooms, int, "bedrooms")
+        self.bathrooms = _optional_number(bathrooms, float, "bathrooms")
+        self.square_footage = _optional_number(square_footage, float, "square footage")
+        self.image_url = image_url
+        self.source = source
+        self.is_available = bool(is_available)
+        self.amenities = tuple(amenities)
+
+    def __repr__(self):
+        return f"<ListingRecord {self.title} - {self.city} - ${self.price}>"
+
+
+_record_values = attrgetter(*LISTING_RECORD_FIELDS)
+_row_columns = LISTING_RECORD_FIELDS + ("created_at", "updated_at")
+
+
+def listing_rows(records: Iterable[ListingRecord], now: datetime) -> List[Dict[str, Any]]:
+    """
+    Insert parameters of a batch of records, created and updated at now
+    """
+    stamps = (now, now)
+    return [dict(zip(_row_columns, _record_values(record) + stamps)) for record in records]
@@ -6,9 +6,24 @@ from typing import Generator
 
 from app.core.config import settings
 
+# Async drivers for the database URI schemes we support
+ASYNC_DRIVERS = {
+    "postgresql://": "postgresql+asyncpg://",
+    "sqlite://": "sqlite+aiosqlite://",
+}
+
+def get_async_database_uri(uri: str) -> str:
+    """
+    Swap the scheme of a database URI for its async driver
+    """
+    for scheme, async_scheme in ASYNC_DRIVERS.items():
+        if uri.startswith(scheme):
+            return async_scheme + uri[len(scheme):]
+    return uri
+
 # Create async database engine
 async_engine = create_async_engine(
-    settings.SQLALCHEMY_DATABASE_URI.replace("postgresql://", "postgresql+asyncpg://"),
+    get_async_database_uri(settings.SQLALCHEMY_DATABASE_URI),
     echo=False,
     future=True,
 )
@@ -1,18 +1,70 @@
+import asyncio
 import os
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from flask import Flask, render_template, request, jsonify
+from fastapi.responses import HTMLResponse, PlainTextResponse
+from fastapi.templating import Jinja2Templates
 import uvicorn
 from dotenv import load_dotenv
 
 from app.core.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import MetricsMiddleware, TimedJSONResponse, render_metrics
+from app.core.profiling import get_slow_request_profiler
+from app.core.static_files import CachedStaticFiles
+from app.api.precomputed import get_precomputed_searches, run_precomputed_refresh
 from app.api.routes import api_router
-from app.nlp.processor import NLPProcessor
+from app.nlp.processor import get_nlp_processor
+from app.nlp.suggest import get_suggest_index, run_suggest_refresh
+from app.scraper.scheduler import ScraperScheduler
 
 # Load environment variables
 load_dotenv()
 
+# Sampling profiler for slow requests, None unless PROFILE_SLOW_REQUEST_SECONDS is set
+profiler = get_slow_request_profiler()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load the NLP model, keep the suggestion index and precomputed searches
+    fresh, and run the scraper scheduler in the API's event loop when enabled
+    """
+    # Load the spaCy model before the first search instead of during it
+    await run_in_threadpool(get_nlp_processor)
+    
+    if profiler:
+        profiler.start()
+    
+    suggest_task = asyncio.create_task(
+        run_suggest_refresh(get_suggest_index(), settings.SUGGEST_REFRESH_SECONDS)
+    )
+    precomputed_task = asyncio.create_task(
+        run_precomputed_refresh(get_precomputed_searches(), settings.SEARCH_PRECOMPUTED_REFRESH_SECONDS)
+    )
+    
+    scheduler = ScraperScheduler() if settings.SCHEDULER_ENABLED else None
+    app.state.scheduler = scheduler
+    if scheduler:
+        await scheduler.start()
+    
+    yield
+    
+    if scheduler:
+        await scheduler.stop()
+    
+    for task in (suggest_task, precomputed_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    if profiler:
+        profiler.stop()
+
 # Initialize FastAPI
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -21,6 +73,8 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
 )
 
 # Configure CORS
@@ -32,32 +86,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress HTML, JSON and static text responses
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+# Count and time requests, outermost so the timings cover compression too
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 # Include API routes
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Mount static files, cached by content hash
+static_files = CachedStaticFiles(directory="app/static", mount_path="/static")
+app.mount("/static", static_files, name="static")
 
-# Initialize Flask app for front-end
-flask_app = Flask(__name__, 
-                 template_folder="templates",
-                 static_folder="static")
+# Front-end templates link static files by versioned URL
+templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["static_url"] = static_files.versioned_url
 
-@flask_app.route("/")
-def home():
-    return render_template("index.html")
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Expose latency histograms and counters to Prometheus
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-@flask_app.route("/search", methods=["POST"])
-def search():
-    query = request.form.get("query")
-    if not query:
-        return jsonify({"error": "No query provided"}), 400
-    
-    # Process the NLP query
-    nlp_processor = NLPProcessor()
-    results = nlp_processor.process_query(query)
-    
-    return jsonify(results)
+@app.get("/", response_class=HTMLResponse, include_in_schema=False)
+async def home(request: Request):
+    """
+    Serve the search page
+    """
+    return templates.TemplateResponse("index.html", {"request": request})
 
 if __name__ == "__main__":
     # Run FastAPI with uvicorn
@@ -0,0 +1,320 @@
+"""
+Typo-tolerant resolution of place names in search queries.
+
+Known places come from the cities in the listings table, weighted by their
+number of listings, from an optional gazetteer file (LOCATION_GAZETTEER_PATH)
+and from the cities NLPProcessor names. They are indexed once, when the NLP
+processor is created, with symmetric deletes (as in SymSpell): every string
+reachable by deleting up to LOCATION_MAX_EDIT_DISTANCE characters from the
+first LOCATION_PREFIX_LENGTH characters of a name points back at the name,
+and likewise for its last characters. A misspelling and the name it was
+meant as always share such strings, so a lookup only generates the deletes
+of the typed text's ends, looks them up, and computes the edit distance to
+the few names found at both ends. Matches rank by edit distance, then by weight.
+"""
+
+import csv
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Longest run of words tried as a place name
+MAX_PLACE_WORDS = 3
+
+# Words after which a query names a place ("in", "near", "close to"); only
+# the words following them are matched to misspelled place names
+LOCATION_WORDS = {"in", "near", "around", "at", "to"}
+
+# Words of search queries that are never part of a place name
+QUERY_WORDS = {
+    "apartment", "apartments", "apt", "house", "houses", "home", "homes", "condo", "condos", "studio",
+    "studios", "loft", "townhouse", "room", "rooms", "place", "rent", "rental", "rentals", "bed", "beds",
+    "bedroom", "bedrooms", "br", "bath", "baths", "bathroom", "bathrooms", "ba", "sqft", "sq", "ft", "feet",
+    "under", "over", "below", "above", "between", "around", "near", "close", "within", "max", "min",
+    "maximum", "minimum", "least", "most", "cheap", "affordable", "pet", "pets", "friendly", "find",
+    "looking", "want", "need", "show", "me", "for", "with", "and", "or", "the", "a", "an", "in", "at", "to",
+    "of", "by", "on", "per", "month", "budget", "price", "k", "dollars",
+}
+
+
+def normalize_place(text: str) -> str:
+    """
+    Lowercase words of a place name, so "San Francisco, CA" and "san  francisco ca" compare equal
+    """
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def max_edit_distance(text: str) -> int:
+    """
+    Edits tolerated in a name of this length; short words are only matched exactly
+    """
+    if len(text) < 4:
+        return 0
+    if len(text) < 8:
+        return min(1, settings.LOCATION_MAX_EDIT_DISTANCE)
+    return settings.LOCATION_MAX_EDIT_DISTANCE
+
+
+def edit_distance(source: str, target: str, limit: int) -> int:
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions),
+    or limit + 1 once it is known to exceed limit
+
+    Uses Hyyro's bit-parallel algorithm: a column of the distance matrix is
+    kept as bit vectors of +1/-1 steps, so each character of target costs a
+    few integer operations instead of a row of cells.
+    """
+    if source == target:
+        return 0
+    if abs(len(source) - len(target)) > limit:
+        return limit + 1
+    if not source or not target:
+        return max(len(source), len(target))
+
+    masks = {}
+    for index, char in enumerate(source):
+        masks[char] = masks.get(char, 0) | (1 << index)
+    full = (1 << len(source)) - 1
+    last = 1 << (len(source) - 1)
+    vp, vn = full, 0
+    d0 = pm_before = 0
+    score = len(source)
+    remaining = len(target)
+    for char in target:
+        pm = masks.get(char, 0)
+        transposed = (((~d0) & pm) << 1) & pm_before
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn | transposed) & full
+        hp = vn | ~(d0 | vp)
+        hn = d0 & vp
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        remaining -= 1
+        # Each remaining character lowers the distance by one at most
+        if score - remaining > limit:
+            return limit + 1
+        hp = (hp << 1) | 1
+        hn <<= 1
+        vp = (hn | ~(d0 | hp)) & full
+        vn = hp & d0
+        pm_before = pm
+    return score if score <= limit else limit + 1
+
+
+def _deletes(text: str, distance: int) -> Set[str]:
+    """
+    Strings made by deleting up to distance characters from text, text included
+    """
+    found = {text}
+    frontier = [text]
+    for _ in range(distance):
+        next_frontier = []
+        for word in frontier:
+            for index in range(len(word)):
+                deleted = word[:index] + word[index + 1:]
+                if deleted not in found:
+                    found.add(deleted)
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return found
+
+
+def _candidates(deletes: Dict[str, object], text: str, distance: int) -> Set[int]:
+    """
+    Indexes of the names sharing a delete with text
+    """
+    found = set()
+    for deleted in _deletes(text, distance):
+        entry = deletes.get(deleted)
+        if entry is None:
+            continue
+        if isinstance(entry, list):
+            found.update(entry)
+        else:
+            found.add(entry)
+    return found
+
+
+class LocationIndex:
+    """
+    Symmetric delete index of place names for lookups within a small edit distance
+    """
+
+    def __init__(self, prefix_length: int = None, max_distance: int = None):
+        self.prefix_length = prefix_length or settings.LOCATION_PREFIX_LENGTH
+        self.max_distance = settings.LOCATION_MAX_EDIT_DISTANCE if max_distance is None else max_distance
+        # Normalized name -> (display name, weight)
+        self._names: Dict[str, Tuple[str, int]] = {}
+        self._keys: List[str] = []
+        # Delete of a name's first (or last) prefix_length characters -> index of
+        # one name in _keys, or a list of them
+        self._prefix_deletes: Dict[str, object] = {}
+        self._suffix_deletes: Dict[str, object] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, name: str, weight: int = 1):
+        """
+        Index a place name; weights of names that normalize alike add up
+        """
+        key = normalize_place(name)
+        if not key:
+            return
+        known = self._names.get(key)
+        if known is not None:
+            # Keep the spelling with the most weight behind it
+            display = name if weight > known[1] else known[0]
+            self._names[key] = (display, known[1] + weight)
+            return
+
+        self._names[key] = (name, weight)
+        key_index = len(self._keys)
+        self._keys.append(key)
+        for deletes, part in ((self._prefix_deletes, key[:self.prefix_length]), (self._suffix_deletes, key[-self.prefix_length:])):
+            for deleted in _deletes(part, self.max_distance):
+                entry = deletes.get(deleted)
+                if entry is None:
+                    # Most deletes belong to one name, so a bare index saves a list each
+                    deletes[deleted] = key_index
+                elif isinstance(entry, list):
+                    entry.append(key_index)
+                else:
+                    deletes[deleted] = [entry, key_index]
+
+    def lookup(self, text: str, limit: int = 1, max_distance: int = None) -> List[Tuple[str, int, int]]:
+        """
+        Place names within the tolerated edit distance of a text, or within max_distance if lower
+
+        Returns:
+            (display name, edit distance, weight) of the best matches, closest first
+        """
+        key = normalize_place(text)
+        if not key:
+            return []
+        known = self._names.get(key)
+        if known is not None:
+            return [(known[0], 0, known[1])]
+
+        # Try one edit before two: closer names always rank first, and one-edit
+        # lookups generate far fewer deletes and candidates
+        tolerated = min(max_edit_distance(key), self.max_distance)
+        if max_distance is not None:
+            tolerated = min(tolerated, max_distance)
+        for distance in range(1, tolerated + 1):
+            # Names close to the text are close to it at both ends, and names sharing
+            # a long prefix rarely share the suffix, so few candidates are left to verify
+            candidates = _candidates(self._prefix_deletes, key[:self.prefix_length], distance)
+            if candidates:
+                candidates &= _candidates(self._suffix_deletes, key[-self.prefix_length:], distance)
+
+            matches = []
+            for key_index in candidates:
+                name = self._keys[key_index]
+                if abs(len(name) - len(key)) > distance:
+                    continue
+                found = edit_distance(key, name, distance)
+                if found <= distance:
+                    display, weight = self._names[name]
+                    matches.append((display, found, weight))
+            if matches:
+                matches.sort(key=lambda match: (match[1], -match[2]))
+                return matches[:limit]
+        return []
+
+    def find_in_query(self, query: str) -> Optional[Tuple[str, int, int]]:
+        """
+        Best place named in a search query, trying every run of up to
+        MAX_PLACE_WORDS words that aren't numbers or query vocabulary
+
+        Runs are matched exactly, except right after a location word ("in
+        seatle"), where misspellings are tolerated. Tolerating them anywhere
+        would read descriptive words as the places a typo away ("cozy" as
+        Cody, "parking" as Parkin).
+
+        Returns:
+            (display name, edit distance, weight), or None
+        """
+        best = None
+        best_rank = None
+        words = TOKEN_PATTERN.findall(query.lower())
+        for start in range(len(words)):
+            max_distance = None if start and words[start - 1] in LOCATION_WORDS else 0
+            for end in range(start + 1, min(start + MAX_PLACE_WORDS, len(words)) + 1):
+                word = words[end - 1]
+                if word in QUERY_WORDS or not word.isalpha():
+                    break
+                matches = self.lookup(" ".join(words[start:end]), max_distance=max_distance)
+                if not matches:
+                    continue
+                display, distance, weight = matches[0]
+                # Fewer edits win, then longer spans ("new york" over "york"), then weight
+                rank = (distance, start - end, -weight)
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = matches[0], rank
+        return best
+
+
+def _listing_city_weights() -> Iterable[Tuple[str, int]]:
+    """
+    Cities of available listings with their number of listings
+    """
+    from app.db.models import Listing
+    from app.db.session import engine
+
+    query = (
+        select(Listing.city, func.count(Listing.id))
+        .where(Listing.is_available == True)
+        .group_by(Listing.city)
+    )
+    with engine.connect() as connection:
+        return connection.execute(query).all()
+
+
+def _gazetteer_weights(path: str) -> Iterable[Tuple[str, int]]:
+    """
+    Place names of a gazetteer CSV file of name and optional weight rows
+    """
+    with open(path, newline="") as gazetteer:
+        for row in csv.reader(gazetteer):
+            if row and row[0].strip():
+                yield row[0].strip(), int(row[1]) if len(row) > 1 and row[1].strip() else 1
+
+
+def build_location_index(cities: Iterable[str] = ()) -> LocationIndex:
+    """
+    Index the given cities, the gazetteer's places and the cities of listings in the database
+    """
+    started = time.perf_counter()
+    index = LocationIndex()
+    for city in cities:
+        index.add(city.title())
+
+    if settings.LOCATION_GAZETTEER_PATH:
+        try:
+            for name, weight in _gazetteer_weights(settings.LOCATION_GAZETTEER_PATH):
+                index.add(name, weight)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading gazetteer {settings.LOCATION_GAZETTEER_PATH}: {str(e)}")
+
+    try:
+        for city, count in _listing_city_weights():
+            if city:
+                index.add(city, count)
+    except Exception as e:
+        # Searches still resolve the other places without the database
+        logger.warning(f"Could not load listing cities into the location index: {str(e)}")
+
+    logger.info(f"Indexed {len(index)} place names in {time.perf_counter() - started:.2f}s")
+    return index
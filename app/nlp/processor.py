@@ -1,10 +1,13 @@
 import spacy
 import re
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
 import nltk
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 
+from app.nlp.locations import LocationIndex, build_location_index
+
 # Download required NLTK resources
 try:
     nltk.data.find('tokenizers/punkt')
@@ -21,7 +24,7 @@ class NLPProcessor:
     NLP processor for apartment search queries
     """
     
-    def __init__(self):
+    def __init__(self, locations: Optional[LocationIndex] = None):
         # Load spaCy model
         try:
             self.nlp = spacy.load("en_core_web_sm")
@@ -47,6 +50,9 @@ class NLPProcessor:
             "san francisco", "los angeles", "new york", "chicago", "seattle", 
             "boston", "austin", "miami", "denver", "portland"
         ]
+        
+        # Known places for resolving misspelled or unlisted city names
+        self.locations = locations
     
     def process_query(self, query: str) -> Dict[str, Any]:
         """
@@ -79,6 +85,7 @@ class NLPProcessor:
                 if entity.label_ == "GPE":  # Geopolitical entity (city, state, country)
                     params["city"] = entity.text.title()
                     break
+            params["city"] = self._resolve_location(query, params["city"])
         
         # Extract bedrooms
         bedroom_matches = self.patterns["bedrooms"].findall(query)
@@ -112,6 +119,22 @@ class NLPProcessor:
         
         return params
     
+    def _resolve_location(self, query: str, entity_city: Optional[str]) -> Optional[str]:
+        """
+        Known place the query names, tolerating misspellings, or the city spaCy recognized
+        """
+        if self.locations is None:
+            return entity_city
+        
+        # spaCy often tags a misspelled city as a place, exactly as typed
+        if entity_city:
+            matches = self.locations.lookup(entity_city)
+            if matches:
+                return matches[0][0]
+        
+        match = self.locations.find_in_query(query)
+        return match[0] if match else entity_city
+    
     def _convert_price(self, price_str: str) -> float:
         """
         Convert price string to float
@@ -123,4 +146,13 @@ class NLPProcessor:
         if price_str.lower().endswith("k"):
             return float(price_str[:-1]) * 1000
         
-        return float(price_str) 
\ No newline at end of file
+        return float(price_str)
+
+@lru_cache(maxsize=None)
+def get_nlp_processor() -> NLPProcessor:
+    """
+    Shared NLP processor, so the spaCy model and location index are built once per process
+    """
+    processor = NLPProcessor()
+    processor.locations = build_location_index(processor.cities)
+    return processor
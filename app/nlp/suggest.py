@@ -0,0 +1,304 @@
+"""
+Typeahead suggestions from an in-memory prefix index.
+
+Two radix tries are kept per process: one of the cities in the listings table,
+weighted by their number of available listings, and one of past search
+queries, weighted by how often they were searched. Each trie node caches the
+best entries below it, so a lookup costs one walk down the typed prefix no
+matter how many entries match.
+
+Searches are counted in memory and added to the search_queries table on each
+refresh. A refresh then reloads only the cities whose listings changed and the
+queries searched since the previous refresh, so the index follows each scrape
+and the searches of every API process without being rebuilt. Past the
+SUGGEST_MAX_QUERIES most searched queries, the least searched are dropped.
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud import (
+    add_search_query_counts,
+    get_change_watermark,
+    get_listing_city_counts,
+    get_search_query_counts,
+)
+from app.db.session import AsyncSessionLocal
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+", re.IGNORECASE)
+
+# Longest stored query, in characters
+MAX_QUERY_LENGTH = 200
+
+# Trailing words of the typed text tried as the start of a location
+MAX_LOCATION_WORDS = 3
+
+
+def index_key(text: str) -> str:
+    """
+    Lowercase words of a text, so "Seattle, WA" and "seattle wa" share a key
+    """
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def normalize_query(query: str) -> str:
+    """
+    Form a search query is counted and suggested in
+    """
+    return " ".join(query.lower().split())[:MAX_QUERY_LENGTH]
+
+
+class _Node:
+    __slots__ = ("edges", "entry", "top")
+
+    def __init__(self):
+        # First character of an edge's label -> (label, child)
+        self.edges: Dict[str, Tuple[str, "_Node"]] = {}
+        self.entry: Optional[Tuple[int, str]] = None
+        # Best (weight, text) entries of the subtree, best first
+        self.top: List[Tuple[int, str]] = []
+
+
+def _rank(entry: Tuple[int, str]):
+    return -entry[0], entry[1]
+
+
+class PrefixIndex:
+    """
+    Radix trie of weighted suggestions answering top-k prefix lookups
+    """
+
+    def __init__(self, top_size: int):
+        self.top_size = top_size
+        self.root = _Node()
+        self.size = 0
+
+    def set(self, key: str, text: str, weight: int):
+        """
+        Add or reweight the suggestion stored under a key; a weight of 0 removes it
+        """
+        if not key:
+            return
+        path = self._path(key, create=weight > 0)
+        if path is None:
+            return
+        node = path[-1]
+        if node.entry is None and weight > 0:
+            self.size += 1
+        elif node.entry is not None and weight <= 0:
+            self.size -= 1
+        node.entry = (weight, text) if weight > 0 else None
+
+        # Drop the nodes a removal leaves empty, so removed suggestions free their memory
+        while len(path) > 1 and path[-1].entry is None and not path[-1].edges:
+            child = path.pop()
+            edges = path[-1].edges
+            del edges[next(first for first, (_, node) in edges.items() if node is child)]
+
+        for node in reversed(path):
+            entries = chain([node.entry] if node.entry else (), *(child.top for _, child in node.edges.values()))
+            node.top = heapq.nsmallest(self.top_size, entries, key=_rank)
+
+    def _path(self, key: str, create: bool) -> Optional[List[_Node]]:
+        """
+        Nodes from the root to the node of a key, splitting edges to create it if asked
+        """
+        node = self.root
+        path = [node]
+        rest = key
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                if not create:
+                    return None
+                child = _Node()
+                node.edges[rest[0]] = (rest, child)
+                path.append(child)
+                return path
+
+            label, child = edge
+            common = 0
+            while common < min(len(label), len(rest)) and label[common] == rest[common]:
+                common += 1
+            if common < len(label):
+                if not create:
+                    return None
+                # The key ends or branches inside the edge, so split it
+                middle = _Node()
+                middle.edges[label[common]] = (label[common:], child)
+                middle.top = list(child.top)
+                node.edges[rest[0]] = (label[:common], middle)
+                child = middle
+
+            node = child
+            path.append(node)
+            rest = rest[common:]
+        return path
+
+    def lookup(self, prefix: str, limit: int) -> List[Tuple[int, str]]:
+        """
+        Best (weight, text) suggestions whose key starts with a prefix
+        """
+        node = self.root
+        rest = prefix
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                return []
+            label, child = edge
+            if label.startswith(rest):
+                return child.top[:limit]
+            if not rest.startswith(label):
+                return []
+            node = child
+            rest = rest[len(label):]
+        return node.top[:limit]
+
+
+class SuggestIndex:
+    """
+    Location and past query suggestions for partially typed searches
+    """
+
+    def __init__(self, top_size: int = None):
+        top_size = top_size or settings.SUGGEST_LIMIT
+        self.locations = PrefixIndex(top_size)
+        self.queries = PrefixIndex(top_size)
+        # Weight of each indexed query by key, to find the least searched ones
+        self._query_counts: Dict[str, int] = {}
+        self._pending_queries = Counter()
+        self._listings_watermark = None
+        self._queries_watermark = None
+
+    def record_query(self, query: str):
+        """
+        Count a search; counts are stored and indexed on the next refresh
+        """
+        query = normalize_query(query)
+        if query:
+            self._pending_queries[query] += 1
+
+    def suggest(self, text: str, limit: int) -> Dict[str, Any]:
+        """
+        Locations completing the last words of the text, and past queries starting with it
+        """
+        # Try the longest tail first, so "in san fr" completes "San Francisco, CA"
+        # rather than anything starting with "fr"
+        words = list(TOKEN_PATTERN.finditer(text))
+        locations = []
+        for start in range(max(len(words) - MAX_LOCATION_WORDS, 0), len(words)):
+            matches = self.locations.lookup(index_key(text[words[start].start():]), limit)
+            if matches:
+                head = text[:words[start].start()]
+                locations = [
+                    {"text": location, "completion": head + location, "count": count}
+                    for count, location in matches
+                ]
+                break
+
+        key = index_key(text)
+        queries = self.queries.lookup(key, limit) if key else []
+        return {
+            "locations": locations,
+            "queries": [{"text": query, "count": count} for count, query in queries],
+        }
+
+    async def flush_queries(self, session: AsyncSession):
+        """
+        Add the searches counted since the last flush to the search_queries table
+        """
+        pending, self._pending_queries = self._pending_queries, Counter()
+        try:
+            await add_search_query_counts(pending, session)
+        except IntegrityError:
+            # Another process inserted one of the same new queries; retry next time
+            await session.rollback()
+            self._pending_queries.update(pending)
+
+    async def refresh(self, session: AsyncSession):
+        """
+        Store counted searches, then index what changed since the last refresh
+        """
+        await self.flush_queries(session)
+
+        cities, self._listings_watermark = await get_listing_city_counts(self._listings_watermark, session)
+        for city, state, count in cities:
+            location = f"{city}, {state}" if state else city
+            self.locations.set(index_key(location), location, count)
+
+        first_load = self._queries_watermark is None
+        # Lagged, like the listings watermark: counts flushed by other processes
+        # can commit after queries searched later have been read
+        queries_watermark = get_change_watermark()
+        queries = await get_search_query_counts(
+            self._queries_watermark,
+            min_count=settings.SUGGEST_MIN_QUERY_COUNT,
+            limit=settings.SUGGEST_MAX_QUERIES if first_load else None,
+            session=session,
+        )
+        for search_query in queries:
+            key = index_key(search_query.query)
+            if not key:
+                continue
+            self.queries.set(key, search_query.query, search_query.count)
+            self._query_counts[key] = search_query.count
+        self._queries_watermark = queries_watermark
+        self._evict_queries(settings.SUGGEST_MAX_QUERIES)
+
+        if first_load or cities or queries:
+            logger.info(
+                f"Suggestion index has {self.locations.size} locations and {self.queries.size} queries "
+                f"({len(cities)} locations and {len(queries)} queries refreshed)"
+            )
+
+    def _evict_queries(self, max_queries: int):
+        """
+        Remove the least searched queries beyond max_queries from the index
+        """
+        excess = len(self._query_counts) - max_queries
+        if excess <= 0:
+            return
+        for key in heapq.nsmallest(excess, self._query_counts, key=self._query_counts.get):
+            self.queries.set(key, "", 0)
+            del self._query_counts[key]
+
+
+@lru_cache(maxsize=None)
+def get_suggest_index() -> SuggestIndex:
+    """
+    Suggestion index shared by the process's requests
+    """
+    return SuggestIndex()
+
+
+async def run_suggest_refresh(index: SuggestIndex, interval_seconds: float):
+    """
+    Refresh the suggestion index until cancelled, storing pending counts on the way out
+    """
+    try:
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await index.refresh(session)
+            except Exception as e:
+                logger.error(f"Error refreshing suggestion index: {str(e)}")
+            await asyncio.sleep(interval_seconds)
+    finally:
+        try:
+            async with AsyncSessionLocal() as session:
+                await index.flush_queries(session)
+        except Exception as e:
+            logger.error(f"Error storing search query counts: {str(e)}")
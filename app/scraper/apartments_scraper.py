@@ -6,12 +6,12 @@ See app/scraper/zillow_scraper.py for the current implementation.
 
 import asyncio
 import logging
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
 import re
 from bs4 import BeautifulSoup
 import requests
-from datetime import datetime
 
+from app.db.records import ListingRecord
 from app.scraper.base import BaseScraper
 
 # Set up logging
@@ -31,17 +31,18 @@ class ApartmentsScraper(BaseScraper):
             "Accept-Language": "en-US,en;q=0.9",
         }
     
-    async def scrape(self) -> List[Dict[str, Any]]:
+    async def scrape(self, checkpoint: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
         """
         DEPRECATED: Scrape apartment listings from apartments.com
         This method is no longer used by the application.
         """
         logger.warning("The ApartmentsScraper is deprecated and should not be used. Use ZillowScraper instead.")
-        return []
+        return
+        yield  # Keeps this an (empty) async generator
     
-    def _parse_listing_card(self, card, city: str) -> Dict[str, Any]:
+    def _parse_listing_card(self, card, city: str) -> Optional[ListingRecord]:
         """
-        DEPRECATED: Parse a listing card from apartments.com
+        DEPRECATED: Parse a listing card from apartments.com into a listing record
         This method is no longer used by the application.
         """
         logger.warning("The ApartmentsScraper is deprecated and should not be used. Use ZillowScraper instead.")
@@ -1,11 +1,31 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import datetime
+import asyncio
 import logging
+from urllib.parse import urlsplit
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.crud import create_listing, update_listing, create_scraper_log
+from app.core.config import settings
+from app.core.metrics import SCRAPER_STAGE_SECONDS, timed
+from app.db.crud import (
+    add_city_crawl_progress,
+    create_scraper_log,
+    delete_scraper_checkpoint,
+    get_scraper_checkpoint,
+    save_scraper_checkpoint,
+    upsert_listings,
+)
+from app.db.models import Listing
+from app.db.records import ListingRecord
+from app.db.partitions import create_history_partitions
 from app.db.session import AsyncSessionLocal
+from app.scraper.dedup import deduplicate_listings
+from app.scraper.recrawl import finish_city_crawl, get_due_cities
+from app.scraper.replay import get_page_store
+from app.scraper.robots import get_robots_rules
+from app.scraper.saved_searches import match_saved_searches
+from app.search.warmup import warm_popular_searches
 
 # Set up logging
 logging.basicConfig(
@@ -19,9 +39,27 @@ class BaseScraper(ABC):
     Base class for apartment listing scrapers
     """
     
-    def __init__(self, source_name: str):
+    def __init__(self, source_name: str, robots_txt: Optional[str] = None):
         self.source_name = source_name
         self.start_time = None
+        
+        # robots.txt rules are compiled once and shared by every scraper of the same site
+        self.robots = get_robots_rules(robots_txt, settings.SCRAPER_ROBOTS_AGENT) if robots_txt else None
+        self.crawl_delay = settings.SCRAPER_CRAWL_DELAY
+        if self.robots and self.robots.crawl_delay is not None:
+            self.crawl_delay = self.robots.crawl_delay
+        
+        # Shared rate limiter with an async wait(host, interval) method; None keeps the delay per scraper
+        self.rate_limiter = None
+        self.last_fetch_time = None
+        
+        # Recorded pages, when recording or replaying instead of fetching live
+        self.fetch_mode = settings.SCRAPER_FETCH_MODE
+        self.page_store = get_page_store(source_name, self.fetch_mode)
+        
+        # Cities to crawl this run; None crawls every configured city
+        self.cities: Optional[List[str]] = None
+        
         self.scraper_log = {
             "source": source_name,
             "listings_found": 0,
@@ -30,9 +68,62 @@ class BaseScraper(ABC):
             "success": False,
         }
     
+    def is_url_allowed(self, url: str) -> bool:
+        """
+        Check if a URL is allowed according to robots.txt rules
+        """
+        if self.robots is None:
+            return True
+        return self.robots.is_url_allowed(url)
+    
+    async def wait_for_crawl_delay(self, url: str):
+        """
+        Sleep until a request to the URL's host respects the crawl delay
+        
+        Time spent parsing and ingesting the previous page counts towards the delay.
+        Replayed pages are read from disk and never wait.
+        """
+        if self.fetch_mode == "replay":
+            return
+        
+        if self.rate_limiter is not None:
+            await self.rate_limiter.wait(urlsplit(url).netloc, self.crawl_delay)
+            return
+        
+        loop = asyncio.get_running_loop()
+        if self.last_fetch_time is not None:
+            remaining = self.last_fetch_time + self.crawl_delay - loop.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+        self.last_fetch_time = loop.time()
+    
+    async def fetch(self, url: str) -> str:
+        """
+        Fetch a page, recording it or serving it from the recorded pages per the fetch mode
+        """
+        with timed("fetch", SCRAPER_STAGE_SECONDS, self.source_name):
+            if self.fetch_mode == "replay":
+                return self.page_store.load(url)
+            
+            html = await self._fetch(url)
+            if self.fetch_mode == "record":
+                self.page_store.save(url, html)
+            return html
+    
+    async def _fetch(self, url: str) -> str:
+        """
+        Fetch a page from the source site
+        """
+        raise NotImplementedError(f"{self.source_name} does not fetch pages")
+    
     async def run(self):
         """
         Run the scraper and save results to database
+        
+        Pages produced by scrape() pass through a bounded queue, so fetching
+        continues while earlier pages are written. A checkpoint is saved after
+        each page is committed and an interrupted run resumes from it. A
+        successful run then precomputes the responses of popular searches.
         """
         self.start_time = datetime.utcnow()
         self.scraper_log["start_time"] = self.start_time
@@ -40,15 +131,37 @@ class BaseScraper(ABC):
         try:
             # Get session
             async with AsyncSessionLocal() as session:
+                self.cities = await get_due_cities(self.source_name, settings.SCRAPER_CITIES, session)
+                if not self.cities:
+                    logger.info(f"No cities are due for a crawl on {self.source_name}")
+                    return
+                
+                await create_history_partitions(session)
+                
+                checkpoint = await get_scraper_checkpoint(self.source_name, session)
+                if checkpoint:
+                    logger.info(
+                        f"Resuming scraper for {self.source_name} after "
+                        f"{checkpoint['city']} page {checkpoint['page']}"
+                    )
+                
                 # Scrape listings
                 logger.info(f"Starting scraper for {self.source_name}")
-                listings = await self.scrape()
-                self.scraper_log["listings_found"] = len(listings)
-                logger.info(f"Found {len(listings)} listings from {self.source_name}")
+                queue = asyncio.Queue(maxsize=settings.SCRAPER_QUEUE_SIZE)
+                producer = asyncio.ensure_future(self._produce_pages(queue, checkpoint))
+                
+                try:
+                    # Process and save listings while scraping continues
+                    await self._consume_pages(queue, session)
+                finally:
+                    if not producer.done():
+                        producer.cancel()
+                
+                # Surface any error raised while scraping
+                await producer
                 
-                # Process and save listings
-                for listing_data in listings:
-                    await self._process_listing(listing_data, session)
+                logger.info(f"Found {self.scraper_log['listings_found']} listings from {self.source_name}")
+                await delete_scraper_checkpoint(self.source_name, session)
                 
                 # Log scraper run
                 self.scraper_log["end_time"] = datetime.utcnow()
@@ -60,7 +173,7 @@ class BaseScraper(ABC):
                     f"Added: {self.scraper_log['listings_added']}, "
                     f"Updated: {self.scraper_log['listings_updated']}"
                 )
-                
+        
         except Exception as e:
             logger.error(f"Error running scraper for {self.source_name}: {str(e)}")
             
@@ -71,31 +184,136 @@ class BaseScraper(ABC):
             
             async with AsyncSessionLocal() as session:
                 await create_scraper_log(self.scraper_log, session)
+            return
+        
+        await self._warm_searches()
+    
+    async def _warm_searches(self):
+        """
+        Precompute the responses of popular searches against the listings just scraped
+        
+        A failed warm-up leaves the previous responses in place and doesn't fail the run.
+        """
+        try:
+            with timed("warmup", SCRAPER_STAGE_SECONDS, self.source_name):
+                async with AsyncSessionLocal() as session:
+                    await warm_popular_searches(session)
+        except Exception as e:
+            logger.error(f"Error precomputing popular searches after {self.source_name} scrape: {str(e)}")
+    
+    async def _produce_pages(self, queue: asyncio.Queue, checkpoint: Optional[Dict[str, Any]]):
+        """
+        Feed scraped pages into the queue, followed by None when scraping ends
+        """
+        pages = self.scrape(checkpoint)
+        cancelled = False
+        try:
+            async for page in pages:
+                await queue.put(page)
+        except asyncio.CancelledError:
+            # The consumer has stopped, so nobody is waiting for the end marker
+            cancelled = True
+            raise
+        finally:
+            await pages.aclose()
+            if not cancelled:
+                await queue.put(None)
+    
+    async def _consume_pages(self, queue: asyncio.Queue, session: AsyncSession):
+        """
+        Write pages from the queue in batches and checkpoint after each page
+        
+        Each city's crawl is closed, updating its change rate and next crawl
+        time, once pages move on to the next city.
+        """
+        current_city = None
+        while True:
+            page = await queue.get()
+            if page is None:
+                break
+            
+            if current_city is not None and page["city"] != current_city:
+                await finish_city_crawl(self.source_name, current_city, session)
+            current_city = page["city"]
+            
+            await self._ingest_page(page["city"], page["listings"], session)
+            await save_scraper_checkpoint(self.source_name, page["city"], page["page"], session)
+        
+        if current_city is not None:
+            await finish_city_crawl(self.source_name, current_city, session)
     
-    async def _process_listing(self, listing_data: Dict[str, Any], session: AsyncSession):
+    async def _ingest_page(self, city: str, listings: List[ListingRecord], session: AsyncSession):
         """
-        Process a listing and save to database
+        Save a page of listings in batches, deduplicate them, alert saved searches
+        they match and add its counts to the city's crawl in progress
         """
-        # Add source to listing data
-        listing_data["source"] = self.source_name
+        with timed("ingest", SCRAPER_STAGE_SECONDS, self.source_name):
+            batch_size = settings.SCRAPER_BATCH_SIZE
+            page_counts = {"added": 0, "updated": 0}
+            changed = []
+            self.scraper_log["listings_found"] += len(listings)
+            for i in range(0, len(listings), batch_size):
+                counts = await self._process_batch(listings[i:i + batch_size], session, changed)
+                page_counts["added"] += counts["added"]
+                page_counts["updated"] += counts["updated"]
+            
+            # Link new and changed listings to other listings of the same unit
+            if settings.DEDUP_ENABLED:
+                await deduplicate_listings(session)
+            
+            # Matched after deduplication, so duplicates of a unit don't alert twice
+            if settings.SAVED_SEARCH_ALERTS and changed:
+                with timed("match", SCRAPER_STAGE_SECONDS, self.source_name):
+                    await match_saved_searches(changed, session)
+            
+            await add_city_crawl_progress(
+                self.source_name, city, len(listings), page_counts["added"], page_counts["updated"], session
+            )
+    
+    async def _process_batch(
+        self,
+        listings: List[ListingRecord],
+        session: AsyncSession,
+        changed: Optional[List[Listing]] = None,
+    ) -> Dict[str, int]:
+        """
+        Process a batch of listings and save to database
         
-        # Check if listing already exists by URL
-        # TODO: Implement check for existing listings
-        # For now, we'll assume all listings are new
+        Listings created or updated are appended to changed, when given.
         
-        # Extract amenities if present
-        amenities = listing_data.pop("amenities", None)
+        Returns:
+            Counts of added, updated and unchanged listings
+        """
+        # Create new listings and update changed ones, matched by URL
+        counts = await upsert_listings(listings, session, changed)
+        self.scraper_log["listings_added"] += counts["added"]
+        self.scraper_log["listings_updated"] += counts["updated"]
+        return counts
+    
+    async def scrape_page(self, city: str, page: int) -> Optional[List[ListingRecord]]:
+        """
+        Scrape a single page of results for a city, used by distributed workers
         
-        # Create listing
-        await create_listing(listing_data, amenities, session)
-        self.scraper_log["listings_added"] += 1
+        Returns:
+            Listing records of the page, or None when there are no more pages
+        """
+        raise NotImplementedError(f"{self.source_name} does not support scraping single pages")
+    
+    def close(self):
+        """
+        Release resources held between pages
+        """
+        pass
     
     @abstractmethod
-    async def scrape(self) -> List[Dict[str, Any]]:
+    def scrape(self, checkpoint: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
         """
         Scrape apartment listings from source
         
-        Returns:
-            List of dictionaries with listing data
+        Args:
+            checkpoint: Last fully ingested {"city": ..., "page": ...}, if resuming
+        
+        Yields:
+            Dictionaries with the city, page number and listing records of each results page
         """
-        pass 
\ No newline at end of file
+        pass
@@ -0,0 +1,295 @@
+"""
+Cross-source duplicate listing detection with MinHash and LSH.
+
+Each listing is reduced to a set of shingles: pairs of consecutive normalized
+words of its address and title, and bucketed price, bedrooms and square footage. A
+MinHash signature estimates the Jaccard similarity of two such sets, and
+splitting signatures into bands (locality-sensitive hashing) means only listings
+sharing a whole band are compared. The bands are kept in the listing_lsh_buckets
+table, so each lookup is an index scan, and every worker shares the index.
+
+A duplicate is linked to the canonical listing of its best match through
+Listing.canonical_id; search returns a unit's canonical listing, or its oldest
+available duplicate while the canonical listing is unavailable. Changing
+DEDUP_NUM_PERM or DEDUP_BANDS requires clearing Listing.minhash so every
+listing is signed again.
+"""
+
+import logging
+import random
+import re
+import zlib
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud import (
+    get_listings_by_id,
+    get_lsh_bucket_matches,
+    get_undeduplicated_listings,
+    replace_lsh_buckets,
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Permutations are (a * x + b) mod a Mersenne prime, truncated to 32 bits
+MERSENNE_PRIME = (1 << 61) - 1
+HASH_MASK = 0xFFFFFFFF
+SIGNATURE_SEED = 1
+
+# Bucket widths that make near-equal prices and sizes share a shingle
+PRICE_BUCKET = 100
+SQFT_BUCKET = 50
+
+# Shingles whose permuted hash values are kept before the cache is reset
+SHINGLE_CACHE_SIZE = 20000
+
+# Shingles given to a listing's house and unit number
+ADDRESS_NUMBER_WEIGHT = 5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|#")
+
+# Spellings that vary between sources, mapped to one form
+ADDRESS_ABBREVIATIONS = {
+    "st": "street",
+    "ave": "avenue",
+    "av": "avenue",
+    "blvd": "boulevard",
+    "rd": "road",
+    "dr": "drive",
+    "ln": "lane",
+    "ct": "court",
+    "pl": "place",
+    "hwy": "highway",
+    "pkwy": "parkway",
+    "ter": "terrace",
+    "n": "north",
+    "s": "south",
+    "e": "east",
+    "w": "west",
+    "apt": "unit",
+    "apartment": "unit",
+    "ste": "unit",
+    "suite": "unit",
+    "#": "unit",
+}
+
+
+def normalize_tokens(text: Optional[str]) -> List[str]:
+    """
+    Lowercase words of a text with address abbreviations expanded
+    """
+    return [ADDRESS_ABBREVIATIONS.get(token, token) for token in TOKEN_PATTERN.findall((text or "").lower())]
+
+
+def address_numbers(address: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    House number and unit number of an address, where present
+    """
+    tokens = normalize_tokens(address)
+    house = tokens[0] if tokens and tokens[0].isdigit() else None
+    unit = None
+    for token, following in zip(tokens, tokens[1:]):
+        if token == "unit":
+            unit = following
+            break
+    return house, unit
+
+
+def listing_shingles(
+    title: Optional[str],
+    address: Optional[str],
+    price: Optional[float],
+    bedrooms: Optional[int],
+    square_footage: Optional[float],
+) -> Set[str]:
+    """
+    Shingle set of a listing's identifying fields
+    """
+    # Word pairs rather than single words, so that common words like street
+    # names or "apartment" alone don't make unrelated listings candidates.
+    # Titles often repeat the address, so both share one set of word pairs.
+    shingles = set()
+    for text in (address, title):
+        tokens = normalize_tokens(text)
+        shingles.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+    # House and unit number together nearly identify a unit, so they get
+    # several shingles' worth of weight
+    house, unit = address_numbers(address)
+    if house is not None:
+        shingles.update(f"n{copy}:{house}/{unit}" for copy in range(ADDRESS_NUMBER_WEIGHT))
+    if price:
+        shingles.add(f"p:{round(price / PRICE_BUCKET)}")
+    if bedrooms is not None:
+        shingles.add(f"b:{bedrooms}")
+    if square_footage:
+        shingles.add(f"s:{round(square_footage / SQFT_BUCKET)}")
+    return shingles
+
+
+class MinHasher:
+    """
+    MinHash signatures of a fixed number of permutations
+
+    The permuted hash values of recent shingles are cached, since many
+    shingles (street names, price buckets, bedroom counts) recur across listings.
+    """
+
+    def __init__(self, num_perm: int, seed: int = SIGNATURE_SEED):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [
+            (rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+        self._cache: Dict[str, array] = {}
+
+    def _permuted(self, shingle: str) -> array:
+        """
+        Hash values of a shingle under every permutation
+        """
+        values = self._cache.get(shingle)
+        if values is None:
+            value = zlib.crc32(shingle.encode("utf-8"))
+            values = array("I", [((a * value + b) % MERSENNE_PRIME) & HASH_MASK for a, b in self.permutations])
+            if len(self._cache) >= SHINGLE_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[shingle] = values
+        return values
+
+    def signature(self, shingles: Iterable[str]) -> array:
+        """
+        Signature of a shingle set, as an array of unsigned 32-bit values
+        """
+        permuted = [self._permuted(shingle) for shingle in shingles]
+        if not permuted:
+            return array("I", [HASH_MASK] * self.num_perm)
+        return array("I", map(min, *permuted))
+
+
+@lru_cache(maxsize=None)
+def get_minhasher(num_perm: int) -> MinHasher:
+    """
+    Shared MinHasher for a signature length
+    """
+    return MinHasher(num_perm)
+
+
+def signature_from_bytes(data: bytes) -> array:
+    """
+    Load a signature stored with array.tobytes()
+    """
+    signature = array("I")
+    signature.frombytes(data)
+    return signature
+
+
+def band_buckets(signature: array, bands: int) -> List[Tuple[int, int]]:
+    """
+    (band, bucket) keys of a signature; listings sharing any key are candidates
+    """
+    rows = len(signature) // bands
+    return [
+        (band, zlib.crc32(signature[band * rows:(band + 1) * rows].tobytes()))
+        for band in range(bands)
+    ]
+
+
+def similarity(first: array, second: array) -> float:
+    """
+    Estimated Jaccard similarity of the shingle sets behind two signatures
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _conflicts(first: Optional[str], second: Optional[str]) -> bool:
+    return first is not None and second is not None and first != second
+
+
+def find_duplicate(signature: array, bedrooms: Optional[int], address: Optional[str], candidates, threshold: float):
+    """
+    Pick the most similar candidate listing that is a duplicate, if any
+
+    Candidates need bedrooms, address and minhash attributes. Listings with
+    different bedroom counts, house numbers or unit numbers are never
+    duplicates, however similar the rest of their fields are.
+    """
+    house, unit = address_numbers(address)
+    best = None
+    best_score = threshold
+    for candidate in candidates:
+        if bedrooms is not None and candidate.bedrooms is not None and bedrooms != candidate.bedrooms:
+            continue
+        candidate_house, candidate_unit = address_numbers(candidate.address)
+        if _conflicts(house, candidate_house) or _conflicts(unit, candidate_unit):
+            continue
+        score = similarity(signature, signature_from_bytes(candidate.minhash))
+        if score >= best_score:
+            best, best_score = candidate, score
+    return best
+
+
+async def deduplicate_listings(session: AsyncSession = None) -> int:
+    """
+    Sign every listing without a signature and link it to its canonical listing
+
+    Listings are handled in batches: one query finds every listing sharing an
+    LSH key with the batch, and the batch's keys are written in bulk. Listings
+    are matched against older listings only, so canonical links always point
+    to lower ids and never form cycles.
+
+    Returns:
+        Number of listings linked as duplicates
+    """
+    hasher = get_minhasher(settings.DEDUP_NUM_PERM)
+    linked = 0
+    while True:
+        listings = await get_undeduplicated_listings(settings.SCRAPER_BATCH_SIZE, session)
+        if not listings:
+            break
+
+        signed = []
+        for listing in listings:
+            signature = hasher.signature(listing_shingles(
+                listing.title, listing.address, listing.price, listing.bedrooms, listing.square_footage
+            ))
+            signed.append((listing, signature, band_buckets(signature, settings.DEDUP_BANDS)))
+
+        # Keys of signed listings; stale keys of the batch's own listings are replaced below
+        batch_ids = {listing.id for listing in listings}
+        index = defaultdict(set)
+        keys = {key for _, _, buckets in signed for key in buckets}
+        for listing_id, band, bucket in await get_lsh_bucket_matches(keys, session):
+            if listing_id not in batch_ids:
+                index[(band, bucket)].add(listing_id)
+        known = await get_listings_by_id({listing_id for ids in index.values() for listing_id in ids}, session)
+
+        for listing, signature, buckets in signed:
+            candidates = [
+                known[candidate_id]
+                for candidate_id in {candidate_id for key in buckets for candidate_id in index.get(key, ())}
+                if candidate_id < listing.id
+            ]
+            match = find_duplicate(signature, listing.bedrooms, listing.address, candidates, settings.DEDUP_THRESHOLD)
+
+            listing.canonical_id = None
+            if match is not None:
+                listing.canonical_id = match.canonical_id or match.id
+                linked += 1
+            listing.minhash = signature.tobytes()
+
+            # Later listings of the batch are matched against this one
+            known[listing.id] = listing
+            for key in buckets:
+                index[key].add(listing.id)
+
+        await replace_lsh_buckets({listing.id: buckets for listing, _, buckets in signed}, session)
+        await session.commit()
+
+    if linked:
+        logger.info(f"Linked {linked} duplicate listings to their canonical listings")
+    return linked
@@ -0,0 +1,195 @@
+"""
+HTML parsing backends for listing pages.
+
+Parsing is kept in module-level functions so it can be shipped to a
+process pool by the scrapers without pickling the scraper itself.
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Listing card markup - Note: Actual class names may vary based on Zillow's current HTML structure
+CARD_CLASS = "list-card"
+CARD_SELECTORS = {
+    "link": ".list-card-link",
+    "price": ".list-card-price",
+    "address": ".list-card-addr",
+    "details": ".list-card-details",
+    "image": ".list-card-img",
+}
+
+# Precompiled extraction patterns
+PRICE_PATTERN = re.compile(r"\$?(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)")
+BEDROOMS_PATTERN = re.compile(r"(\d+)\s*bd", re.IGNORECASE)
+BATHROOMS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*ba", re.IGNORECASE)
+SQFT_PATTERN = re.compile(r"(\d+(?:,\d{3})*)\s*sqft", re.IGNORECASE)
+
+# Backends in order of preference for "auto"
+PARSER_BACKENDS = ["selectolax", "lxml", "html.parser"]
+
+
+def _backend_available(name: str) -> bool:
+    """
+    Check whether the library behind a parser backend is installed
+    """
+    if name == "html.parser":
+        return True
+    try:
+        if name == "lxml":
+            import lxml  # noqa: F401
+        elif name == "selectolax":
+            import selectolax.lexbor  # noqa: F401
+        else:
+            return False
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_parser_backend(name: str = "auto") -> str:
+    """
+    Resolve a configured backend name to one that is installed
+    """
+    if name == "auto":
+        for candidate in PARSER_BACKENDS:
+            if _backend_available(candidate):
+                return candidate
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {name}")
+    if not _backend_available(name):
+        logger.warning(f"Parser backend {name} is not installed. Falling back to html.parser.")
+        return "html.parser"
+    return name
+
+
+def _is_card_class(value) -> bool:
+    """
+    Match the card class whether the parser hands over the raw attribute or its split values
+    """
+    if not value:
+        return False
+    if isinstance(value, str):
+        return CARD_CLASS in value.split()
+    return CARD_CLASS in value
+
+
+def _parse_cards_soup(html: str, parser: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Extract raw card fields with BeautifulSoup, building only the card subtrees
+    """
+    strainer = SoupStrainer(class_=_is_card_class)
+    soup = BeautifulSoup(html, parser, parse_only=strainer)
+
+    cards = []
+    for card in soup.find_all(class_=CARD_CLASS):
+        link = card.select_one(CARD_SELECTORS["link"])
+        price = card.select_one(CARD_SELECTORS["price"])
+        address = card.select_one(CARD_SELECTORS["address"])
+        details = card.select_one(CARD_SELECTORS["details"])
+        image = card.select_one(CARD_SELECTORS["image"])
+        cards.append({
+            "url": link.get("href") if link else None,
+            "title": link.get_text() if link else None,
+            "price": price.get_text() if price else None,
+            "address": address.get_text() if address else None,
+            "details": details.get_text() if details else None,
+            "image_url": (image.get("src") or image.get("data-src")) if image else None,
+        })
+    return cards
+
+
+def _parse_cards_selectolax(html: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Extract raw card fields with the lexbor engine from selectolax
+    """
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+
+    cards = []
+    for card in tree.css(f".{CARD_CLASS}"):
+        link = card.css_first(CARD_SELECTORS["link"])
+        price = card.css_first(CARD_SELECTORS["price"])
+        address = card.css_first(CARD_SELECTORS["address"])
+        details = card.css_first(CARD_SELECTORS["details"])
+        image = card.css_first(CARD_SELECTORS["image"])
+        cards.append({
+            "url": link.attributes.get("href") if link else None,
+            "title": link.text() if link else None,
+            "price": price.text() if price else None,
+            "address": address.text() if address else None,
+            "details": details.text() if details else None,
+            "image_url": (image.attributes.get("src") or image.attributes.get("data-src")) if image else None,
+        })
+    return cards
+
+
+def parse_listing_cards(html: str, backend: str = "html.parser") -> List[Dict[str, Optional[str]]]:
+    """
+    Extract the raw text fields of every listing card on a page
+
+    Args:
+        html: Page source
+        backend: One of PARSER_BACKENDS, already resolved
+
+    Returns:
+        List of dictionaries with url, title, price, address, details and image_url text
+    """
+    if backend == "selectolax":
+        return _parse_cards_selectolax(html)
+    return _parse_cards_soup(html, backend)
+
+
+def extract_listing_fields(card: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """
+    Convert raw card text into typed listing fields using the precompiled patterns
+    """
+    title = (card.get("title") or "").strip()
+    fields = {
+        "url": card.get("url"),
+        "title": title or "Apartment for Rent",
+        "price": 0,
+        "address": (card.get("address") or "").strip(),
+        "bedrooms": 0,
+        "bathrooms": 0,
+        "square_footage": 0,
+        "image_url": card.get("image_url") or "",
+    }
+
+    price_text = card.get("price")
+    if price_text:
+        price_match = PRICE_PATTERN.search(price_text)
+        if price_match:
+            fields["price"] = float(price_match.group(1).replace(",", ""))
+
+    details_text = card.get("details")
+    if details_text:
+        bed_match = BEDROOMS_PATTERN.search(details_text)
+        if bed_match:
+            fields["bedrooms"] = int(bed_match.group(1))
+
+        bath_match = BATHROOMS_PATTERN.search(details_text)
+        if bath_match:
+            fields["bathrooms"] = float(bath_match.group(1))
+
+        sqft_match = SQFT_PATTERN.search(details_text)
+        if sqft_match:
+            fields["square_footage"] = float(sqft_match.group(1).replace(",", ""))
+
+    return fields
+
+
+def parse_listing_page(html: str, backend: str = "html.parser") -> List[Dict[str, Any]]:
+    """
+    Parse a results page into typed listing fields
+
+    This is the unit of work submitted to the parse process pool.
+    """
+    return [extract_listing_fields(card) for card in parse_listing_cards(html, backend)]
+
@@ -0,0 +1,228 @@
+"""
+Adaptive re-crawl intervals per (source, city).
+
+Listings in a city are modelled as changing independently at a Poisson rate.
+If a fraction f of the listings seen in a crawl changed since the crawl before,
+Delta hours earlier, the rate estimate is -ln(1 - f) / Delta changes per listing
+per hour, smoothed across crawls.
+
+A source's cities share the request budget of crawling all of them every
+SCRAPER_INTERVAL_HOURS (or the source's override). Crawling a city costs
+requests in proportion to its listings, and every time a city's crawl
+finishes the budget is divided again to maximize the time-averaged fraction
+of stored listings that are still current: a city re-crawled every I hours
+at change rate r gets the interval where the freshness gained per request,
+(1 - (1 + rI) e^(-rI)) / r, is the same for every city. Cities changing too
+fast to keep fresh within the budget are crawled less often, not more.
+Intervals are bounded by SCRAPER_MIN_INTERVAL_HOURS and
+SCRAPER_MAX_INTERVAL_HOURS, and cities without a change rate yet are
+crawled every SCRAPER_INTERVAL_HOURS.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud import create_scraper_log, get_city_crawl_stats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Changed fractions are capped below 1, where the rate estimate is unbounded
+MAX_CHANGED_FRACTION = 0.99
+
+# Bisection steps when dividing the request budget, and the lowest price of freshness tried
+BISECTION_STEPS = 30
+MIN_PRICE = 1e-9
+
+
+def estimate_change_rate(
+    previous_rate: Optional[float],
+    found: int,
+    changed: int,
+    elapsed_hours: float,
+    smoothing: float,
+) -> Optional[float]:
+    """
+    Update the smoothed change rate with one crawl's observation
+    """
+    if found <= 0 or elapsed_hours <= 0:
+        return previous_rate
+
+    fraction = min(changed / found, MAX_CHANGED_FRACTION)
+    observed = -math.log(1 - fraction) / elapsed_hours
+    if previous_rate is None:
+        return observed
+    return smoothing * observed + (1 - smoothing) * previous_rate
+
+
+def _freshness_gain(x: float) -> float:
+    """
+    Rate-scaled gain in freshness from crawling more often, at x = rate * interval
+    """
+    return 1 - (1 + x) * math.exp(-x)
+
+
+def _budgeted_interval(rate: float, price: float, min_hours: float, max_hours: float) -> float:
+    """
+    Interval at which a city's freshness gain per request equals the price
+    """
+    # The gain grows with the interval, so the bounds settle the extremes
+    if _freshness_gain(rate * max_hours) <= price * rate:
+        return max_hours
+    if _freshness_gain(rate * min_hours) >= price * rate:
+        return min_hours
+    low, high = min_hours, max_hours
+    for _ in range(BISECTION_STEPS):
+        middle = (low + high) / 2
+        if _freshness_gain(rate * middle) < price * rate:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def allocate_intervals(
+    cities: Dict[str, Tuple[int, Optional[float]]],
+    budget_hours: float,
+    min_hours: float,
+    max_hours: float,
+) -> Dict[str, float]:
+    """
+    Re-crawl intervals that keep the most listings fresh for the request budget
+
+    Args:
+        cities: (listings, change rate per hour or None) by city
+        budget_hours: Interval at which crawling every city spends the budget;
+            cities without a change rate are crawled at it
+
+    Returns:
+        Hours between crawls by city
+    """
+    intervals = {}
+    # Listings crawled per hour the budget allows, less what unlearned cities spend
+    budget = 0.0
+    learned = {}
+    for city, (listings, rate) in cities.items():
+        cost = max(listings, 1)
+        budget += cost / budget_hours
+        if rate is None:
+            intervals[city] = min(max(budget_hours, min_hours), max_hours)
+        elif rate <= 0:
+            intervals[city] = max_hours
+        else:
+            learned[city] = (cost, rate)
+            continue
+        budget -= cost / intervals[city]
+    if not learned:
+        return intervals
+
+    def spend(price: float) -> Dict[str, float]:
+        return {city: _budgeted_interval(rate, price, min_hours, max_hours) for city, (_, rate) in learned.items()}
+
+    def cost_per_hour(allocation: Dict[str, float]) -> float:
+        return sum(cost / allocation[city] for city, (cost, _) in learned.items())
+
+    # Raising the price lengthens every interval, so it is bisected (geometrically) to the budget
+    low = MIN_PRICE
+    high = 1 / min(rate for _, rate in learned.values())
+    allocation = spend(low)
+    if cost_per_hour(allocation) > budget:
+        for _ in range(BISECTION_STEPS):
+            middle = math.sqrt(low * high)
+            if cost_per_hour(spend(middle)) > budget:
+                low = middle
+            else:
+                high = middle
+        allocation = spend(high)
+    intervals.update(allocation)
+    return intervals
+
+
+async def finish_city_crawl(source: str, city: str, session: AsyncSession = None) -> Optional[float]:
+    """
+    Close the city's crawl in progress: log it, update its change rate and re-divide the source's budget
+
+    Returns:
+        Hours until the city's next crawl, or None if no crawl was in progress
+    """
+    all_stats = await get_city_crawl_stats(source, session=session)
+    stats = all_stats.get(city)
+    if stats is None or stats.pending_started_at is None:
+        return None
+
+    now = datetime.utcnow()
+    found = stats.pending_found or 0
+    added = stats.pending_added or 0
+    updated = stats.pending_updated or 0
+
+    # The first crawl finds every listing new, so it only sets the baseline
+    if stats.last_crawled_at is not None:
+        elapsed_hours = (now - stats.last_crawled_at).total_seconds() / 3600
+        stats.change_rate = estimate_change_rate(
+            stats.change_rate, found, added + updated, elapsed_hours, settings.SCRAPER_CHANGE_RATE_SMOOTHING
+        )
+    stats.listings_found = found
+    stats.crawls = (stats.crawls or 0) + 1
+    stats.last_crawled_at = now
+
+    # Cities that never finished a crawl are due anyway and spend none of the budget yet
+    crawled = {name: city_stats for name, city_stats in all_stats.items() if city_stats.last_crawled_at is not None}
+    intervals = allocate_intervals(
+        {name: (city_stats.listings_found or 0, city_stats.change_rate) for name, city_stats in crawled.items()},
+        settings.SCRAPER_SOURCE_INTERVAL_HOURS.get(source, settings.SCRAPER_INTERVAL_HOURS),
+        settings.SCRAPER_MIN_INTERVAL_HOURS,
+        settings.SCRAPER_MAX_INTERVAL_HOURS,
+    )
+    for name, city_stats in crawled.items():
+        city_stats.interval_hours = intervals[name]
+        city_stats.next_crawl_at = city_stats.last_crawled_at + timedelta(hours=intervals[name])
+
+    started_at = stats.pending_started_at
+    stats.pending_started_at = None
+
+    logger.info(
+        f"Crawled {city} on {source}: {found} found, {added} added, {updated} updated. "
+        f"Next crawl in {stats.interval_hours:.1f} hours"
+    )
+
+    # create_scraper_log commits the stats update along with the log
+    await create_scraper_log({
+        "source": source,
+        "city": city,
+        "start_time": started_at,
+        "end_time": now,
+        "listings_found": found,
+        "listings_added": added,
+        "listings_updated": updated,
+        "success": True,
+    }, session)
+    return stats.interval_hours
+
+
+async def get_due_cities(source: str, cities: List[str], session: AsyncSession = None) -> List[str]:
+    """
+    Filter cities down to those due for a crawl, keeping their order
+
+    Cities that were never crawled, or have a crawl in progress, are due.
+    """
+    if not settings.SCRAPER_ADAPTIVE_INTERVALS:
+        return list(cities)
+
+    now = datetime.utcnow()
+    stats = await get_city_crawl_stats(source, cities, session)
+    due = []
+    for city in cities:
+        city_stats = stats.get(city)
+        if (
+            city_stats is None
+            or city_stats.next_crawl_at is None
+            or city_stats.pending_started_at is not None
+            or city_stats.next_crawl_at <= now
+        ):
+            due.append(city)
+    return due
@@ -0,0 +1,77 @@
+"""
+Recorded pages for offline scraper runs.
+
+In "record" mode every page a scraper fetches is also saved to disk; in
+"replay" mode pages are served from disk instead of the network, so a recorded
+crawl can be re-run, tested and benchmarked without touching the source site.
+Pages are stored per source, one file per URL, named by the URL's hash.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+
+FETCH_MODES = ["live", "record", "replay"]
+
+
+class PageNotRecorded(KeyError):
+    """
+    Raised when replaying a URL that was never recorded
+    """
+
+
+class PageStore:
+    """
+    Directory of recorded pages for one source
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, url: str) -> Path:
+        """
+        File a URL is recorded in
+        """
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.html"
+
+    def __contains__(self, url: str) -> bool:
+        return self._path(url).exists()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.directory.glob("*.html")) if self.directory.exists() else 0
+
+    def save(self, url: str, html: str):
+        """
+        Record a page, replacing any earlier recording of the URL
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        # Write to a temporary file first so a replay never reads a partial page
+        partial = path.with_suffix(".part")
+        partial.write_text(html, encoding="utf-8")
+        os.replace(partial, path)
+
+    def load(self, url: str) -> str:
+        """
+        Read a recorded page
+        """
+        try:
+            return self._path(url).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            raise PageNotRecorded(url) from None
+
+
+def get_page_store(source_name: str, mode: Optional[str] = None) -> Optional[PageStore]:
+    """
+    Page store of a source for the fetch mode, or None when fetching live
+    """
+    mode = mode or settings.SCRAPER_FETCH_MODE
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode {mode!r}, expected one of {', '.join(FETCH_MODES)}")
+    if mode == "live":
+        return None
+    return PageStore(os.path.join(settings.SCRAPER_RECORDINGS_DIR, source_name))
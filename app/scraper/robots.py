@@ -0,0 +1,289 @@
+"""
+robots.txt parsing and matching.
+
+Rules follow RFC 9309: "*" matches any sequence of characters, a trailing "$"
+anchors the pattern to the end of the path, and the longest matching pattern
+decides, with Allow winning ties. The rules of the selected user-agent group are
+compiled into a trie whose wildcard states are determinized lazily as paths are
+matched, so each character of a path costs one transition lookup. Decisions are
+memoized per path.
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Memoized decisions kept per rule set before the cache is reset
+DECISION_CACHE_SIZE = 100000
+
+# Determinized states kept per rule set before they are rebuilt from scratch
+STATE_CACHE_SIZE = 10000
+
+
+class _Node:
+    """
+    Trie node: literal children, an optional "*" child and the rules ending here
+    """
+    __slots__ = ("children", "star", "is_star", "rule", "end_rule")
+
+    def __init__(self, is_star: bool = False):
+        self.children: Dict[str, "_Node"] = {}
+        self.star: Optional["_Node"] = None
+        self.is_star = is_star
+        # (pattern length, allow) of the strongest rule matching a prefix ending here
+        self.rule: Optional[Tuple[int, bool]] = None
+        # Same, for rules anchored with "$" that only match at the end of the path
+        self.end_rule: Optional[Tuple[int, bool]] = None
+
+
+class _State:
+    """
+    Determinized matcher state: the set of trie nodes a path prefix can be in
+    """
+    __slots__ = ("nodes", "rule", "end_rule", "transitions")
+
+    def __init__(self, nodes: FrozenSet[_Node]):
+        self.nodes = nodes
+        self.rule = None
+        self.end_rule = None
+        for node in nodes:
+            if node.rule is not None:
+                self.rule = _stronger(self.rule, node.rule)
+            if node.end_rule is not None:
+                self.end_rule = _stronger(self.end_rule, node.end_rule)
+        self.transitions: Dict[str, "_State"] = {}
+
+
+def _stronger(current: Optional[Tuple[int, bool]], candidate: Tuple[int, bool]) -> Tuple[int, bool]:
+    """
+    Pick the rule that takes precedence: longest pattern, then Allow over Disallow
+    """
+    if current is None or candidate > current:
+        return candidate
+    return current
+
+
+class RobotsRules:
+    """
+    Compiled rules of one robots.txt user-agent group
+    """
+
+    def __init__(self, rules: List[Tuple[bool, str]], crawl_delay: Optional[float] = None, sitemaps: List[str] = None):
+        """
+        Args:
+            rules: (allow, pattern) pairs in file order
+            crawl_delay: Crawl-delay of the group in seconds, if given
+            sitemaps: Sitemap URLs listed in the file
+        """
+        self.rules = rules
+        self.crawl_delay = crawl_delay
+        self.sitemaps = sitemaps or []
+        self._root = _Node()
+        self._cache: Dict[str, bool] = {}
+        self._states: Dict[FrozenSet[_Node], _State] = {}
+        self._start: Optional[_State] = None
+
+        for allow, pattern in rules:
+            self._add_rule(allow, pattern)
+
+    def _add_rule(self, allow: bool, pattern: str):
+        """
+        Insert a rule into the trie
+        """
+        priority = (len(pattern), allow)
+        anchored = pattern.endswith("$")
+        if anchored:
+            pattern = pattern[:-1]
+        elif pattern.endswith("*"):
+            # A trailing wildcard adds nothing to a prefix match
+            pattern = pattern.rstrip("*")
+
+        node = self._root
+        for char in pattern:
+            if char == "*":
+                if node.is_star:
+                    continue
+                if node.star is None:
+                    node.star = _Node(is_star=True)
+                node = node.star
+            else:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _Node()
+                node = child
+
+        if anchored:
+            node.end_rule = _stronger(node.end_rule, priority)
+        else:
+            node.rule = _stronger(node.rule, priority)
+
+    @staticmethod
+    def _closure(nodes) -> FrozenSet[_Node]:
+        """
+        Add the "*" children reachable without consuming a character
+        """
+        closure = set()
+        for node in nodes:
+            while node is not None and node not in closure:
+                closure.add(node)
+                node = node.star
+        return frozenset(closure)
+
+    def _initial_state(self) -> _State:
+        """
+        Get the start state, resetting the determinized states when there are too many
+        """
+        if self._start is None or len(self._states) >= STATE_CACHE_SIZE:
+            self._states = {}
+            self._start = self._intern(self._closure([self._root]))
+        return self._start
+
+    def _intern(self, nodes: FrozenSet[_Node]) -> _State:
+        """
+        Get the state for a set of trie nodes, creating it on first use
+        """
+        state = self._states.get(nodes)
+        if state is None:
+            state = self._states[nodes] = _State(nodes)
+        return state
+
+    def _step(self, state: _State, char: str) -> _State:
+        """
+        Compute and remember the transition from a state on a character
+        """
+        following = []
+        for node in state.nodes:
+            child = node.children.get(char)
+            if child is not None:
+                following.append(child)
+            if node.is_star:
+                following.append(node)
+        target = self._intern(self._closure(following))
+        state.transitions[char] = target
+        return target
+
+    def _decide(self, path: str) -> bool:
+        """
+        Run the automaton over a path and return whether it may be fetched
+        """
+        best = None
+        state = self._initial_state()
+
+        for char in path:
+            if state.rule is not None and (best is None or state.rule > best):
+                best = state.rule
+            if not state.nodes:
+                break
+            next_state = state.transitions.get(char)
+            if next_state is None:
+                next_state = self._step(state, char)
+            state = next_state
+        else:
+            if state.rule is not None:
+                best = _stronger(best, state.rule)
+            if state.end_rule is not None:
+                best = _stronger(best, state.end_rule)
+
+        # Anything not matched by a rule is allowed
+        return best is None or best[1]
+
+    def is_path_allowed(self, path: str) -> bool:
+        """
+        Check a path (including any query string) against the rules
+        """
+        try:
+            return self._cache[path]
+        except KeyError:
+            pass
+
+        allowed = self._decide(path)
+        if len(self._cache) >= DECISION_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[path] = allowed
+        return allowed
+
+    def is_url_allowed(self, url: str) -> bool:
+        """
+        Check a URL against the rules
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        return self.is_path_allowed(path)
+
+
+def parse_robots_txt(content: str, user_agent: str) -> RobotsRules:
+    """
+    Parse robots.txt content and compile the group that applies to a user agent
+
+    The group whose User-agent token is the longest match for the agent is used,
+    falling back to the "*" group. Groups naming the same agent are merged.
+    """
+    agent = user_agent.lower()
+    groups: List[Tuple[List[str], List[Tuple[bool, str]], List[float]]] = []
+    sitemaps = []
+    current = None
+    in_rules = False
+
+    for line in content.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = line.split(":", 1)
+        field = field.strip().lower()
+        value = value.strip()
+
+        if field == "user-agent":
+            # Consecutive User-agent lines share one group
+            if current is None or in_rules:
+                current = ([], [], [])
+                groups.append(current)
+                in_rules = False
+            current[0].append(value.lower())
+        elif field in ("allow", "disallow"):
+            if current is None:
+                continue
+            in_rules = True
+            # An empty Disallow allows everything and adds no rule
+            if value:
+                current[1].append((field == "allow", value))
+        elif field == "crawl-delay":
+            if current is None:
+                continue
+            in_rules = True
+            try:
+                current[2].append(float(value))
+            except ValueError:
+                logger.warning(f"Ignoring invalid Crawl-delay: {value}")
+        elif field == "sitemap":
+            sitemaps.append(value)
+
+    # Pick the most specific group token matching the agent
+    selected_token = "*"
+    for tokens, _, _ in groups:
+        for token in tokens:
+            if token != "*" and token in agent and len(token) > len(selected_token):
+                selected_token = token
+
+    rules = []
+    delays = []
+    for tokens, group_rules, group_delays in groups:
+        if selected_token in tokens:
+            rules.extend(group_rules)
+            delays.extend(group_delays)
+
+    return RobotsRules(rules, crawl_delay=delays[0] if delays else None, sitemaps=sitemaps)
+
+
+@lru_cache(maxsize=None)
+def get_robots_rules(path: str, user_agent: str) -> RobotsRules:
+    """
+    Load and compile a robots.txt file, shared by every scraper that uses it
+    """
+    with open(path, encoding="utf-8") as robots_file:
+        return parse_robots_txt(robots_file.read(), user_agent)
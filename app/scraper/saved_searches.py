@@ -0,0 +1,264 @@
+"""
+Reverse matching of scraped listings against saved searches.
+
+Instead of running every saved search after a scrape, saved searches are kept
+in an in-memory predicate index and each listing added or updated looks up
+the searches it satisfies. Searches are bucketed by city and by their
+minimum bedrooms and bathrooms, which take few distinct values, so a listing
+visits only the buckets of its city (and of searches without one) whose
+minimums it meets. Within a bucket, a centered interval tree over the
+searches' price ranges returns those whose range contains the listing's
+price in O(log n + matches), without looking at the rest.
+
+Search semantics follow get_listings, except that cities match exactly
+(ignoring case) rather than by substring. Matches are queued in the
+saved_search_matches table, once per search and listing, for delivery.
+"""
+
+import logging
+import math
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud import add_saved_search_matches, get_saved_search_changes, get_shown_listing_ids
+from app.db.models import Listing
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+Interval = Tuple[float, float, int]
+BucketKey = Tuple[Optional[str], Optional[int], Optional[float]]
+
+
+class _IntervalNode:
+    __slots__ = ("center", "left", "right", "lows", "low_ids", "neg_highs", "high_ids")
+
+
+def _build_tree(intervals: List[Interval]) -> Optional[_IntervalNode]:
+    if not intervals:
+        return None
+
+    # The median endpoint is an endpoint of some interval, which then contains
+    # it, so every node holds at least one interval
+    points = sorted(point for low, high, _ in intervals for point in (low, high) if math.isfinite(point))
+    center = points[len(points) // 2] if points else 0.0
+
+    left, right, here = [], [], []
+    for interval in intervals:
+        if interval[1] < center:
+            left.append(interval)
+        elif interval[0] > center:
+            right.append(interval)
+        else:
+            here.append(interval)
+
+    node = _IntervalNode()
+    node.center = center
+    # Intervals containing the center, by ascending low and by descending high,
+    # so those containing a point are a prefix of one of the lists
+    here.sort(key=lambda interval: interval[0])
+    node.lows = [interval[0] for interval in here]
+    node.low_ids = [interval[2] for interval in here]
+    here.sort(key=lambda interval: -interval[1])
+    node.neg_highs = [-interval[1] for interval in here]
+    node.high_ids = [interval[2] for interval in here]
+    node.left = _build_tree(left)
+    node.right = _build_tree(right)
+    return node
+
+
+class IntervalTree:
+    """
+    Closed intervals with ids, answering which intervals contain a point
+
+    The tree is rebuilt on the first lookup after intervals change.
+    """
+
+    def __init__(self):
+        self.intervals: Dict[int, Tuple[float, float]] = {}
+        self._root = None
+        self._stale = False
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, interval_id: int, low: float, high: float):
+        self.intervals[interval_id] = (low, high)
+        self._stale = True
+
+    def remove(self, interval_id: int):
+        if self.intervals.pop(interval_id, None) is not None:
+            self._stale = True
+
+    def stab(self, point: float) -> List[int]:
+        """
+        Ids of the intervals containing a point
+        """
+        if self._stale:
+            self._root = _build_tree([(low, high, interval_id) for interval_id, (low, high) in self.intervals.items()])
+            self._stale = False
+
+        found = []
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                found.extend(node.low_ids[:bisect_right(node.lows, point)])
+                node = node.left
+            elif point > node.center:
+                found.extend(node.high_ids[:bisect_right(node.neg_highs, -point)])
+                node = node.right
+            else:
+                found.extend(node.low_ids)
+                break
+        return found
+
+
+def _city_key(city: Optional[str]) -> Optional[str]:
+    return " ".join(city.lower().split()) if city else None
+
+
+class SavedSearchIndex:
+    """
+    Saved searches indexed by city, minimum bedrooms and bathrooms, and price range
+    """
+
+    def __init__(self):
+        # (city key, min bedrooms, min bathrooms) -> price ranges of the searches with those parameters
+        self._trees: Dict[BucketKey, IntervalTree] = {}
+        # City key -> (min bedrooms, min bathrooms) of its buckets
+        self._buckets: Dict[Optional[str], List[Tuple[Optional[int], Optional[float]]]] = defaultdict(list)
+        self._search_keys: Dict[int, BucketKey] = {}
+        self._watermark = None
+        self._refreshed_at = None
+
+    def __len__(self):
+        return len(self._search_keys)
+
+    def add(
+        self,
+        search_id: int,
+        city: Optional[str] = None,
+        min_bedrooms: Optional[int] = None,
+        min_bathrooms: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+    ):
+        """
+        Index a saved search by its parameters, replacing any earlier version
+        """
+        low = -math.inf if min_price is None else min_price
+        high = math.inf if max_price is None else max_price
+        key = (_city_key(city), min_bedrooms, min_bathrooms)
+        if self._search_keys.get(search_id) == key and self._trees[key].intervals.get(search_id) == (low, high):
+            # Refreshes read recent changes again; leave the tree as built
+            return
+
+        self.remove(search_id)
+        if low > high:
+            # No price can match
+            return
+
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = self._trees[key] = IntervalTree()
+            self._buckets[key[0]].append(key[1:])
+        tree.add(search_id, low, high)
+        self._search_keys[search_id] = key
+
+    def remove(self, search_id: int):
+        key = self._search_keys.pop(search_id, None)
+        if key is None:
+            return
+        tree = self._trees[key]
+        tree.remove(search_id)
+        if not tree:
+            del self._trees[key]
+            self._buckets[key[0]].remove(key[1:])
+
+    def match(
+        self,
+        city: Optional[str],
+        bedrooms: Optional[int],
+        bathrooms: Optional[float],
+        price: float,
+    ) -> List[int]:
+        """
+        Ids of the saved searches a listing satisfies
+        """
+        matches = []
+        # Searches without a city match listings anywhere
+        for city_key in {_city_key(city), None}:
+            for min_bedrooms, min_bathrooms in self._buckets.get(city_key, ()):
+                if min_bedrooms is not None and (bedrooms is None or min_bedrooms > bedrooms):
+                    continue
+                if min_bathrooms is not None and (bathrooms is None or min_bathrooms > bathrooms):
+                    continue
+                matches.extend(self._trees[(city_key, min_bedrooms, min_bathrooms)].stab(price))
+        return matches
+
+    def match_listing(self, listing: Listing) -> List[int]:
+        return self.match(listing.city, listing.bedrooms, listing.bathrooms, listing.price)
+
+    async def refresh(self, session: AsyncSession):
+        """
+        Load every active saved search, or those created or deactivated since the last refresh
+        """
+        first_load = self._watermark is None
+        started = time.perf_counter()
+        rows, self._watermark = await get_saved_search_changes(self._watermark, session)
+        for search_id, is_active, *params in rows:
+            if is_active:
+                self.add(search_id, *params)
+            else:
+                self.remove(search_id)
+        self._refreshed_at = time.monotonic()
+
+        if first_load or rows:
+            logger.info(
+                f"Saved search index has {len(self)} searches "
+                f"({len(rows)} loaded in {time.perf_counter() - started:.2f}s)"
+            )
+
+    def refresh_due(self, interval_seconds: float) -> bool:
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at >= interval_seconds
+
+
+@lru_cache(maxsize=None)
+def get_saved_search_index() -> SavedSearchIndex:
+    """
+    Saved search index shared by the process's scrapers
+    """
+    return SavedSearchIndex()
+
+
+async def match_saved_searches(listings: Iterable[Listing], session: AsyncSession) -> int:
+    """
+    Queue alerts for the saved searches matching added or updated listings
+
+    Listings that search would not return, unavailable ones and duplicates
+    hidden behind an available listing of their unit, are skipped.
+
+    Returns:
+        Number of new matches queued
+    """
+    index = get_saved_search_index()
+    if index.refresh_due(settings.SAVED_SEARCH_REFRESH_SECONDS):
+        await index.refresh(session)
+    if not len(index):
+        return 0
+
+    listings = [listing for listing in listings if listing.is_available]
+    shown = await get_shown_listing_ids([listing.id for listing in listings], session)
+    matches = [
+        (search_id, listing.id)
+        for listing in listings
+        if listing.id in shown
+        for search_id in index.match_listing(listing)
+    ]
+    return await add_saved_search_matches(matches, session)
@@ -1,11 +1,12 @@
 import asyncio
 import logging
-import schedule
+import random
 import time
-from datetime import datetime
-from typing import List
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
 
 from app.core.config import settings
+from app.scraper.base import BaseScraper
 from app.scraper.zillow_scraper import ZillowScraper
 
 # Set up logging
@@ -15,77 +16,175 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Scrapers run by the scheduler, keyed by source name
+SCRAPER_FACTORIES: Dict[str, Callable[[], BaseScraper]] = {
+    "zillow.com": ZillowScraper,
+}
+
 class ScraperScheduler:
     """
-    Scheduler for running apartment listing scrapers periodically
+    Asyncio scheduler for running apartment listing scrapers periodically
+    
+    Runs inside an existing event loop (the API's, or a standalone worker's).
+    Each source has its own interval plus random jitter, sources run
+    concurrently up to SCRAPER_MAX_CONCURRENCY, and a source is never started
+    again while its previous run is still going.
     """
     
-    def __init__(self):
-        self.scrapers = [
-            ZillowScraper(),  # Only using Zillow scraper
-        ]
-        self.interval_hours = settings.SCRAPER_INTERVAL_HOURS
+    def __init__(self, factories: Optional[Dict[str, Callable[[], BaseScraper]]] = None):
+        self.factories = factories or SCRAPER_FACTORIES
+        self.jitter_seconds = settings.SCRAPER_JITTER_SECONDS
         self.is_running = False
+        self._semaphore = None
+        self._wakeup = None
+        self._loop_task = None
+        self._run_tasks: Dict[str, asyncio.Task] = {}
+        
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        # With adaptive intervals each run only crawls the cities that are due,
+        # so sources are checked as often as the shortest city interval allows
+        default_hours = settings.SCRAPER_INTERVAL_HOURS
+        if settings.SCRAPER_ADAPTIVE_INTERVALS:
+            default_hours = settings.SCRAPER_MIN_INTERVAL_HOURS
+        
+        for source in self.factories:
+            hours = settings.SCRAPER_SOURCE_INTERVAL_HOURS.get(source, default_hours)
+            self.sources[source] = {
+                "interval_seconds": hours * 3600,
+                "scheduled_at": None,  # Monotonic time of the next slot, before jitter
+                "next_run_at": None,  # Monotonic time the next run starts
+                "running": False,
+                "runs": 0,
+                "last_started": None,
+                "last_duration_seconds": None,
+                "last_error": None,
+            }
     
-    def start(self):
+    async def start(self):
         """
-        Start the scheduler
+        Start the scheduler in the running event loop
         """
-        logger.info(f"Starting Zillow scraper scheduler with interval of {self.interval_hours} hours")
+        if self.is_running:
+            return
         
-        # Run scrapers once at startup
-        self._run_scrapers()
+        logger.info(
+            f"Starting scraper scheduler for {', '.join(self.sources)} "
+            f"with up to {settings.SCRAPER_MAX_CONCURRENCY} concurrent runs"
+        )
+        self._semaphore = asyncio.Semaphore(settings.SCRAPER_MAX_CONCURRENCY)
+        self._wakeup = asyncio.Event()
         
-        # Schedule regular runs
-        schedule.every(self.interval_hours).hours.do(self._run_scrapers)
+        # Run scrapers once at startup, spread out by the jitter
+        now = time.monotonic()
+        for state in self.sources.values():
+            state["scheduled_at"] = now
+            state["next_run_at"] = now + random.uniform(0, self.jitter_seconds)
         
         self.is_running = True
-        
-        # Keep the scheduler running
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+        self._loop_task = asyncio.ensure_future(self._schedule_loop())
     
-    def stop(self):
+    async def stop(self, timeout: Optional[float] = None):
         """
-        Stop the scheduler
+        Stop the scheduler, giving running scrapers time to finish before cancelling them
         """
-        logger.info("Stopping Zillow scraper scheduler")
+        if not self.is_running:
+            return
+        
+        logger.info("Stopping scraper scheduler")
         self.is_running = False
+        self._wakeup.set()
+        await self._loop_task
+        
+        running = list(self._run_tasks.values())
+        if running:
+            grace = settings.SCRAPER_SHUTDOWN_GRACE_SECONDS if timeout is None else timeout
+            logger.info(f"Waiting up to {grace} seconds for {len(running)} running scrapers")
+            _, pending = await asyncio.wait(running, timeout=grace)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
     
-    def _run_scrapers(self):
+    async def _schedule_loop(self):
         """
-        Run Zillow scraper
+        Start due sources and sleep until the next one is due
         """
-        logger.info(f"Running Zillow scraper at {datetime.now()}")
-        
-        # Create and run a new event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run scraper
-        for scraper in self.scrapers:
+        while self.is_running:
+            now = time.monotonic()
+            for source, state in self.sources.items():
+                if not state["running"] and state["next_run_at"] <= now:
+                    state["running"] = True
+                    self._run_tasks[source] = asyncio.ensure_future(self._run_source(source))
+            
+            waiting = [state["next_run_at"] for state in self.sources.values() if not state["running"]]
+            timeout = max(0, min(waiting) - time.monotonic()) if waiting else None
+            
+            self._wakeup.clear()
             try:
-                loop.run_until_complete(scraper.run())
-            except Exception as e:
-                logger.error(f"Error running scraper {scraper.source_name}: {str(e)}")
-        
-        loop.close()
-        
-        logger.info("Zillow scraper completed")
-        return True  # Return True to keep the schedule
-
-
-# Function to start the scheduler in a separate thread
-def start_scheduler_thread():
-    """
-    Start the Zillow scraper scheduler in a separate thread
-    """
-    import threading
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _run_source(self, source: str):
+        """
+        Run one scraper under the concurrency cap and schedule its next run
+        """
+        state = self.sources[source]
+        try:
+            async with self._semaphore:
+                logger.info(f"Running {source} scraper at {datetime.now()}")
+                state["last_started"] = datetime.utcnow()
+                started = time.monotonic()
+                try:
+                    await self.factories[source]().run()
+                    state["last_error"] = None
+                except Exception as e:
+                    logger.error(f"Error running scraper {source}: {str(e)}")
+                    state["last_error"] = str(e)
+                state["runs"] += 1
+                state["last_duration_seconds"] = time.monotonic() - started
+                logger.info(f"{source} scraper completed in {state['last_duration_seconds']:.1f} seconds")
+        finally:
+            self._schedule_next(source)
+            state["running"] = False
+            self._run_tasks.pop(source, None)
+            if self._wakeup is not None:
+                self._wakeup.set()
     
-    scheduler = ScraperScheduler()
-    thread = threading.Thread(target=scheduler.start)
-    thread.daemon = True
-    thread.start()
+    def _schedule_next(self, source: str):
+        """
+        Advance a source to its next interval slot
+        
+        Slots are fixed multiples of the interval from the first run, so the
+        schedule does not drift by run durations; slots missed by a long run are skipped.
+        """
+        state = self.sources[source]
+        now = time.monotonic()
+        scheduled_at = state["scheduled_at"] + state["interval_seconds"]
+        while scheduled_at <= now:
+            scheduled_at += state["interval_seconds"]
+        state["scheduled_at"] = scheduled_at
+        state["next_run_at"] = scheduled_at + random.uniform(0, self.jitter_seconds)
     
-    return scheduler, thread 
\ No newline at end of file
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Report the schedule and last run of every source
+        """
+        now = time.monotonic()
+        wall_now = datetime.utcnow()
+        report = []
+        for source, state in self.sources.items():
+            next_run = None
+            if self.is_running and not state["running"]:
+                next_run = (wall_now + timedelta(seconds=state["next_run_at"] - now)).isoformat()
+            report.append({
+                "source": source,
+                "interval_seconds": state["interval_seconds"],
+                "running": state["running"],
+                "next_run": next_run,
+                "runs": state["runs"],
+                "last_started": state["last_started"].isoformat() if state["last_started"] else None,
+                "last_duration_seconds": state["last_duration_seconds"],
+                "last_error": state["last_error"],
+            })
+        return report
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.db.crud import (
+    acquire_host_slot,
+    claim_scrape_job,
+    complete_scrape_job,
+    enqueue_scrape_jobs,
+    fail_scrape_job,
+    heartbeat_scrape_job,
+)
+from app.db.models import ScrapeJob
+from app.db.partitions import create_history_partitions
+from app.db.session import AsyncSessionLocal
+from app.scraper.base import BaseScraper
+from app.scraper.recrawl import finish_city_crawl, get_due_cities
+from app.scraper.scheduler import SCRAPER_FACTORIES
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+class HostRateLimiter:
+    """
+    Per-host request rate limit enforced across all workers through the database
+    """
+    
+    async def wait(self, host: str, interval_seconds: float):
+        """
+        Sleep until this worker holds the next request slot for the host
+        """
+        while True:
+            async with AsyncSessionLocal() as session:
+                delay = await acquire_host_slot(host, interval_seconds, session)
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+async def enqueue_city_jobs(sources: Optional[List[str]] = None, cities: Optional[List[str]] = None) -> int:
+    """
+    Queue the first page of every configured city that is due for a crawl, for each source
+    """
+    queued = 0
+    async with AsyncSessionLocal() as session:
+        await create_history_partitions(session)
+        for source in sources or SCRAPER_FACTORIES:
+            due_cities = await get_due_cities(source, cities or settings.SCRAPER_CITIES, session)
+            if due_cities:
+                queued += await enqueue_scrape_jobs(source, due_cities, 1, session)
+    logger.info(f"Queued {queued} scrape jobs")
+    return queued
+
+class ScrapeWorker:
+    """
+    Worker that claims (source, city, page) jobs from the shared job table
+    
+    Any number of workers, in any number of processes or hosts, can run against
+    the same database. Jobs are leased and kept alive by heartbeats; a job whose
+    worker dies is claimed again once its lease expires. Failed jobs are retried
+    with exponential backoff.
+    """
+    
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        factories: Optional[Dict[str, Callable[[], BaseScraper]]] = None,
+        concurrency: int = 1,
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.factories = factories or SCRAPER_FACTORIES
+        self.concurrency = concurrency
+        self.rate_limiter = HostRateLimiter()
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+    
+    async def run(self, stop_event: Optional[asyncio.Event] = None, exit_when_idle: bool = False):
+        """
+        Process jobs until the stop event is set, or until none are due if exit_when_idle
+        """
+        stop_event = stop_event or asyncio.Event()
+        logger.info(f"Starting scrape worker {self.worker_id} with {self.concurrency} slots")
+        await asyncio.gather(*[
+            self._work_loop(f"{self.worker_id}-{slot}", stop_event, exit_when_idle)
+            for slot in range(self.concurrency)
+        ])
+        logger.info(
+            f"Scrape worker {self.worker_id} stopped. "
+            f"Completed: {self.jobs_completed}, Failed: {self.jobs_failed}"
+        )
+    
+    async def _work_loop(self, slot_id: str, stop_event: asyncio.Event, exit_when_idle: bool):
+        """
+        Claim and process jobs one at a time
+        """
+        scrapers = {}
+        for source, factory in self.factories.items():
+            scraper = factory()
+            scraper.rate_limiter = self.rate_limiter
+            scrapers[source] = scraper
+        
+        try:
+            while not stop_event.is_set():
+                async with AsyncSessionLocal() as session:
+                    job = await claim_scrape_job(
+                        slot_id,
+                        settings.SCRAPER_JOB_LEASE_SECONDS,
+                        list(scrapers),
+                        session,
+                        max_attempts=settings.SCRAPER_JOB_MAX_ATTEMPTS,
+                    )
+                
+                if job is None:
+                    if exit_when_idle:
+                        break
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=settings.SCRAPER_WORKER_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                await self._process_job(job, scrapers[job.source], slot_id)
+        finally:
+            for scraper in scrapers.values():
+                scraper.close()
+    
+    async def _heartbeat(self, job: ScrapeJob, slot_id: str):
+        """
+        Keep extending the lease of a job while it is processed
+        """
+        interval = settings.SCRAPER_JOB_LEASE_SECONDS / 3
+        while True:
+            await asyncio.sleep(interval)
+            async with AsyncSessionLocal() as session:
+                held = await heartbeat_scrape_job(job.id, slot_id, settings.SCRAPER_JOB_LEASE_SECONDS, session)
+            if not held:
+                logger.warning(f"Lost the lease on {job}")
+                return
+    
+    async def _process_job(self, job: ScrapeJob, scraper: BaseScraper, slot_id: str):
+        """
+        Scrape and ingest one page, then queue the city's next page
+        
+        A worker that lost its lease stops without queueing anything, since
+        the job's new holder continues the city.
+        """
+        logger.info(f"Worker {slot_id} processing {job} (attempt {job.attempts})")
+        heartbeat = asyncio.ensure_future(self._heartbeat(job, slot_id))
+        try:
+            listings = await scraper.scrape_page(job.city, job.page)
+            
+            if heartbeat.done():
+                logger.warning(f"Worker {slot_id} lost the lease on {job}, dropping the page")
+                return
+            
+            async with AsyncSessionLocal() as session:
+                if listings:
+                    await scraper._ingest_page(job.city, listings, session)
+                
+                if not await complete_scrape_job(job.id, slot_id, len(listings or []), session):
+                    logger.warning(f"Worker {slot_id} lost the lease on {job} while ingesting it")
+                    return
+                
+                # Fan out to the next page while this one still had results,
+                # otherwise the city's crawl is complete
+                if listings is not None and job.page < settings.SCRAPER_MAX_PAGES:
+                    await enqueue_scrape_jobs(job.source, [job.city], job.page + 1, session)
+                else:
+                    await finish_city_crawl(job.source, job.city, session)
+            
+            self.jobs_completed += 1
+        except Exception as e:
+            logger.error(f"Error processing {job}: {str(e)}")
+            self.jobs_failed += 1
+            async with AsyncSessionLocal() as session:
+                await fail_scrape_job(
+                    job,
+                    slot_id,
+                    str(e),
+                    settings.SCRAPER_JOB_MAX_ATTEMPTS,
+                    settings.SCRAPER_JOB_BACKOFF_SECONDS,
+                    session,
+                )
+        finally:
+            heartbeat.cancel()
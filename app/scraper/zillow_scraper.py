@@ -1,16 +1,16 @@
 import asyncio
 import logging
-import time
-import re
-import random
-from typing import List, Dict, Any
-from urllib.parse import urljoin, urlparse
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Dict, Any, Optional
+from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
 
+from app.core.metrics import SCRAPER_STAGE_SECONDS, timed
+from app.db.records import ListingRecord
 from app.scraper.base import BaseScraper
+from app.scraper.parsing import parse_listing_page, resolve_parser_backend
+from app.scraper.replay import PageNotRecorded
 from app.core.config import settings
 
 # Set up logging
@@ -26,7 +26,7 @@ class ZillowScraper(BaseScraper):
     """
     
     def __init__(self):
-        super().__init__("zillow.com")
+        super().__init__("zillow.com", robots_txt=settings.ZILLOW_ROBOTS_TXT)
         self.base_url = "https://www.zillow.com"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -36,96 +36,144 @@ class ZillowScraper(BaseScraper):
             "Connection": "keep-alive",
             "Upgrade-Insecure-Requests": "1",
         }
-        self.robots_rules = settings.ZILLOW_ROBOTS_RULES
-        self.crawl_delay = self.robots_rules["crawl_delay"]
+        self.session = requests.Session()
+        self.parser_backend = resolve_parser_backend(settings.SCRAPER_PARSER_BACKEND)
+        self.parse_pool = None
         
-    def is_url_allowed(self, url: str) -> bool:
+    async def _fetch(self, url: str) -> str:
         """
-        Check if a URL is allowed according to robots.txt rules
+        Fetch a page without blocking the event loop
         """
-        parsed_url = urlparse(url)
-        path = parsed_url.path
-        
-        # Check if path is in allowed paths
-        for allowed_path in self.robots_rules["allowed_paths"]:
-            if path.startswith(allowed_path):
-                # Now check if it's not in disallowed paths
-                for disallowed_path in self.robots_rules["disallowed_paths"]:
-                    if path.startswith(disallowed_path):
-                        return False
-                return True
-        
-        return False
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None, lambda: self.session.get(url, headers=self.headers)
+        )
+        response.raise_for_status()
+        return response.text
 
-    async def scrape(self) -> List[Dict[str, Any]]:
+    async def _parse_page(self, html: str) -> List[Dict[str, Any]]:
         """
-        Scrape apartment listings from zillow.com
+        Parse a results page, in the process pool when one is configured
         """
-        # Cities to search for rentals
-        cities = [
-            "san-francisco-ca",
-            "los-angeles-ca", 
-            "new-york-ny", 
-            "chicago-il", 
-            "seattle-wa"
-        ]
-        
-        all_listings = []
-        
-        # Scrape each city
-        for city in cities:
-            # Construct URL that adheres to robots.txt rules
-            city_url = f"{self.base_url}/homes/for_rent/{city}/"
-            if not self.is_url_allowed(city_url):
-                logger.warning(f"URL {city_url} is not allowed according to robots.txt rules. Skipping.")
-                continue
-                
-            logger.info(f"Scraping rental listings for {city}")
-            
+        if settings.SCRAPER_PARSE_WORKERS <= 0:
+            return parse_listing_page(html, self.parser_backend)
+        
+        if self.parse_pool is None:
+            self.parse_pool = ProcessPoolExecutor(max_workers=settings.SCRAPER_PARSE_WORKERS)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.parse_pool, parse_listing_page, html, self.parser_backend)
+
+    def close(self):
+        """
+        Shut down the parse process pool
+        """
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown(wait=False, cancel_futures=True)
+            self.parse_pool = None
+
+    def _page_url(self, city: str, page: int) -> str:
+        """
+        Build the URL of a page of rental results for a city
+        
+        The explicit page suffix is also used for the first page, since robots.txt
+        only allows paginated /homes/for_rent/ URLs.
+        """
+        return f"{self.base_url}/homes/for_rent/{city}/{page}_p/"
+
+    async def scrape_page(self, city: str, page: int) -> Optional[List[ListingRecord]]:
+        """
+        Fetch and parse one page of rental results for a city
+        
+        Returns:
+            Listing records of the page, or None when there are no more pages to fetch
+        """
+        # Construct URL that adheres to robots.txt rules
+        page_url = self._page_url(city, page)
+        if not self.is_url_allowed(page_url):
+            logger.warning(f"URL {page_url} is not allowed according to robots.txt rules. Skipping.")
+            return None
+        
+        # Respect crawl delay
+        await self.wait_for_crawl_delay(page_url)
+        
+        # Get and parse results page
+        try:
+            html = await self.fetch(page_url)
+        except PageNotRecorded:
+            # The recorded crawl stopped before this page
+            logger.info(f"{page_url} was not recorded, ending the replay of {city}")
+            return None
+        with timed("parse", SCRAPER_STAGE_SECONDS, self.source_name):
+            cards = await self._parse_page(html)
+        
+        logger.info(f"Found {len(cards)} listing cards for {city} on page {page}")
+        if not cards:
+            return None
+        
+        # Process each listing card
+        listings = []
+        for card in cards:
             try:
-                # Respect crawl delay
-                await asyncio.sleep(self.crawl_delay)
-                
-                # Get city page
-                response = requests.get(city_url, headers=self.headers)
-                response.raise_for_status()
-                
-                # Parse HTML
-                soup = BeautifulSoup(response.text, "html.parser")
+                listing = self._parse_listing_card(card, city)
+                if listing:
+                    listings.append(listing)
+            except Exception as e:
+                logger.error(f"Error parsing listing: {str(e)}")
+        
+        return listings
+
+    async def scrape(self, checkpoint: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Scrape apartment listings from zillow.com, one results page at a time
+        
+        Each city is paginated until a page comes back without listing cards or
+        SCRAPER_MAX_PAGES is reached. Pages up to and including the checkpoint
+        are skipped.
+        """
+        # Cities to search for rentals
+        cities = list(self.cities if self.cities is not None else settings.SCRAPER_CITIES)
+        
+        # Resume after the last page that was fully ingested
+        if checkpoint and checkpoint["city"] in cities:
+            resume_index = cities.index(checkpoint["city"])
+            cities = cities[resume_index:]
+        else:
+            checkpoint = None
+        
+        try:
+            # Scrape each city
+            for city in cities:
+                first_page = 1
+                if checkpoint and checkpoint["city"] == city:
+                    first_page = checkpoint["page"] + 1
                 
-                # Find listing cards - Note: Actual selectors may vary based on Zillow's current HTML structure
-                listing_cards = soup.select(".list-card")
-                logger.info(f"Found {len(listing_cards)} listing cards for {city}")
+                logger.info(f"Scraping rental listings for {city} from page {first_page}")
                 
-                # Process each listing card
-                for card in listing_cards:
+                for page in range(first_page, settings.SCRAPER_MAX_PAGES + 1):
                     try:
-                        listing = self._parse_listing_card(card, city)
-                        if listing:
-                            all_listings.append(listing)
+                        listings = await self.scrape_page(city, page)
                     except Exception as e:
-                        logger.error(f"Error parsing listing: {str(e)}")
+                        logger.error(f"Error scraping {city} page {page}: {str(e)}")
+                        break
                     
-                    # Small random delay between processing items
-                    await asyncio.sleep(random.uniform(0.5, 1.5))
-                
-            except Exception as e:
-                logger.error(f"Error scraping {city_url}: {str(e)}")
-        
-        return all_listings
+                    if listings is None:
+                        break
+                    
+                    yield {"city": city, "page": page, "listings": listings}
+        finally:
+            self.close()
     
-    def _parse_listing_card(self, card, city: str) -> Dict[str, Any]:
+    def _parse_listing_card(self, card: Dict[str, Any], city: str) -> Optional[ListingRecord]:
         """
-        Parse a listing card from zillow.com
+        Build the listing record of the fields extracted from a listing card
         
-        Note: These selectors may need to be updated based on Zillow's actual HTML structure
-        """
-        # Extract listing URL
-        url_tag = card.select_one(".list-card-link")
-        if not url_tag:
-            return None
+        Note: The card selectors live in app/scraper/parsing.py and may need to be
+        updated based on Zillow's actual HTML structure
         
-        url = url_tag.get("href")
+        Raises:
+            ValueError: for cards whose fields aren't a valid listing
+        """
+        url = card.get("url")
         if not url:
             return None
         
@@ -137,76 +185,21 @@ class ZillowScraper(BaseScraper):
             logger.warning(f"URL {url} is not allowed according to robots.txt rules. Skipping.")
             return None
         
-        # Extract title
-        title = url_tag.get_text().strip() if url_tag.get_text() else "Apartment for Rent"
-        
-        # Extract price
-        price_tag = card.select_one(".list-card-price")
-        price = 0
-        if price_tag:
-            price_text = price_tag.get_text().strip()
-            # Extract numeric value from price string
-            price_match = re.search(r"\$?(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)", price_text)
-            if price_match:
-                price = float(price_match.group(1).replace(",", ""))
-        
-        # Extract address
-        address_tag = card.select_one(".list-card-addr")
-        address = address_tag.get_text().strip() if address_tag else ""
-        
-        # Extract details (beds, baths, sqft)
-        details_tag = card.select_one(".list-card-details")
-        bedrooms = 0
-        bathrooms = 0
-        square_footage = 0
-        
-        if details_tag:
-            details_text = details_tag.get_text().strip()
-            
-            # Extract bedrooms
-            bed_match = re.search(r"(\d+)\s*bd", details_text, re.IGNORECASE)
-            if bed_match:
-                bedrooms = int(bed_match.group(1))
-            
-            # Extract bathrooms
-            bath_match = re.search(r"(\d+(?:\.\d+)?)\s*ba", details_text, re.IGNORECASE)
-            if bath_match:
-                bathrooms = float(bath_match.group(1))
-            
-            # Extract square footage
-            sqft_match = re.search(r"(\d+(?:,\d{3})*)\s*sqft", details_text, re.IGNORECASE)
-            if sqft_match:
-                square_footage = float(sqft_match.group(1).replace(",", ""))
-        
-        # Extract image URL
-        image_tag = card.select_one(".list-card-img")
-        image_url = ""
-        if image_tag:
-            if image_tag.get("src"):
-                image_url = image_tag.get("src")
-            elif image_tag.get("data-src"):
-                image_url = image_tag.get("data-src")
-        
         # Parse location from city string
         city_parts = city.split("-")
         city_name = " ".join(city_parts[:-1]).title()
         state = city_parts[-1].upper() if len(city_parts) > 1 else ""
         
-        # Create listing data
-        listing_data = {
-            "title": title,
-            "url": url,
-            "price": price,
-            "address": address,
-            "city": city_name,
-            "state": state,
-            "bedrooms": bedrooms,
-            "bathrooms": bathrooms,
-            "square_footage": square_footage,
-            "image_url": image_url,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow(),
-            "is_available": True
-        }
-        
-        return listing_data 
\ No newline at end of file
+        return ListingRecord(
+            url=url,
+            title=card["title"],
+            price=card["price"],
+            city=city_name,
+            state=state,
+            address=card["address"],
+            bedrooms=card["bedrooms"],
+            bathrooms=card["bathrooms"],
+            square_footage=card["square_footage"],
+            image_url=card["image_url"],
+            source=self.source_name,
+        )
@@ -0,0 +1 @@
+# Search module initialization 
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Precomputed responses of the most popular searches.
+
+A few hundred queries make up much of the search traffic. At the end of each
+successful scraper run, warm_popular_searches() takes the SEARCH_WARMUP_QUERIES
+queries searched most often in the last SEARCH_WARMUP_DAYS days, parses them,
+reads their first page of results and stores each response, serialized as
+the search endpoint would send it, as a new generation of the
+precomputed_searches table. API processes serve them with
+app.api.precomputed.PrecomputedSearches.
+
+Queries are counted lower-cased and with their whitespace collapsed, and
+parsed in that form. The query parser lower-cases its input before anything
+else, so a body is the live parse of any query that lower-cases to its key;
+other spacing can parse differently and isn't served from it. Bodies are
+stored without the query, which is spliced in as sent.
+
+This runs in scraper processes, so it loads the NLP model only when called.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud import get_listings, get_search_query_counts, replace_precomputed_searches
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Listings in the first page of search results
+RESULT_LIMIT = 100
+
+
+def dumps_json(content: Any) -> bytes:
+    """
+    Content rendered as JSONResponse renders it
+    """
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def serialize_search(parameters: Dict[str, Any], results: List[Dict[str, Any]]) -> bytes:
+    """
+    Body of a search response without its leading {"query": ..., member
+    """
+    return dumps_json({"parameters": parameters, "results": results, "count": len(results)})[1:]
+
+
+async def warm_popular_searches(session: AsyncSession = None) -> Optional[int]:
+    """
+    Precompute the responses of the most frequent recent searches as a new generation
+
+    Returns:
+        The new generation, or None when warm-up is off or can't run
+    """
+    if settings.SEARCH_WARMUP_QUERIES <= 0:
+        # Responses precomputed before it was turned off would be served indefinitely
+        await replace_precomputed_searches({}, session)
+        return None
+    try:
+        from app.nlp.processor import get_nlp_processor
+        nlp_processor = await run_in_threadpool(get_nlp_processor)
+    except Exception as e:
+        # Scraper workers don't need spaCy otherwise
+        logger.warning(f"Skipping search warm-up, the NLP model isn't available: {str(e)}")
+        return None
+
+    started = datetime.utcnow()
+    search_queries = await get_search_query_counts(
+        started - timedelta(days=settings.SEARCH_WARMUP_DAYS),
+        min_count=settings.SEARCH_WARMUP_MIN_COUNT,
+        limit=settings.SEARCH_WARMUP_QUERIES,
+        session=session,
+    )
+    bodies = {}
+    for search_query in search_queries:
+        # spaCy is CPU-bound, so it runs off the event loop
+        parameters = await run_in_threadpool(nlp_processor.process_query, search_query.query)
+        filters = {k: v for k, v in parameters.items() if v is not None}
+        results = await get_listings(filters, session, limit=RESULT_LIMIT)
+        bodies[search_query.query] = serialize_search(parameters, results)
+
+    generation = await replace_precomputed_searches(bodies, session)
+    logger.info(
+        f"Precomputed {len(bodies)} searches as generation {generation} "
+        f"in {(datetime.utcnow() - started).total_seconds():.1f}s"
+    )
+    return generation
@@ -6,9 +6,61 @@ document.addEventListener('DOMContentLoaded', function() {
     const messagesContainer = document.getElementById('messages');
     const listingsContainer = document.getElementById('listings');
     const loadingEl = document.getElementById('loading');
+    const suggestionsList = document.getElementById('suggestions');
+    
+    // Milliseconds of typing pause before suggestions are requested
+    const SUGGEST_DELAY = 120;
+    let suggestTimer = null;
+    let suggestController = null;
     
     // Event listeners
     searchForm.addEventListener('submit', handleSearch);
+    queryInput.addEventListener('input', handleInput);
+    
+    /**
+     * Request suggestions once the user pauses typing
+     */
+    function handleInput() {
+        clearTimeout(suggestTimer);
+        const text = queryInput.value;
+        if (!text.trim()) {
+            suggestionsList.innerHTML = '';
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(text), SUGGEST_DELAY);
+    }
+    
+    /**
+     * Fill the suggestion list with locations and popular searches for the typed text
+     */
+    function fetchSuggestions(text) {
+        // Only the latest request matters
+        if (suggestController) {
+            suggestController.abort();
+        }
+        suggestController = new AbortController();
+        
+        fetch(`/api/suggest?q=${encodeURIComponent(text)}`, { signal: suggestController.signal })
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data) return;
+            const options = [
+                ...data.locations.map(location => location.completion),
+                ...data.queries.map(query => query.text),
+            ];
+            suggestionsList.innerHTML = '';
+            [...new Set(options)].forEach(value => {
+                const option = document.createElement('option');
+                option.value = value;
+                suggestionsList.appendChild(option);
+            });
+        })
+        .catch(error => {
+            if (error.name !== 'AbortError') {
+                console.error('Error:', error);
+            }
+        });
+    }
     
     /**
      * Handle search form submission
@@ -28,26 +80,35 @@ document.addEventListener('DOMContentLoaded', function() {
         // Show results container
         resultsContainer.classList.add('visible');
         
-        // Send request to server
-        fetch('/search', {
+        // Stream results from the server, rendering each batch as it arrives
+        let count = 0;
+        fetch(`/api/search/stream?query=${encodeURIComponent(query)}`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/x-www-form-urlencoded',
-            },
-            body: `query=${encodeURIComponent(query)}`
+                'Accept': 'application/x-ndjson',
+            }
         })
         .then(response => {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
             }
-            return response.json();
+            return readLines(response, line => {
+                const event = JSON.parse(line);
+                if (event.type === 'results') {
+                    // First batch replaces the spinner
+                    if (count === 0) {
+                        hideLoading();
+                    }
+                    count += event.results.length;
+                    event.results.forEach(listing => addListingCard(listing));
+                } else if (event.type === 'error') {
+                    throw new Error(event.detail);
+                }
+            });
         })
-        .then(data => {
-            // Hide loading
+        .then(() => {
             hideLoading();
-            
-            // Process search results
-            displayResults(data);
+            displayCount(count);
         })
         .catch(error => {
             console.error('Error:', error);
@@ -56,6 +117,35 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    /**
+     * Call onLine for each line of a newline-delimited response body as it is received
+     */
+    async function readLines(response, onLine) {
+        if (!response.body) {
+            // No streaming support; parse the whole body at once
+            const text = await response.text();
+            text.split('\n').filter(line => line).forEach(onLine);
+            return;
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line).forEach(onLine);
+        }
+        buffer += decoder.decode();
+        if (buffer) {
+            onLine(buffer);
+        }
+    }
+    
     /**
      * Add a message to the messages container
      */
@@ -70,25 +160,14 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     /**
-     * Display search results
+     * Report the number of results once the stream has finished
      */
-    function displayResults(data) {
-        // Clear previous listings
-        listingsContainer.innerHTML = '';
-        
-        const listings = data.results || [];
-        const count = listings.length;
-        
-        // Add system message with results count
+    function displayCount(count) {
         if (count > 0) {
             addMessage('system', `Found ${count} places that match your criteria.`);
         } else {
             addMessage('system', "I couldn't find any places matching those criteria. Try a different search.");
-            return;
         }
-        
-        // Add each listing
-        listings.forEach(listing => addListingCard(listing));
     }
     
     /**
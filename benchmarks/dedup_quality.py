@@ -0,0 +1,139 @@
+"""
+Measure duplicate detection quality and throughput on a synthetic corpus.
+
+Usage:
+    python -m benchmarks.dedup_quality [--units N] [--threshold X] [--num-perm N] [--bands N]
+
+Units live in buildings of several units, so neighbours with the same
+address but another unit number are the hard negatives. Each unit is listed
+one to three times with source-specific address spellings, titles, price and
+size rounding. Listings go through the same signing and matching code as
+ingestion, with an in-memory stand-in for the listing_lsh_buckets table.
+Precision and recall count pairs of listings linked to the same canonical listing.
+"""
+
+import argparse
+import random
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+from app.scraper.dedup import MinHasher, band_buckets, find_duplicate, listing_shingles
+
+STREETS = [("Main", "St"), ("Market", "St"), ("Oak", "Ave"), ("Pine", "St"), ("Lake Shore", "Dr"), ("Sunset", "Blvd")]
+
+
+def _address(number: int, street, unit: int, style: int) -> str:
+    name, suffix = street
+    if style == 0:
+        return f"{number} {name} {suffix} APT {unit}"
+    if style == 1:
+        full = {"St": "Street", "Ave": "Avenue", "Dr": "Drive", "Blvd": "Boulevard"}[suffix]
+        return f"{number} {name} {full} #{unit}"
+    return f"{number} {name} {suffix}. Unit {unit}"
+
+
+def synthetic_corpus(units: int, seed: int = 0):
+    """
+    Listings (as dicts with a "unit" ground-truth key) in a random order
+    """
+    rng = random.Random(seed)
+    listings = []
+    unit_id = 0
+    while unit_id < units:
+        number = rng.randint(1, 9999)
+        street = rng.choice(STREETS)
+        for apartment in rng.sample(range(1, 400), rng.randint(1, 6)):
+            beds = rng.randint(0, 3)
+            sqft = rng.randrange(400, 1600, 10)
+            price = rng.randrange(1500, 5000, 25)
+            for variant in range(rng.randint(1, 3)):
+                style = rng.randint(0, 2)
+                address = _address(number, street, apartment, style)
+                if style == 0:
+                    title = address
+                elif style == 1:
+                    title = f"{beds} Bed Apartment at {number} {street[0]}"
+                else:
+                    title = "Apartment for Rent"
+                listings.append({
+                    "unit": unit_id,
+                    "title": title,
+                    "address": address,
+                    "price": round(price * rng.uniform(0.98, 1.02)) if variant else price,
+                    "bedrooms": beds,
+                    "square_footage": round(sqft, -1 if variant else 0),
+                })
+            unit_id += 1
+    rng.shuffle(listings)
+    return listings
+
+
+def _pairs(sizes) -> int:
+    return sum(size * (size - 1) // 2 for size in sizes)
+
+
+def run(listings, num_perm: int, bands: int, threshold: float):
+    """
+    Deduplicate the listings in order and return (canonical root per listing, candidates examined)
+    """
+    hasher = MinHasher(num_perm)
+    buckets = defaultdict(list)
+    rows = []
+    candidates_seen = 0
+
+    for listing_id, listing in enumerate(listings):
+        signature = hasher.signature(listing_shingles(
+            listing["title"], listing["address"], listing["price"], listing["bedrooms"], listing["square_footage"]
+        ))
+        keys = band_buckets(signature, bands)
+        candidate_ids = {other for key in keys for other in buckets[key]}
+        candidates = [rows[other] for other in candidate_ids]
+        candidates_seen += len(candidates)
+
+        match = find_duplicate(signature, listing["bedrooms"], listing["address"], candidates, threshold)
+        rows.append(SimpleNamespace(
+            id=listing_id,
+            canonical_id=(match.canonical_id if match.canonical_id is not None else match.id) if match else None,
+            bedrooms=listing["bedrooms"],
+            address=listing["address"],
+            minhash=signature.tobytes(),
+        ))
+        for key in keys:
+            buckets[key].append(listing_id)
+
+    roots = []
+    for row in rows:
+        while row.canonical_id is not None:
+            row = rows[row.canonical_id]
+        roots.append(row.id)
+    return roots, candidates_seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, default=20000)
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    listings = synthetic_corpus(args.units, args.seed)
+    started = time.perf_counter()
+    roots, candidates_seen = run(listings, args.num_perm, args.bands, args.threshold)
+    elapsed = time.perf_counter() - started
+
+    truth_pairs = _pairs(Counter(listing["unit"] for listing in listings).values())
+    predicted_pairs = _pairs(Counter(roots).values())
+    true_pairs = _pairs(Counter((root, listing["unit"]) for root, listing in zip(roots, listings)).values())
+
+    print(f"{len(listings)} listings of {args.units} units, num_perm={args.num_perm} bands={args.bands} threshold={args.threshold}")
+    print(f"precision        {true_pairs / predicted_pairs if predicted_pairs else 1:.4f}")
+    print(f"recall           {true_pairs / truth_pairs if truth_pairs else 1:.4f}")
+    print(f"listings/s       {len(listings) / elapsed:.0f}")
+    print(f"candidates/list  {candidates_seen / len(listings):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Load testing suite initialization
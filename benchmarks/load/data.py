@@ -0,0 +1,238 @@
+"""
+Generate synthetic listings and amenities and bulk load them.
+
+Usage:
+    python -m benchmarks.load.data --rows 1000000 [--database-url URL] [--reset] [--seed N]
+
+Cities follow a Zipf-like popularity, so a few large markets hold most
+listings, and prices are log-normal around each city's typical rent, scaled
+by bedroom count. The same seed always produces the same rows, so runs
+against different commits load identical data.
+
+Rows are written in chunks with COPY on Postgres and executemany on SQLite,
+bypassing the ORM. --reset deletes existing listings first; otherwise rows
+are appended after the highest existing id.
+"""
+
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterator, List, Sequence, Tuple
+
+# (city, state, typical 1-bedroom rent, zip prefix), roughly by market size.
+# The first ten are the cities NLPProcessor recognizes by name.
+CITIES = [
+    ("New York", "NY", 3900, "100"),
+    ("Los Angeles", "CA", 2800, "900"),
+    ("Chicago", "IL", 2100, "606"),
+    ("San Francisco", "CA", 3400, "941"),
+    ("Seattle", "WA", 2400, "981"),
+    ("Boston", "MA", 3300, "021"),
+    ("Austin", "TX", 1700, "787"),
+    ("Miami", "FL", 2600, "331"),
+    ("Denver", "CO", 1900, "802"),
+    ("Portland", "OR", 1700, "972"),
+    ("Oakland", "CA", 2500, "946"),
+    ("San Diego", "CA", 2700, "921"),
+    ("Philadelphia", "PA", 1800, "191"),
+    ("Atlanta", "GA", 1800, "303"),
+    ("Houston", "TX", 1400, "770"),
+    ("Dallas", "TX", 1600, "752"),
+    ("Phoenix", "AZ", 1500, "850"),
+    ("Minneapolis", "MN", 1600, "554"),
+    ("Nashville", "TN", 1800, "372"),
+    ("San Jose", "CA", 3000, "951"),
+    ("Berkeley", "CA", 2700, "947"),
+    ("Redwood City", "CA", 3200, "940"),
+    ("Brooklyn", "NY", 3200, "112"),
+    ("Cambridge", "MA", 3100, "021"),
+    ("Pittsburgh", "PA", 1300, "152"),
+    ("Salt Lake City", "UT", 1500, "841"),
+    ("Raleigh", "NC", 1500, "276"),
+    ("Sacramento", "CA", 1800, "958"),
+    ("Tampa", "FL", 1900, "336"),
+    ("Madison", "WI", 1400, "537"),
+]
+
+# Exponent of the Zipf-like city popularity
+CITY_SKEW = 1.1
+
+BEDROOM_WEIGHTS = [0.12, 0.38, 0.32, 0.14, 0.04]
+BEDROOM_PRICE_FACTOR = [0.8, 1.0, 1.35, 1.75, 2.2]
+
+STREETS = ["Main St", "Oak Ave", "Pine St", "Maple Ave", "Cedar St", "Lake Dr", "Park Blvd", "Hill Rd", "2nd St", "Elm St"]
+KINDS = ["Apartment", "Condo", "Loft", "Townhouse", "Studio"]
+AMENITIES = [
+    "In-unit laundry", "Dishwasher", "Parking", "Garage", "Gym", "Pool", "Pet friendly", "Cats allowed",
+    "Dogs allowed", "Air conditioning", "Balcony", "Elevator", "Doorman", "Furnished", "Hardwood floors",
+    "Storage", "Bike room", "Roof deck", "EV charging", "Wheelchair accessible",
+]
+
+LISTING_COLUMNS = [
+    "id", "title", "description", "url", "price", "bedrooms", "bathrooms", "square_footage", "address",
+    "city", "state", "zip_code", "latitude", "longitude", "image_url", "source", "is_available",
+    "created_at", "updated_at",
+]
+AMENITY_COLUMNS = ["listing_id", "name", "state"]
+
+CHUNK_SIZE = 50000
+
+
+def city_weights(skew: float = CITY_SKEW) -> List[float]:
+    return [1 / (rank + 1) ** skew for rank in range(len(CITIES))]
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat(" ")
+
+
+def generate_rows(count: int, first_id: int = 1, seed: int = 0) -> Iterator[Tuple[tuple, List[tuple]]]:
+    """
+    Yield (listing row, amenity rows) tuples in LISTING_COLUMNS and AMENITY_COLUMNS order
+    """
+    rng = random.Random(seed)
+    # Cumulative weights spare random.choices from summing them on every call
+    city_cum_weights = list(accumulate(city_weights()))
+    bedroom_cum_weights = list(accumulate(BEDROOM_WEIGHTS))
+    # Amenities per listing are binomial(10, 0.3), a mean of 3
+    amenity_cum_weights = list(accumulate(math.comb(10, k) * 0.3 ** k * 0.7 ** (10 - k) for k in range(11)))
+    now = datetime(2024, 1, 1)
+    for listing_id in range(first_id, first_id + count):
+        city, state, rent, zip_prefix = rng.choices(CITIES, cum_weights=city_cum_weights)[0]
+        bedrooms = rng.choices(range(len(BEDROOM_WEIGHTS)), cum_weights=bedroom_cum_weights)[0]
+        bathrooms = max(1.0, bedrooms - rng.choice([0, 0.5, 1]))
+        price = round(rent * BEDROOM_PRICE_FACTOR[bedrooms] * rng.lognormvariate(0, 0.25) / 25) * 25
+        square_footage = round((450 + 350 * bedrooms) * rng.uniform(0.8, 1.3), -1)
+        kind = "Studio" if bedrooms == 0 else rng.choice(KINDS[:-1])
+        number = rng.randint(1, 9999)
+        address = f"{number} {rng.choice(STREETS)}"
+        created_at = now - timedelta(minutes=rng.randint(0, 180 * 24 * 60))
+        updated_at = created_at + timedelta(minutes=rng.randint(0, 30 * 24 * 60))
+
+        listing = (
+            listing_id,
+            f"{bedrooms} Bed {kind} at {address}" if bedrooms else f"{kind} at {address}",
+            f"Synthetic {kind.lower()} in {city}, {state}",
+            f"https://example.com/listings/{listing_id}",
+            float(price),
+            bedrooms,
+            bathrooms,
+            square_footage,
+            address,
+            city,
+            state,
+            f"{zip_prefix}{rng.randint(0, 99):02d}",
+            None,
+            None,
+            None,
+            "synthetic",
+            rng.random() < 0.95,
+            _timestamp(created_at),
+            _timestamp(updated_at),
+        )
+        amenity_count = rng.choices(range(11), cum_weights=amenity_cum_weights)[0]
+        amenities = [(listing_id, name, state) for name in rng.sample(AMENITIES, amenity_count)]
+        yield listing, amenities
+
+
+def _copy_rows(cursor, table: str, columns: Sequence[str], rows: Sequence[tuple]):
+    """
+    COPY rows into a Postgres table through psycopg2
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _insert_rows(cursor, table: str, columns: Sequence[str], rows: Sequence[tuple]):
+    placeholders = ", ".join("?" for _ in columns)
+    cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def load(count: int, reset: bool = False, seed: int = 0, chunk_size: int = CHUNK_SIZE) -> float:
+    """
+    Create the tables and bulk load synthetic listings with their amenities
+
+    Returns:
+        Seconds spent loading
+    """
+    from sqlalchemy import text
+
+    from app.db.models import Base
+    from app.db.session import engine
+
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        raise SystemExit(f"Bulk loading supports Postgres and SQLite, not {dialect}")
+    write_rows = _copy_rows if dialect == "postgresql" else _insert_rows
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if reset:
+            tables = ("amenities", "listing_lsh_buckets", "listing_history", "saved_search_matches", "listings")
+            if dialect == "postgresql":
+                # Deleting listings checks every foreign key to them row by row
+                conn.execute(text(f"TRUNCATE {', '.join(tables)}"))
+            else:
+                for table in tables:
+                    conn.execute(text(f"DELETE FROM {table}"))
+        first_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM listings")).scalar() + 1
+
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if dialect == "sqlite":
+            # Durability doesn't matter for generated data
+            cursor.execute("PRAGMA synchronous = OFF")
+
+        loaded = 0
+        rows = generate_rows(count, first_id, seed)
+        while loaded < count:
+            listings, amenities = [], []
+            for listing, listing_amenities in (next(rows) for _ in range(min(chunk_size, count - loaded))):
+                listings.append(listing)
+                amenities.extend(listing_amenities)
+            write_rows(cursor, "listings", LISTING_COLUMNS, listings)
+            write_rows(cursor, "amenities", AMENITY_COLUMNS, amenities)
+            connection.commit()
+            loaded += len(listings)
+            elapsed = time.perf_counter() - started
+            print(f"{loaded:>10} listings  {loaded / elapsed:>9.0f} rows/s", flush=True)
+
+        if dialect == "postgresql":
+            # Ids were assigned here, so the sequence has to catch up
+            cursor.execute("SELECT setval(pg_get_serial_sequence('listings', 'id'), (SELECT MAX(id) FROM listings))")
+        cursor.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Listings to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true", help="Delete existing listings first")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--database-url", help="Load into this database instead of the configured one")
+    args = parser.parse_args()
+
+    if args.database_url:
+        # The engine is created on import, so the database is chosen first
+        os.environ["DATABASE_URL"] = args.database_url
+
+    elapsed = load(args.rows, args.reset, args.seed, args.chunk_size)
+    print(f"Loaded {args.rows} listings in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
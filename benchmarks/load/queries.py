@@ -0,0 +1,99 @@
+"""
+Synthetic search requests matching what NLPProcessor.process_query understands.
+
+Natural language queries combine a city (named, or left to spaCy's entity
+recognizer for cities outside NLPProcessor's list), bedroom and bathroom
+counts, and prices written as "$3,500", "3500" or "3.5k", in the phrasings of
+the search box hints. Like real traffic, a few queries are much more common
+than the rest: requests are drawn from a pool of distinct queries with
+Zipf-like popularity.
+"""
+
+import random
+from itertools import accumulate
+from typing import Any, Dict, List
+
+from benchmarks.load.data import BEDROOM_PRICE_FACTOR, CITIES, city_weights
+
+TEMPLATES = [
+    "{beds} bedroom apartment in {city} under {price}",
+    "Find me apartments in {city}. At least {beds} bed {baths} bath around {price}",
+    "Looking for a house in {city}, {beds} bed within {price}",
+    "{beds} bed {baths} bath in {city} between {low} and {price}",
+    "Pet-friendly {beds}br near {city} max {price}",
+    "studio in {city} under {price}",
+    "apartments in {city}",
+    "at least {low} for a {beds} bedroom in {city}",
+    "cheap place close to {city}, {baths} bath",
+]
+
+# Exponent of the Zipf-like query popularity
+QUERY_SKEW = 1.0
+
+
+def _price_text(rng: random.Random, price: float) -> str:
+    style = rng.randrange(3)
+    if style == 0:
+        return f"${price:,.0f}"
+    if style == 1:
+        return f"{price:.0f}"
+    return f"{price / 1000:g}k"
+
+
+def _search_params(rng: random.Random) -> Dict[str, Any]:
+    city, state, rent, _ = rng.choices(CITIES, city_weights())[0]
+    beds = rng.choices(range(len(BEDROOM_PRICE_FACTOR)), [0.1, 0.4, 0.3, 0.15, 0.05])[0]
+    price = round(rent * BEDROOM_PRICE_FACTOR[beds] * rng.uniform(0.9, 1.4), -2)
+    return {"city": city, "beds": beds, "baths": rng.choice([1, 1, 1.5, 2]), "price": price}
+
+
+def query_pool(size: int, seed: int = 0) -> List[str]:
+    """
+    Distinct natural language queries, most popular first
+    """
+    rng = random.Random(seed)
+    pool = []
+    seen = set()
+    while len(pool) < size:
+        params = _search_params(rng)
+        query = rng.choice(TEMPLATES).format(
+            city=params["city"] if rng.random() < 0.8 else params["city"].lower(),
+            beds=params["beds"],
+            baths=params["baths"],
+            price=_price_text(rng, params["price"]),
+            low=_price_text(rng, round(params["price"] * 0.7, -2)),
+        )
+        if query not in seen:
+            seen.add(query)
+            pool.append(query)
+    return pool
+
+
+def listing_filters_pool(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Distinct /api/listings query parameters, most popular first
+    """
+    rng = random.Random(seed)
+    pool = []
+    seen = set()
+    while len(pool) < size:
+        params = _search_params(rng)
+        filters = {"city": params["city"], "limit": 20}
+        if rng.random() < 0.7:
+            filters["min_bedrooms"] = params["beds"]
+        if rng.random() < 0.7:
+            filters["max_price"] = params["price"]
+        key = tuple(sorted(filters.items()))
+        if key not in seen:
+            seen.add(key)
+            pool.append(filters)
+    return pool
+
+
+def sample(pool: List[Any], count: int, seed: int = 0, skew: float = QUERY_SKEW) -> List[Any]:
+    """
+    Draw requests from a pool with Zipf-like popularity
+    """
+    rng = random.Random(seed)
+    cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(len(pool))))
+    return rng.choices(pool, cum_weights=cum_weights, k=count)
@@ -0,0 +1,174 @@
+"""
+Drive /api/search and /api/listings of a running server and report latency percentiles.
+
+Usage:
+    python -m benchmarks.load.run [--url URL] [--concurrency N] [--requests N] [--search-share X]
+    python -m benchmarks.load.run --output results.json [--baseline previous.json]
+
+Load the data first with `python -m benchmarks.load.data`, then start the
+server against the same database. The request sequence is fixed by --seed,
+so results of runs with the same arguments are comparable across commits;
+--output saves them with the current commit, and --baseline prints the
+change from a saved run.
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.load.queries import listing_filters_pool, query_pool, sample
+
+
+def build_requests(count: int, search_share: float, pool_size: int, seed: int) -> List[Tuple[str, str, str, Dict[str, Any]]]:
+    """
+    (endpoint name, method, path, params) of every request of a run, in order
+    """
+    searches = sample(query_pool(pool_size, seed), count, seed)
+    listings = sample(listing_filters_pool(pool_size, seed), count, seed + 1)
+    requests = []
+    for index in range(count):
+        # Interleave the two endpoints deterministically at the requested share
+        if int((index + 1) * search_share) > int(index * search_share):
+            requests.append(("search", "POST", "/api/search", {"query": searches[index]}))
+        else:
+            requests.append(("listings", "GET", "/api/listings", listings[index]))
+    return requests
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of sorted values
+    """
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+async def drive(url: str, requests, concurrency: int, timeout: float) -> Tuple[Dict[str, list], Dict[str, int], float]:
+    """
+    Send the requests with a fixed number of concurrent clients
+
+    Returns:
+        Latencies of successful requests and error counts per endpoint, and the wall time
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    position = 0
+
+    async with httpx.AsyncClient(
+        base_url=url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    ) as client:
+
+        async def worker():
+            nonlocal position
+            while position < len(requests):
+                name, method, path, params = requests[position]
+                position += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, params=params)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors[name] += 1
+                    continue
+                latencies[name].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def summarize(latencies: Dict[str, list], errors: Dict[str, int], elapsed: float) -> Dict[str, Dict[str, float]]:
+    """
+    Throughput and latency percentiles per endpoint and overall
+    """
+    groups = {name: latencies.get(name, []) for name in sorted(set(latencies) | set(errors))}
+    groups["all"] = [latency for values in latencies.values() for latency in values]
+    summary = {}
+    for name, values in groups.items():
+        values = sorted(values)
+        summary[name] = {
+            "requests": len(values),
+            "errors": sum(errors.values()) if name == "all" else errors.get(name, 0),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    return summary
+
+
+def report(summary: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None):
+    print(f"{'endpoint':>10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, result in summary.items():
+        print(
+            f"{name:>10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+        )
+        previous = (baseline or {}).get(name)
+        if previous:
+            changes = [
+                f"{(result[key] / previous[key] - 1) * 100:+.1f}%" if previous[key] else "n/a"
+                for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+            ]
+            print(f"{'vs base':>10} {'':>9} {'':>7} {changes[0]:>9} {changes[1]:>9} {changes[2]:>9} {changes[3]:>9}")
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests to send after warm-up")
+    parser.add_argument("--warmup", type=int, default=200, help="Requests sent first and not measured")
+    parser.add_argument("--search-share", type=float, default=0.5, help="Fraction of requests to /api/search")
+    parser.add_argument("--pool-size", type=int, default=2000, help="Distinct queries requests are drawn from")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as an error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --output")
+    args = parser.parse_args()
+
+    requests = build_requests(args.warmup + args.requests, args.search_share, args.pool_size, args.seed)
+    asyncio.run(drive(args.url, requests[:args.warmup], args.concurrency, args.timeout))
+    latencies, errors, elapsed = asyncio.run(drive(args.url, requests[args.warmup:], args.concurrency, args.timeout))
+    summary = summarize(latencies, errors, elapsed)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent, {args.search_share:.0%} searches, against {args.url}")
+    report(summary, baseline)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "commit": current_commit(),
+                "timestamp": datetime.utcnow().isoformat(),
+                "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+                "results": summary,
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark typo-tolerant place name lookups in the location index.
+
+Usage:
+    python -m benchmarks.location_resolution [--places N] [--lookups N] [--seed N]
+
+Indexes the load test's cities plus --places synthetic place names with
+Zipf-like weights, then looks up exact names, names with one and two random
+edits (substitution, insertion, deletion or transposition), and words that
+aren't places. Reports build time and memory, microseconds per lookup, and
+how often the intended place ranks first. Misspellings that are closer to
+another place name than to the intended one count as misses.
+"""
+
+import argparse
+import random
+import resource
+import string
+import time
+
+from benchmarks.load.data import CITIES
+from benchmarks.load.queries import query_pool
+
+SYLLABLES = [
+    "ab", "al", "an", "ar", "ash", "bel", "ber", "bright", "brook", "car", "cedar", "clear", "cor", "dale",
+    "del", "east", "el", "fair", "fern", "glen", "green", "ham", "har", "high", "hol", "king", "lake", "lan",
+    "lin", "mar", "mead", "mill", "mon", "mor", "new", "north", "oak", "or", "pine", "red", "ridge", "river",
+    "rock", "rose", "san", "sel", "shel", "south", "spring", "stan", "ster", "stone", "sun", "ter", "val",
+    "ver", "west", "wil", "win", "wood",
+]
+SUFFIXES = ["", "", "", "ville", "ton", "burg", "field", "port", "ford", " city", " springs", " heights", " park"]
+
+
+def place_names(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + rng.choice(SUFFIXES)
+        names.add(name.title())
+    return sorted(names)
+
+
+def misspell(rng: random.Random, text: str, edits: int) -> str:
+    for _ in range(edits):
+        index = rng.randrange(len(text))
+        operation = rng.randrange(4)
+        if operation == 0:
+            text = text[:index] + rng.choice(string.ascii_lowercase) + text[index + 1:]
+        elif operation == 1:
+            text = text[:index] + rng.choice(string.ascii_lowercase) + text[index:]
+        elif operation == 2 and len(text) > 1:
+            text = text[:index] + text[index + 1:]
+        elif index + 1 < len(text):
+            text = text[:index] + text[index + 1] + text[index] + text[index + 2:]
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=50000, help="Synthetic place names to index")
+    parser.add_argument("--lookups", type=int, default=20000, help="Lookups of each kind")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.nlp.locations import LocationIndex, max_edit_distance
+
+    rng = random.Random(args.seed)
+    places = [city for city, _, _, _ in CITIES] + place_names(args.places, args.seed)
+    weights = [max(1, int(100000 / (rank + 1))) for rank in range(len(places))]
+
+    memory_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index = LocationIndex()
+    for place, weight in zip(places, weights):
+        index.add(place, weight)
+    elapsed = time.perf_counter() - started
+    memory = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory_before) / 1024
+    print(
+        f"Indexed {len(index)} places in {elapsed:.1f}s: "
+        f"{len(index._prefix_deletes) + len(index._suffix_deletes)} deletes, "
+        f"about {memory:.0f}MB (max RSS growth)"
+    )
+
+    targets = rng.choices(places, weights=weights, k=args.lookups)
+    print(f"{'lookup':>12} {'us each':>9} {'found':>7} {'intended first':>15}")
+    for label, edits in (("exact", 0), ("1 edit", 1), ("2 edits", 2)):
+        texts = [
+            misspell(rng, target.lower(), min(edits, max_edit_distance(target.lower())))
+            for target in targets
+        ]
+        started = time.perf_counter()
+        results = [index.lookup(text) for text in texts]
+        elapsed = time.perf_counter() - started
+        found = sum(bool(result) for result in results)
+        intended = sum(bool(result) and result[0][0] == target for result, target in zip(results, targets))
+        print(
+            f"{label:>12} {elapsed / len(texts) * 1e6:>9.1f} {found / len(texts):>7.1%} "
+            f"{intended / len(texts):>15.1%}"
+        )
+
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))) for _ in range(args.lookups)]
+    started = time.perf_counter()
+    found = sum(bool(index.lookup(word)) for word in words)
+    elapsed = time.perf_counter() - started
+    print(f"{'not places':>12} {elapsed / len(words) * 1e6:>9.1f} {found / len(words):>7.1%}")
+
+    # Whole queries, with the city misspelled once, as NLPProcessor resolves them
+    queries = []
+    for query in query_pool(2000, args.seed):
+        for city, _, _, _ in CITIES:
+            if city in query:
+                queries.append((query.replace(city, misspell(rng, city.lower(), 1)), city))
+                break
+    started = time.perf_counter()
+    results = [index.find_in_query(query) for query, _ in queries]
+    elapsed = time.perf_counter() - started
+    intended = sum(bool(result) and result[0] == city for result, (_, city) in zip(results, queries))
+    print(
+        f"Resolved {len(queries)} queries with a misspelled city in {elapsed / len(queries) * 1e6:.0f}us each, "
+        f"{intended / len(queries):.1%} to the intended city"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare parse throughput of the HTML parser backends.
+
+Usage:
+    python -m benchmarks.parse_throughput [--pages-dir DIR] [--pages N] [--workers N]
+
+Without --pages-dir, synthetic result pages are generated.
+"""
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.scraper.parsing import PARSER_BACKENDS, _backend_available, parse_listing_page
+from benchmarks.sample_pages import load_pages, make_sample_page
+
+
+def bench_backend(pages, backend: str, workers: int = 0):
+    """
+    Parse every page with a backend and return (seconds, cards)
+    """
+    start = time.perf_counter()
+    if workers > 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_listing_page, pages, [backend] * len(pages)))
+    else:
+        results = [parse_listing_page(page, backend) for page in pages]
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(len(cards) for cards in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages-dir", type=Path, help="Directory of saved *.html result pages")
+    parser.add_argument("--pages", type=int, default=50, help="Synthetic pages to generate")
+    parser.add_argument("--cards", type=int, default=40, help="Listing cards per synthetic page")
+    parser.add_argument("--workers", type=int, default=0, help="Parse in a process pool of this size")
+    args = parser.parse_args()
+
+    if args.pages_dir:
+        pages = load_pages(args.pages_dir)
+    else:
+        pages = [make_sample_page(args.cards, seed) for seed in range(args.pages)]
+    megabytes = sum(len(page) for page in pages) / 1e6
+
+    print(f"{len(pages)} pages, {megabytes:.1f} MB, workers={args.workers}")
+    print(f"{'backend':<12} {'pages/s':>10} {'cards/s':>10} {'MB/s':>8}")
+    for backend in PARSER_BACKENDS:
+        if not _backend_available(backend):
+            print(f"{backend:<12} {'not installed':>10}")
+            continue
+        elapsed, cards = bench_backend(pages, backend, args.workers)
+        print(f"{backend:<12} {len(pages) / elapsed:>10.1f} {cards / elapsed:>10.1f} {megabytes / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Compare state-scoped searches on the listings table, unpartitioned and list partitioned by state.
+
+Usage:
+    python -m benchmarks.partitioned_listings --database-url postgresql://... [--rows N] [--queries N]
+
+PostgreSQL only. Loads --rows synthetic listings with benchmarks.load.data,
+replacing existing ones (--rows 0 keeps the data already there). Then, on
+the plain table and again after partition_listings_by_state() has converted
+it (the migration's conversion, which is timed too), it times:
+
+- city searches with price and bedroom filters, built as get_listings builds
+  them, without the city's state (as when LISTINGS_PARTITIONED is off) and
+  with it (as when it's on),
+- a count of the available listings of one state,
+- VACUUM ANALYZE of the whole table, and once partitioned, of the largest
+  state's partition on its own.
+
+EXPLAIN gives the number of tables each search scans for its listings, and
+the number its check for an older available duplicate of each listing looks
+up by index. The tables are converted back afterwards unless --keep-partitioned.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from itertools import accumulate
+from typing import Dict, List, Optional, Set
+
+from benchmarks.load.data import CITIES, city_weights
+
+
+def search_filters(count: int, seed: int = 0) -> List[Dict]:
+    """
+    Filters of city searches, cities weighted by popularity as in the load test
+    """
+    rng = random.Random(seed)
+    city_cum_weights = list(accumulate(city_weights()))
+    searches = []
+    for _ in range(count):
+        city, state, rent, _ = rng.choices(CITIES, cum_weights=city_cum_weights)[0]
+        searches.append({
+            "city": city,
+            "state": state,
+            "max_price": float(round(rent * rng.uniform(0.9, 1.6), -2)),
+            "min_bedrooms": rng.choice([0, 1, 1, 2, 2, 3]),
+        })
+    return searches
+
+
+def relations(plan: Dict, alias_prefix: str = "") -> Set[str]:
+    """
+    Tables read by an EXPLAIN (FORMAT JSON) plan node and its children, under
+    aliases starting with alias_prefix (partitions get numbered aliases)
+    """
+    found = set()
+    if "Relation Name" in plan and plan.get("Alias", "").startswith(alias_prefix):
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= relations(child, alias_prefix)
+    return found
+
+
+def time_searches(engine, searches: List[Dict], with_state: bool) -> Dict:
+    from app.db.crud import _available_listings_query
+
+    timings = []
+    tables = []
+    probed = []
+    with engine.connect() as connection:
+        for filters in searches:
+            if not with_state:
+                filters = {k: v for k, v in filters.items() if k != "state"}
+            query = _available_listings_query(filters).limit(100)
+            started = time.perf_counter()
+            connection.execute(query).all()
+            timings.append(time.perf_counter() - started)
+
+        # Tables read by one search of each city
+        compiled_cities = set()
+        for filters in searches:
+            if filters["city"] in compiled_cities:
+                continue
+            compiled_cities.add(filters["city"])
+            if not with_state:
+                filters = {k: v for k, v in filters.items() if k != "state"}
+            query = _available_listings_query(filters).limit(100)
+            compiled = query.compile(engine, compile_kwargs={"render_postcompile": True})
+            plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+            tables.append(len(relations(plan[0]["Plan"], "listings")))
+            probed.append(len(relations(plan[0]["Plan"], "older_listings")))
+
+    timings.sort()
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[int(len(timings) * 0.95) - 1] * 1000,
+        "tables": max(tables),
+        "probed": max(probed),
+    }
+
+
+def time_statement(engine, sql: str, repeat: int = 1) -> float:
+    """
+    Milliseconds a statement takes, on average
+    """
+    from sqlalchemy import text
+
+    # VACUUM can't run in a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = connection.execute(text(sql))
+            if result.returns_rows:
+                result.all()
+        return (time.perf_counter() - started) / repeat * 1000
+
+
+def measure(engine, searches: List[Dict], label: str, partition: Optional[str] = None):
+    without_state = time_searches(engine, searches, with_state=False)
+    with_state = time_searches(engine, searches, with_state=True)
+    for name, result in (("city", without_state), ("city + state", with_state)):
+        print(
+            f"{label:>12} {name:>13} {result['median_ms']:>10.2f} {result['p95_ms']:>8.2f} {result['tables']:>7} "
+            f"{result['probed']:>7}"
+        )
+
+    state = CITIES[0][1]
+    state_count = time_statement(engine, f"SELECT COUNT(*) FROM listings WHERE state = '{state}' AND is_available", 5)
+    vacuum = f"VACUUM ANALYZE listings {time_statement(engine, 'VACUUM ANALYZE listings'):.0f}ms"
+    if partition:
+        vacuum += f", {partition} {time_statement(engine, f'VACUUM ANALYZE {partition}'):.0f}ms"
+    print(f"{label:>12} {state} count {state_count:.1f}ms, {vacuum}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="PostgreSQL database to load and partition")
+    parser.add_argument("--rows", type=int, default=1000000, help="Synthetic listings to load, 0 to keep existing data")
+    parser.add_argument("--queries", type=int, default=500, help="City searches per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-partitioned", action="store_true", help="Leave the tables partitioned")
+    args = parser.parse_args()
+
+    # The engine is created on import, so the database is chosen first
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from benchmarks.load.data import load
+    from app.db.partitions import is_partitioned, partition_listings_by_state, unpartition_listings
+    from app.db.session import engine
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Partitioning needs PostgreSQL")
+
+    with engine.begin() as connection:
+        # Start from the plain table
+        if is_partitioned(connection, "listings"):
+            unpartition_listings(connection)
+    if args.rows:
+        load(args.rows, reset=True, seed=args.seed)
+
+    searches = search_filters(args.queries, args.seed)
+    print(f"{'':>12} {'search':>13} {'median ms':>10} {'p95 ms':>8} {'tables':>7} {'probed':>7}")
+    measure(engine, searches, "plain")
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        partition_listings_by_state(connection)
+    print(f"Partitioned listings and amenities in {time.perf_counter() - started:.1f}s")
+    measure(engine, searches, "partitioned", f"listings_{CITIES[0][1].lower()}")
+
+    if not args.keep_partitioned:
+        with engine.begin() as connection:
+            unpartition_listings(connection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Replay per-city crawl history and compare re-crawl policies.
+
+Usage:
+    python -m benchmarks.recrawl_simulation [--synthetic N] [--days N] [--cards-per-page N]
+
+Per-city change rates and sizes are estimated from the per-city ScraperLog
+rows in the configured database (or generated for N synthetic cities). Each
+policy is then simulated against those rates: changes are drawn at every crawl,
+the adaptive policy learns from what it observes, and freshness (the
+time-averaged fraction of stored listings that are still current) is
+integrated exactly between crawls. Requests are result pages fetched. The
+adaptive policy divides the budget of the fixed SCRAPER_INTERVAL_HOURS
+policy, and the fixed policy is also run at the interval that spends exactly
+the requests the adaptive one made, so freshness is compared like for like.
+The adaptive policy given the true change rates shows what learning them costs.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from app.core.config import settings
+from app.scraper.recrawl import MAX_CHANGED_FRACTION, allocate_intervals, estimate_change_rate
+
+
+def _binomial(rng: random.Random, n: int, p: float) -> int:
+    """
+    Draw from a binomial distribution, by normal approximation for large n
+    """
+    if n < 200:
+        return sum(1 for _ in range(n) if rng.random() < p)
+    mean = n * p
+    draw = round(rng.gauss(mean, math.sqrt(mean * (1 - p))))
+    return min(max(draw, 0), n)
+
+
+def _interval_freshness(rate: float, hours: float) -> float:
+    """
+    Integral over an interval of the fraction of listings unchanged since its start
+    """
+    if rate <= 0:
+        return hours
+    return (1 - math.exp(-rate * hours)) / rate
+
+
+def cities_from_logs(logs) -> List[Tuple[str, int, float]]:
+    """
+    Estimate (city, listings, change rate per hour) from chronological per-city logs
+    """
+    history = defaultdict(list)
+    for log in logs:
+        history[(log.source, log.city)].append(log)
+
+    cities = []
+    for (source, city), city_logs in history.items():
+        rates = []
+        for previous, current in zip(city_logs, city_logs[1:]):
+            elapsed = (current.end_time - previous.end_time).total_seconds() / 3600
+            if elapsed <= 0 or not current.listings_found:
+                continue
+            changed = (current.listings_added or 0) + (current.listings_updated or 0)
+            fraction = min(changed / current.listings_found, MAX_CHANGED_FRACTION)
+            rates.append(-math.log(1 - fraction) / elapsed)
+        if rates:
+            sizes = sorted(log.listings_found or 0 for log in city_logs)
+            cities.append((f"{source}/{city}", sizes[len(sizes) // 2], sum(rates) / len(rates)))
+    return cities
+
+
+def synthetic_cities(count: int, seed: int = 0) -> List[Tuple[str, int, float]]:
+    """
+    Cities with log-normally spread sizes and change rates (median ~2% of listings per hour)
+    """
+    rng = random.Random(seed)
+    return [
+        (f"city-{i}", int(rng.lognormvariate(math.log(400), 0.8)) + 20, rng.lognormvariate(math.log(0.02), 1.2))
+        for i in range(count)
+    ]
+
+
+def _result(requests: int, freshness_area: float, listing_hours: float) -> Dict[str, float]:
+    return {
+        "requests": requests,
+        "freshness": freshness_area / listing_hours if listing_hours else 0,
+        # Listing-hours served fresh per page fetched
+        "fresh_hours_per_request": freshness_area / requests if requests else 0,
+    }
+
+
+def simulate_fixed(cities, horizon_hours: float, cards_per_page: int, interval_hours: float) -> Dict[str, float]:
+    """
+    Simulate crawling every city at the same interval over the horizon
+    """
+    requests = 0
+    freshness_area = 0.0
+    listing_hours = 0.0
+
+    for _, listings, true_rate in cities:
+        pages = max(1, math.ceil(listings / cards_per_page))
+        now = 0.0
+        # Ignoring float error, which would otherwise add a crawl at the very end
+        while horizon_hours - now > 1e-6:
+            interval = min(interval_hours, horizon_hours - now)
+            requests += pages
+            freshness_area += listings * _interval_freshness(true_rate, interval)
+            listing_hours += listings * interval
+            now += interval
+
+    return _result(requests, freshness_area, listing_hours)
+
+
+def simulate_adaptive(
+    cities,
+    horizon_hours: float,
+    cards_per_page: int,
+    budget_hours: float = None,
+    known_rates: bool = False,
+    seed: int = 0,
+) -> Dict[str, float]:
+    """
+    Simulate the adaptive policy over the horizon
+
+    As the scheduler does, due cities are crawled every SCRAPER_MIN_INTERVAL_HOURS,
+    and the budget of crawling every city every budget_hours is divided again
+    after each round. Change rates are learned from what crawls observe, or
+    given the true ones with known_rates.
+    """
+    budget_hours = budget_hours or settings.SCRAPER_INTERVAL_HOURS
+    tick_hours = settings.SCRAPER_MIN_INTERVAL_HOURS
+    rng = random.Random(seed)
+    requests = 0
+    freshness_area = 0.0
+    listing_hours = 0.0
+
+    names = [name for name, _, _ in cities]
+    estimated = {name: (true_rate if known_rates else None) for name, _, true_rate in cities}
+    last_crawled = {}
+    next_crawl = {name: 0.0 for name in names}
+
+    now = 0.0
+    while now < horizon_hours:
+        due = [(name, listings, true_rate) for name, listings, true_rate in cities if next_crawl[name] <= now]
+        for name, listings, true_rate in due:
+            previous = last_crawled.get(name)
+            if previous is not None:
+                interval = now - previous
+                freshness_area += listings * _interval_freshness(true_rate, interval)
+                listing_hours += listings * interval
+                # What this crawl observes; the first one only sets the baseline
+                if not known_rates:
+                    changed = _binomial(rng, listings, 1 - math.exp(-true_rate * interval))
+                    estimated[name] = estimate_change_rate(
+                        estimated[name], listings, changed, interval, settings.SCRAPER_CHANGE_RATE_SMOOTHING
+                    )
+            requests += max(1, math.ceil(listings / cards_per_page))
+            last_crawled[name] = now
+
+        if due:
+            intervals = allocate_intervals(
+                {name: (listings, estimated[name]) for name, listings, _ in cities},
+                budget_hours,
+                settings.SCRAPER_MIN_INTERVAL_HOURS,
+                settings.SCRAPER_MAX_INTERVAL_HOURS,
+            )
+            for name in names:
+                next_crawl[name] = last_crawled[name] + intervals[name]
+        now += tick_hours
+
+    # Listings stay as last crawled until the end of the horizon
+    for name, listings, true_rate in cities:
+        interval = horizon_hours - last_crawled[name]
+        freshness_area += listings * _interval_freshness(true_rate, interval)
+        listing_hours += listings * interval
+
+    return _result(requests, freshness_area, listing_hours)
+
+
+async def load_logged_cities():
+    """
+    Read per-city crawl logs from the configured database
+    """
+    from app.db.crud import get_city_crawl_logs
+    from app.db.session import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as session:
+        return cities_from_logs(await get_city_crawl_logs(session=session))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="Simulate N synthetic cities instead of logged ones")
+    parser.add_argument("--days", type=float, default=30, help="Simulated horizon")
+    parser.add_argument("--cards-per-page", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        cities = synthetic_cities(args.synthetic, args.seed)
+    else:
+        cities = asyncio.run(load_logged_cities())
+        if not cities:
+            print("No city has two logged crawls yet; use --synthetic N")
+            return
+
+    print(f"{len(cities)} cities over {args.days:g} days")
+    horizon_hours = args.days * 24
+    interval_hours = settings.SCRAPER_INTERVAL_HOURS
+    fixed = simulate_fixed(cities, horizon_hours, args.cards_per_page, interval_hours)
+    adaptive = simulate_adaptive(cities, horizon_hours, args.cards_per_page, interval_hours, seed=args.seed)
+    known = simulate_adaptive(cities, horizon_hours, args.cards_per_page, interval_hours, known_rates=True)
+
+    # Uniform interval that spends no more than the adaptive policy's requests
+    pages = sum(max(1, math.ceil(listings / args.cards_per_page)) for _, listings, _ in cities)
+    matched_hours = horizon_hours / max(1, adaptive["requests"] // pages)
+    matched = simulate_fixed(cities, horizon_hours, args.cards_per_page, matched_hours)
+
+    print(f"{'policy':<28} {'requests':>10} {'freshness':>10} {'fresh h/req':>12}")
+    for name, result in (
+        (f"fixed {interval_hours:g}h", fixed),
+        (f"fixed {matched_hours:.1f}h (<= requests)", matched),
+        ("adaptive", adaptive),
+        ("adaptive, true rates", known),
+    ):
+        print(
+            f"{name:<28} {result['requests']:>10} {result['freshness']:>10.3f} "
+            f"{result['fresh_hours_per_request']:>12.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
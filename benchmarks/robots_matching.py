@@ -0,0 +1,67 @@
+"""
+Measure robots.txt decision throughput.
+
+Usage:
+    python -m benchmarks.robots_matching [--robots-txt PATH] [--urls N] [--repeat N]
+
+Reports cold decisions (every path walked through the compiled trie) and warm
+decisions (paths seen before and answered from the memo).
+"""
+
+import argparse
+import random
+import time
+
+from app.core.config import settings
+from app.scraper.robots import get_robots_rules
+
+SEGMENTS = [
+    "homes", "for_rent", "for_sale", "homedetails", "b", "apartments", "api", "seattle-wa",
+    "chicago-il", "new-york-ny", "2_p", "14_p", "house_type", "1_fs", "mostrecentchange_sort",
+]
+
+
+def make_paths(count: int, seed: int = 0):
+    """
+    Generate a mix of listing, search and disallowed-looking paths
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        segments = [rng.choice(SEGMENTS) for _ in range(rng.randint(1, 4))]
+        path = "/" + "/".join(segments) + "/"
+        if rng.random() < 0.3:
+            path += f"{1000000 + i}_zpid/"
+        if rng.random() < 0.1:
+            path += "?searchQueryState=%7B%7D"
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--robots-txt", default=settings.ZILLOW_ROBOTS_TXT)
+    parser.add_argument("--urls", type=int, default=50000, help="Distinct paths")
+    parser.add_argument("--repeat", type=int, default=40, help="Warm passes over the paths")
+    args = parser.parse_args()
+
+    rules = get_robots_rules(args.robots_txt, settings.SCRAPER_ROBOTS_AGENT)
+    paths = make_paths(args.urls)
+    print(f"{len(rules.rules)} rules, {len(paths)} distinct paths")
+
+    start = time.perf_counter()
+    allowed = sum(rules.is_path_allowed(path) for path in paths)
+    cold = time.perf_counter() - start
+    print(f"cold: {len(paths) / cold:,.0f} decisions/s ({allowed} allowed)")
+
+    is_path_allowed = rules.is_path_allowed
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for path in paths:
+            is_path_allowed(path)
+    warm = time.perf_counter() - start
+    print(f"warm: {len(paths) * args.repeat / warm:,.0f} decisions/s")
+
+
+if __name__ == "__main__":
+    main()
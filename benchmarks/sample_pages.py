@@ -0,0 +1,76 @@
+"""
+Synthetic Zillow-style result pages for offline benchmarks
+"""
+
+import random
+from pathlib import Path
+from typing import List
+
+STREETS = ["Main St", "Market St", "Oak Ave", "Pine St", "Broadway", "Mission St", "Lake Shore Dr", "2nd Ave"]
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Rentals | Zillow</title>
+<script>{script}</script>
+</head>
+<body>
+<header><nav>{nav}</nav></header>
+<main>
+<ul class="photo-cards">
+{cards}
+</ul>
+</main>
+<footer>{footer}</footer>
+</body>
+</html>
+"""
+
+CARD_TEMPLATE = """<li><article class="list-card list-card_not-saved">
+<div class="list-card-info">
+<a class="list-card-link" href="/homedetails/{street_slug}-{slug}/{listing_id}_zpid/">{title}</a>
+<div class="list-card-price">${price:,}/mo</div>
+<address class="list-card-addr">{address}</address>
+<ul class="list-card-details"><li>{beds} bds</li><li>{baths} ba</li><li>{sqft:,} sqft</li></ul>
+</div>
+<div class="list-card-top"><img class="list-card-img" src="https://photos.example.com/{listing_id}.jpg" alt=""></div>
+</article></li>"""
+
+
+def make_sample_page(cards: int = 40, seed: int = 0, city: str = "seattle-wa") -> str:
+    """
+    Build a results page with the given number of listing cards
+
+    The page carries the kind of script and navigation bulk a real results
+    page has, so restricting parsing to card subtrees has something to skip.
+    """
+    rng = random.Random(seed)
+    rendered = []
+    for i in range(cards):
+        listing_id = seed * 100000 + i
+        street = rng.choice(STREETS)
+        rendered.append(CARD_TEMPLATE.format(
+            slug=city,
+            street_slug=street.lower().replace(" ", "-"),
+            listing_id=listing_id,
+            title=f"{rng.randint(1, 9999)} {street} APT {rng.randint(1, 400)}",
+            price=rng.randrange(1200, 7000, 25),
+            address=f"{rng.randint(1, 9999)} {street}, {city}",
+            beds=rng.randint(0, 4),
+            baths=rng.choice([1, 1.5, 2, 2.5, 3]),
+            sqft=rng.randrange(350, 2500, 10),
+        ))
+    return PAGE_TEMPLATE.format(
+        script="var state = " + "{\"k\": 1}, " * 2000 + "{};",
+        nav="".join(f'<a href="/nav/{i}/">Link {i}</a>' for i in range(300)),
+        cards="\n".join(rendered),
+        footer="".join(f"<p>Footer text {i}</p>" for i in range(200)),
+    )
+
+
+def load_pages(directory: Path) -> List[str]:
+    """
+    Load saved pages (*.html) from a directory
+    """
+    return [path.read_text(encoding="utf-8") for path in sorted(directory.glob("*.html"))]
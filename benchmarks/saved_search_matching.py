@@ -0,0 +1,116 @@
+"""
+Benchmark matching scraped listings against saved searches with the predicate index.
+
+Usage:
+    python -m benchmarks.saved_search_matching [--searches N] [--listings N] [--verify N]
+
+Saved searches are generated with the parameter mix of the load test's
+queries: mostly a city and a maximum price, often a bedroom minimum, some a
+price range or bathroom minimum, and a few with no city. Listings come from
+benchmarks.load.data. The report covers the time to index the searches,
+listings matched per second, and, for --verify listings, the speed-up over
+checking every saved search along with a check that both find the same matches.
+"""
+
+import argparse
+import random
+import time
+from itertools import accumulate
+from typing import List, Optional, Tuple
+
+from benchmarks.load.data import BEDROOM_PRICE_FACTOR, CITIES, city_weights, generate_rows
+
+SearchParams = Tuple[Optional[str], Optional[int], Optional[float], Optional[float], Optional[float]]
+
+
+def generate_searches(count: int, seed: int = 0) -> List[SearchParams]:
+    """
+    (city, min_bedrooms, min_bathrooms, min_price, max_price) of each saved search
+    """
+    rng = random.Random(seed)
+    city_cum_weights = list(accumulate(city_weights()))
+    searches = []
+    for _ in range(count):
+        city, _, rent, _ = rng.choices(CITIES, cum_weights=city_cum_weights)[0]
+        beds = rng.choices(range(len(BEDROOM_PRICE_FACTOR)), [0.1, 0.4, 0.3, 0.15, 0.05])[0]
+        price = round(rent * BEDROOM_PRICE_FACTOR[beds] * rng.uniform(0.9, 1.4), -2)
+        searches.append((
+            city if rng.random() < 0.95 else None,
+            beds if rng.random() < 0.6 else None,
+            rng.choice([1.0, 1.5, 2.0]) if rng.random() < 0.15 else None,
+            round(price * 0.7, -2) if rng.random() < 0.2 else None,
+            price if rng.random() < 0.85 else None,
+        ))
+    return searches
+
+
+def matches_linear(searches: List[SearchParams], city, bedrooms, bathrooms, price) -> List[int]:
+    """
+    Ids of the matching searches, checking every one
+    """
+    city = city.lower()
+    return [
+        search_id
+        for search_id, (search_city, min_bedrooms, min_bathrooms, min_price, max_price) in enumerate(searches)
+        if (search_city is None or search_city.lower() == city)
+        and (min_bedrooms is None or (bedrooms is not None and bedrooms >= min_bedrooms))
+        and (min_bathrooms is None or (bathrooms is not None and bathrooms >= min_bathrooms))
+        and (min_price is None or price >= min_price)
+        and (max_price is None or price <= max_price)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=1000000, help="Saved searches to index")
+    parser.add_argument("--listings", type=int, default=2000, help="Listings to match")
+    parser.add_argument("--verify", type=int, default=20, help="Listings also matched by checking every search")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.scraper.saved_searches import SavedSearchIndex
+
+    searches = generate_searches(args.searches, args.seed)
+    # (city, bedrooms, bathrooms, price) in LISTING_COLUMNS order
+    listings = [
+        (row[9], row[5], row[6], row[4])
+        for row, _ in generate_rows(args.listings, seed=args.seed + 1)
+    ]
+
+    index = SavedSearchIndex()
+    started = time.perf_counter()
+    for search_id, params in enumerate(searches):
+        index.add(search_id, *params)
+    added = time.perf_counter() - started
+    # Trees are built on their first lookup
+    started = time.perf_counter()
+    for listing in listings[:200]:
+        index.match(*listing)
+    built = time.perf_counter() - started
+    print(f"Indexed {len(index)} saved searches in {added:.1f}s, trees built in {built:.1f}s")
+
+    started = time.perf_counter()
+    matched = sum(len(index.match(*listing)) for listing in listings)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Matched {len(listings)} listings in {elapsed:.2f}s: {len(listings) / elapsed:,.0f} listings/s, "
+        f"{elapsed / len(listings) * 1e6:.0f}us per listing, {matched / len(listings):.0f} matches per listing"
+    )
+
+    if args.verify:
+        sample = listings[:args.verify]
+        started = time.perf_counter()
+        expected = [matches_linear(searches, *listing) for listing in sample]
+        linear = time.perf_counter() - started
+        started = time.perf_counter()
+        found = [index.match(*listing) for listing in sample]
+        indexed = time.perf_counter() - started
+        mismatches = sum(sorted(result) != wanted for result, wanted in zip(found, expected))
+        print(
+            f"Checking every search: {linear / len(sample) * 1000:.0f}ms per listing, "
+            f"{linear / indexed:,.0f}x slower; {mismatches} of {len(sample)} listings matched differently"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Run ZillowScraper end to end against replayed result pages, fully offline.
+
+Usage:
+    python -m benchmarks.scraper_end_to_end [--sizes 10,100,1000] [--cards N] [--parse-workers N]
+    python -m benchmarks.scraper_end_to_end --corpus DIR
+
+Each size gets a synthetic corpus of that many recorded pages (10 per city)
+and a fresh SQLite database, unless --database-url is given. Pages are
+replayed through the scraper's normal fetch path, parsed, and ingested by
+BaseScraper.run(). Every run happens in its own process so peak RSS is per
+run; it and the CPU time per card cover the scraper process, not its parse
+worker processes.
+
+--corpus replays pages recorded with `scripts/run_scrapers.py --fetch-mode record`
+(DIR is the recordings directory) for the configured SCRAPER_CITIES.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+PAGES_PER_CITY = 10
+
+
+def corpus_cities(pages: int) -> List[str]:
+    """
+    City slugs of a synthetic corpus
+    """
+    return [f"bench{i}-wa" for i in range(math.ceil(pages / PAGES_PER_CITY))]
+
+
+def build_corpus(directory: str, pages: int, cards: int):
+    """
+    Record synthetic result pages as if a crawl of the corpus cities had fetched them
+    """
+    from app.scraper.replay import PageStore
+    from app.scraper.zillow_scraper import ZillowScraper
+    from benchmarks.sample_pages import make_sample_page
+
+    scraper = ZillowScraper()
+    store = PageStore(os.path.join(directory, scraper.source_name))
+    cities = corpus_cities(pages)
+    for index in range(pages):
+        city = cities[index // PAGES_PER_CITY]
+        page = index % PAGES_PER_CITY + 1
+        store.save(scraper._page_url(city, page), make_sample_page(cards, seed=index, city=city))
+
+
+async def run_scraper(cities: List[str]) -> dict:
+    """
+    Run the scraper once and measure it (inside the run's own process)
+    """
+    from app.core.config import settings
+    from app.db.models import Base
+    from app.db.session import async_engine
+    from app.scraper.zillow_scraper import ZillowScraper
+
+    class TimedZillowScraper(ZillowScraper):
+        """
+        ZillowScraper that counts pages and times their ingestion
+        """
+
+        pages = 0
+        ingest_seconds = 0.0
+
+        async def _ingest_page(self, city, listings, session):
+            started = time.perf_counter()
+            await super()._ingest_page(city, listings, session)
+            self.ingest_seconds += time.perf_counter() - started
+            self.pages += 1
+
+    settings.SCRAPER_CITIES = cities
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    scraper = TimedZillowScraper()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    await scraper.run()
+    elapsed = time.perf_counter() - started
+    cpu_seconds = time.process_time() - cpu_started
+    await async_engine.dispose()
+
+    log = scraper.scraper_log
+    if not log["success"]:
+        raise RuntimeError(log.get("error_message"))
+    return {
+        "pages": scraper.pages,
+        "cards": log["listings_found"],
+        "rows": log["listings_added"] + log["listings_updated"],
+        "seconds": elapsed,
+        "ingest_seconds": scraper.ingest_seconds,
+        "cpu_seconds": cpu_seconds,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_in_process(corpus: str, cities: List[str], args) -> dict:
+    """
+    Measure one run in a fresh process configured to replay the corpus
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            SCRAPER_FETCH_MODE="replay",
+            SCRAPER_RECORDINGS_DIR=corpus,
+            SCRAPER_PARSE_WORKERS=str(args.parse_workers),
+            SCRAPER_MAX_PAGES=str(args.max_pages),
+            SCRAPER_ADAPTIVE_INTERVALS="false",
+            DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        )
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.scraper_end_to_end", "--run", json.dumps(cities)],
+            env=env,
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def report(label: str, result: dict):
+    seconds = result["seconds"]
+    ingest_seconds = result["ingest_seconds"] or float("nan")
+    print(
+        f"{label:>8} {result['pages']:>7} {result['pages'] / seconds:>9.1f} {result['cards'] / seconds:>9.1f} "
+        f"{result['rows'] / ingest_seconds:>10.1f} {result['cpu_seconds'] / result['cards'] * 1000:>12.3f} "
+        f"{result['peak_rss_mb']:>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma-separated corpus sizes in pages")
+    parser.add_argument("--cards", type=int, default=40, help="Listing cards per synthetic page")
+    parser.add_argument("--parse-workers", type=int, default=2, help="SCRAPER_PARSE_WORKERS for the runs")
+    parser.add_argument("--corpus", help="Replay this recordings directory instead of synthetic corpora")
+    parser.add_argument("--database-url", help="Ingest into this database instead of a fresh SQLite file")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Inside a measured run process; the environment already selects replay
+        logging.disable(logging.INFO)
+        print(json.dumps(asyncio.run(run_scraper(json.loads(args.run)))))
+        return
+
+    print(f"parse workers={args.parse_workers}")
+    print(f"{'corpus':>8} {'pages':>7} {'pages/s':>9} {'cards/s':>9} {'ingest/s':>10} {'CPU ms/card':>12} {'RSS MB':>9}")
+
+    if args.corpus:
+        from app.core.config import settings
+
+        args.max_pages = settings.SCRAPER_MAX_PAGES
+        report("recorded", run_in_process(os.path.abspath(args.corpus), settings.SCRAPER_CITIES, args))
+        return
+
+    args.max_pages = PAGES_PER_CITY
+    for size in (int(size) for size in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as corpus:
+            build_corpus(corpus, size, args.cards)
+            report(str(size), run_in_process(corpus, corpus_cities(size), args))
+
+
+if __name__ == "__main__":
+    main()
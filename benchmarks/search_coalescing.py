@@ -0,0 +1,161 @@
+"""
+Load-test listing lookups under bursts of identical searches, with and without coalescing.
+
+Usage:
+    python -m benchmarks.search_coalescing [--listings N] [--bursts N] [--burst-size N] [--distinct N]
+    python -m benchmarks.search_coalescing --database-url URL
+
+Each burst fires --burst-size concurrent lookups at once, drawn from
+--distinct filter sets with a skewed popularity (a few searches make up most
+of a spike). The lookups go through the same coalesced path as /api/search
+and /api/listings. Database statements are counted at the engine, so the
+report shows how many round trips the same workload costs either way.
+Without --database-url a temporary SQLite database is seeded with --listings rows.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+CITIES = ["Seattle", "Portland", "San Francisco", "Oakland", "Los Angeles", "Chicago", "New York", "Boston"]
+
+
+def filter_sets(distinct: int, seed: int = 0):
+    """
+    Distinct search filters, most popular first
+    """
+    rng = random.Random(seed)
+    sets = []
+    seen = set()
+    while len(sets) < distinct:
+        filters = {"city": rng.choice(CITIES), "max_price": rng.randrange(1500, 6000, 250)}
+        if rng.random() < 0.5:
+            filters["min_bedrooms"] = rng.randint(0, 3)
+        key = tuple(sorted(filters.items()))
+        if key not in seen:
+            seen.add(key)
+            sets.append(filters)
+    return sets
+
+
+async def seed_listings(count: int):
+    """
+    Create the tables and fill them with synthetic listings
+    """
+    from sqlalchemy import insert
+
+    from app.db.models import Base, Listing
+    from app.db.session import async_engine
+
+    rng = random.Random(0)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(0, count, 5000):
+            await conn.execute(insert(Listing), [
+                {
+                    "title": f"Listing {index}",
+                    "url": f"https://example.com/listing/{index}",
+                    "price": rng.randrange(1000, 7000, 25),
+                    "bedrooms": rng.randint(0, 4),
+                    "bathrooms": rng.choice([1, 1.5, 2, 3]),
+                    "city": rng.choice(CITIES),
+                    "state": "WA",
+                    "source": "benchmark",
+                    "is_available": True,
+                }
+                for index in range(start, min(start + 5000, count))
+            ])
+
+
+async def run_bursts(workload, burst_size: int, coalescing: bool) -> dict:
+    """
+    Run every burst of the workload and measure it
+    """
+    from sqlalchemy import event
+
+    from app.api.search import find_listings, listings_flight
+    from app.core.config import settings
+    from app.db.session import async_engine
+
+    settings.SEARCH_COALESCING = coalescing
+    statements = 0
+
+    def count_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    executed_before = listings_flight.executed
+    latencies = []
+
+    async def request(filters):
+        started = time.perf_counter()
+        await find_listings(filters, limit=100)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for burst in workload:
+        await asyncio.gather(*(request(filters) for filters in burst))
+    elapsed = time.perf_counter() - started
+    event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "lookups": listings_flight.executed - executed_before,
+        "statements": statements,
+        "seconds": elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+async def run(args):
+    from app.db.session import async_engine
+
+    if not args.database_url:
+        await seed_listings(args.listings)
+
+    rng = random.Random(args.seed)
+    searches = filter_sets(args.distinct, args.seed)
+    # Zipf-like popularity: the i-th search is 1/(i+1) as likely as the first
+    weights = [1 / (rank + 1) for rank in range(len(searches))]
+    workload = [rng.choices(searches, weights, k=args.burst_size) for _ in range(args.bursts)]
+
+    # Warm the connection pool and the database cache before measuring
+    await run_bursts(workload[:1], args.burst_size, coalescing=False)
+
+    print(f"{args.bursts} bursts of {args.burst_size} concurrent searches over {args.distinct} distinct filter sets")
+    print(f"{'coalescing':>10} {'requests':>9} {'lookups':>8} {'DB stmts':>9} {'req/s':>8} {'DB QPS':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for coalescing in (False, True):
+        result = await run_bursts(workload, args.burst_size, coalescing)
+        print(
+            f"{'on' if coalescing else 'off':>10} {result['requests']:>9} {result['lookups']:>8} "
+            f"{result['statements']:>9} {result['requests'] / result['seconds']:>8.0f} "
+            f"{result['statements'] / result['seconds']:>8.0f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}"
+        )
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=50000, help="Synthetic listings to seed")
+    parser.add_argument("--bursts", type=int, default=50)
+    parser.add_argument("--burst-size", type=int, default=200, help="Concurrent searches per burst")
+    parser.add_argument("--distinct", type=int, default=20, help="Distinct searches a burst draws from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="Query this database instead of a seeded SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # The engine is created on import, so the database is chosen first
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
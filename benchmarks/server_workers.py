@@ -0,0 +1,233 @@
+"""
+Measure per-worker memory and aggregate throughput of the gunicorn server at several worker counts.
+
+Usage:
+    python -m benchmarks.server_workers --database-url URL [--workers 1,4,8] [--requests N] [--concurrency N]
+    python -m benchmarks.server_workers --database-url URL --no-preload
+    python -m benchmarks.server_workers --database-url URL --markdown results.md
+
+For each worker count, gunicorn is started with gunicorn.conf.py, warmed up
+and driven with the load test's request mix (see benchmarks.load.run). Load
+the database first with `python -m benchmarks.load.data`. Once the run ends,
+memory of every process is read from /proc/<pid>/smaps_rollup (Linux only):
+
+- RSS counts every page a process maps, including pages shared with the
+  master and other workers, so summing it overstates the total.
+- PSS splits shared pages evenly between the processes sharing them; the sum
+  over master and workers is the server's real footprint.
+- USS counts only the pages private to a process, what each extra worker costs.
+
+--no-preload loads the app in every worker instead of the master, to compare
+the two. --markdown appends the results as a table for docs/deployment.md.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.load.run import build_requests, current_commit, drive, summarize
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory(pid: int) -> Dict[str, int]:
+    """
+    RSS, PSS and USS of a process in kB
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def children(pid: int) -> List[int]:
+    """
+    Process ids of the direct children of a process
+    """
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # The command name can contain spaces, so fields are counted after its closing parenthesis
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def start_server(workers: int, port: int, preload: bool, database_url: str) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=database_url, GUNICORN_PRELOAD=str(preload).lower())
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "app.main:app",
+            "--config", os.path.join(PROJECT_ROOT, "gunicorn.conf.py"),
+            "--workers", str(workers),
+            "--bind", f"127.0.0.1:{port}",
+            # Recycling mid-run would count a worker's startup in the results
+            "--max-requests", "0",
+            "--access-logfile", os.devnull,
+        ],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+
+
+def wait_until_ready(server: subprocess.Popen, url: str, workers: int, timeout: float):
+    """
+    Wait until every worker has been forked and the server answers
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {server.returncode}")
+        if len(children(server.pid)) >= workers:
+            try:
+                if httpx.get(f"{url}/metrics", timeout=5).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.5)
+    raise SystemExit(f"gunicorn wasn't ready after {timeout:.0f}s")
+
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def measure(workers: int, args, requests) -> Dict[str, float]:
+    """
+    Throughput, latency and memory of a server with a number of workers
+    """
+    url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port, not args.no_preload, args.database_url)
+    try:
+        wait_until_ready(server, url, workers, args.startup_timeout)
+        asyncio.run(drive(url, requests[:args.warmup], args.concurrency, args.timeout))
+        latencies, errors, elapsed = asyncio.run(drive(url, requests[args.warmup:], args.concurrency, args.timeout))
+        overall = summarize(latencies, errors, elapsed)["all"]
+
+        master = memory(server.pid)
+        worker_memory = [memory(pid) for pid in children(server.pid)]
+    finally:
+        stop_server(server)
+
+    def mean(key):
+        return sum(usage[key] for usage in worker_memory) / len(worker_memory) / 1024
+
+    return {
+        "workers": workers,
+        "rps": overall["rps"],
+        "p50_ms": overall["p50_ms"],
+        "p99_ms": overall["p99_ms"],
+        "errors": overall["errors"],
+        "master_rss_mb": master["rss"] / 1024,
+        "worker_rss_mb": mean("rss"),
+        "worker_pss_mb": mean("pss"),
+        "worker_uss_mb": mean("uss"),
+        "total_pss_mb": (master["pss"] + sum(usage["pss"] for usage in worker_memory)) / 1024,
+    }
+
+
+def write_markdown(path: str, results: List[Dict[str, float]], args):
+    """
+    Append results as a Markdown table, headed by the commit and the settings they were measured with
+    """
+    lines = [
+        f"{'Loaded per worker' if args.no_preload else 'Preloaded'}, commit {current_commit()}, "
+        f"{len(os.sched_getaffinity(0))} cores, {args.requests} requests, {args.concurrency} concurrent, "
+        f"{args.search_share:.0%} searches:",
+        "",
+        "| Workers | req/s | p50 ms | p99 ms | Worker RSS MB | Worker USS MB | Total PSS MB |",
+        "|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for result in results:
+        lines.append(
+            f"| {result['workers']} | {result['rps']:.0f} | {result['p50_ms']:.0f} | {result['p99_ms']:.0f} "
+            f"| {result['worker_rss_mb']:.0f} | {result['worker_uss_mb']:.0f} | {result['total_pss_mb']:.0f} |"
+        )
+    with open(path, "a") as output:
+        output.write("\n".join(lines) + "\n\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True, help="Database loaded with benchmarks.load.data")
+    parser.add_argument(
+        "--workers",
+        default=f"1,4,{len(os.sched_getaffinity(0))}",
+        help="Comma separated worker counts (default: 1, 4 and one per available core)",
+    )
+    parser.add_argument("--no-preload", action="store_true", help="Load the app in each worker instead of the master")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests to send after warm-up")
+    parser.add_argument("--warmup", type=int, default=500, help="Requests sent first and not measured")
+    parser.add_argument("--search-share", type=float, default=0.5, help="Fraction of requests to /api/search")
+    parser.add_argument("--pool-size", type=int, default=2000, help="Distinct queries requests are drawn from")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as an error")
+    parser.add_argument("--startup-timeout", type=float, default=180.0, help="Seconds to wait for the server to start")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Save the results to this JSON file")
+    parser.add_argument("--markdown", help="Append the results as a Markdown table to this file")
+    args = parser.parse_args()
+
+    worker_counts = sorted({int(count) for count in args.workers.split(",")})
+    requests = build_requests(args.warmup + args.requests, args.search_share, args.pool_size, args.seed)
+
+    print(
+        f"{args.requests} requests, {args.concurrency} concurrent, {args.search_share:.0%} searches, "
+        f"app {'loaded per worker' if args.no_preload else 'preloaded'}"
+    )
+    print(
+        f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'master RSS':>11} "
+        f"{'worker RSS':>11} {'worker PSS':>11} {'worker USS':>11} {'total PSS':>10}"
+    )
+    results = []
+    for workers in worker_counts:
+        result = measure(workers, args, requests)
+        results.append(result)
+        print(
+            f"{workers:>7} {result['rps']:>9.1f} {result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+            f"{result['errors']:>7} {result['master_rss_mb']:>9.0f}MB {result['worker_rss_mb']:>9.0f}MB "
+            f"{result['worker_pss_mb']:>9.0f}MB {result['worker_uss_mb']:>9.0f}MB {result['total_pss_mb']:>8.0f}MB",
+            flush=True,
+        )
+
+    if args.markdown:
+        write_markdown(args.markdown, results, args)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "commit": current_commit(),
+                "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "database_url")},
+                "results": results,
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Gunicorn settings for serving the API in production.
+
+Run with `gunicorn app.main:app` from the project root, where gunicorn picks
+this file up. The app and the spaCy model are loaded once in the master
+before workers are forked (GUNICORN_PRELOAD=false loads them in each worker
+instead). How much memory and throughput that changes hasn't been measured
+yet; `python -m benchmarks.server_workers` compares the two.
+
+`kill -HUP <master pid>` replaces the workers gracefully. Because the app is
+preloaded, new code needs a new master: send USR2 to start one, then QUIT
+to the old master once the new workers are up (or restart the container).
+"""
+
+import gc
+import os
+
+# Uvicorn workers run the ASGI app
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# One worker per available core; WEB_CONCURRENCY overrides it
+workers = int(os.getenv("WEB_CONCURRENCY", 0)) or len(os.sched_getaffinity(0))
+
+# Load the app in the master before forking
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle workers after a number of requests, staggered so they don't all restart together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 200))
+
+# Seconds a silent worker lives before it is killed, and a stopping worker gets to finish its requests
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    """
+    Load the spaCy model and location index in the master, before workers are forked
+    """
+    if not preload_app:
+        return
+
+    from app.nlp.processor import get_nlp_processor
+
+    get_nlp_processor()
+    # Move everything loaded so far to the permanent generation, which
+    # collections in the workers don't scan
+    gc.collect()
+    gc.freeze()
+    server.log.info("Loaded the NLP processor before forking workers")
+
+
+def post_fork(server, worker):
+    """
+    Give each worker its own database connections
+    """
+    if not preload_app:
+        return
+
+    from app.db.session import async_engine, engine
+
+    # Connections opened in the master must not be shared across processes
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,209 @@
+"""Add the scraping, deduplication, search and history tables and columns
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-19
+
+Brings a database created by scripts/create_tables.py before migrations
+existed (listings, amenities and scraper_logs only) up to the models. New
+databases get the current tables from scripts/create_tables.py, which
+stamps this revision, so it only runs on older ones.
+
+On PostgreSQL, listing_history is range partitioned by month, with the
+partitions of the current months created as create_all creates them.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from app.db.partitions import create_history_partitions_ddl
+
+revision = "0000"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _id_column():
+    return sa.Column("id", sa.Integer(), primary_key=True)
+
+
+def upgrade():
+    # Columns and indexes of the original tables; SQLite can only add
+    # foreign keys by copying the table, which batch mode does
+    with op.batch_alter_table("listings") as batch:
+        batch.add_column(sa.Column("canonical_id", sa.Integer()))
+        batch.add_column(sa.Column("minhash", sa.LargeBinary()))
+        batch.create_foreign_key("listings_canonical_id_fkey", "listings", ["canonical_id"], ["id"])
+        batch.create_index("ix_listings_url", ["url"])
+        batch.create_index("ix_listings_updated_at", ["updated_at"])
+        batch.create_index("ix_listings_canonical_id", ["canonical_id"])
+    op.add_column("amenities", sa.Column("state", sa.String()))
+    op.execute(
+        "UPDATE amenities SET state = "
+        "(SELECT listings.state FROM listings WHERE listings.id = amenities.listing_id)"
+    )
+    op.add_column("scraper_logs", sa.Column("city", sa.String()))
+    op.create_index("ix_scraper_logs_city", "scraper_logs", ["city"])
+
+    op.create_table(
+        "listing_lsh_buckets",
+        _id_column(),
+        sa.Column("listing_id", sa.Integer(), sa.ForeignKey("listings.id"), nullable=False),
+        sa.Column("band", sa.Integer(), nullable=False),
+        sa.Column("bucket", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_listing_lsh_buckets_id", "listing_lsh_buckets", ["id"])
+    op.create_index("ix_listing_lsh_buckets_listing_id", "listing_lsh_buckets", ["listing_id"])
+    op.create_index("ix_listing_lsh_buckets_lookup", "listing_lsh_buckets", ["band", "bucket"])
+
+    op.create_table(
+        "city_crawl_stats",
+        _id_column(),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("crawls", sa.Integer()),
+        sa.Column("change_rate", sa.Float()),
+        sa.Column("listings_found", sa.Integer()),
+        sa.Column("interval_hours", sa.Float()),
+        sa.Column("last_crawled_at", sa.DateTime()),
+        sa.Column("next_crawl_at", sa.DateTime()),
+        sa.Column("pending_started_at", sa.DateTime()),
+        sa.Column("pending_found", sa.Integer()),
+        sa.Column("pending_added", sa.Integer()),
+        sa.Column("pending_updated", sa.Integer()),
+        sa.UniqueConstraint("source", "city", name="uq_city_crawl_stats_source_city"),
+    )
+    op.create_index("ix_city_crawl_stats_id", "city_crawl_stats", ["id"])
+    op.create_index("ix_city_crawl_stats_next_crawl_at", "city_crawl_stats", ["next_crawl_at"])
+
+    op.create_table(
+        "scraper_checkpoints",
+        _id_column(),
+        sa.Column("source", sa.String(), nullable=False, unique=True),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("page", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_scraper_checkpoints_id", "scraper_checkpoints", ["id"])
+
+    op.create_table(
+        "scrape_jobs",
+        _id_column(),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("page", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime()),
+        sa.Column("lease_expires_at", sa.DateTime()),
+        sa.Column("worker_id", sa.String()),
+        sa.Column("listings_found", sa.Integer()),
+        sa.Column("last_error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.UniqueConstraint("source", "city", "page", name="uq_scrape_jobs_source_city_page"),
+    )
+    op.create_index("ix_scrape_jobs_id", "scrape_jobs", ["id"])
+    op.create_index("ix_scrape_jobs_claim", "scrape_jobs", ["status", "next_attempt_at"])
+
+    op.create_table(
+        "host_rate_limits",
+        sa.Column("host", sa.String(), primary_key=True),
+        sa.Column("next_allowed_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "search_queries",
+        _id_column(),
+        sa.Column("query", sa.String(), nullable=False, unique=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("last_searched_at", sa.DateTime()),
+    )
+    op.create_index("ix_search_queries_id", "search_queries", ["id"])
+    op.create_index("ix_search_queries_last_searched_at", "search_queries", ["last_searched_at"])
+
+    op.create_table(
+        "precomputed_searches",
+        _id_column(),
+        sa.Column("generation", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("body", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+        sa.UniqueConstraint("generation", "query"),
+    )
+    op.create_index("ix_precomputed_searches_id", "precomputed_searches", ["id"])
+
+    op.create_table(
+        "saved_searches",
+        _id_column(),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("owner_token_hash", sa.String(), nullable=False),
+        sa.Column("city", sa.String()),
+        sa.Column("min_bedrooms", sa.Integer()),
+        sa.Column("min_bathrooms", sa.Float()),
+        sa.Column("min_price", sa.Float()),
+        sa.Column("max_price", sa.Float()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_saved_searches_id", "saved_searches", ["id"])
+    op.create_index("ix_saved_searches_updated_at", "saved_searches", ["updated_at"])
+
+    op.create_table(
+        "saved_search_matches",
+        _id_column(),
+        sa.Column("saved_search_id", sa.Integer(), sa.ForeignKey("saved_searches.id"), nullable=False),
+        sa.Column("listing_id", sa.Integer(), sa.ForeignKey("listings.id"), nullable=False),
+        sa.Column("matched_at", sa.DateTime()),
+        sa.Column("delivered_at", sa.DateTime()),
+        sa.UniqueConstraint("saved_search_id", "listing_id", name="uq_saved_search_matches_search_listing"),
+    )
+    op.create_index("ix_saved_search_matches_id", "saved_search_matches", ["id"])
+    op.create_index("ix_saved_search_matches_pending", "saved_search_matches", ["saved_search_id", "delivered_at"])
+
+    history = op.create_table(
+        "listing_history",
+        sa.Column("listing_id", sa.Integer(), sa.ForeignKey("listings.id"), primary_key=True),
+        sa.Column("recorded_at", sa.DateTime(), primary_key=True),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("previous_price", sa.Float()),
+        sa.Column("is_available", sa.Boolean()),
+        postgresql_partition_by="RANGE (recorded_at)",
+    )
+    create_history_partitions_ddl(history, op.get_bind())
+    op.create_index(
+        "ix_listing_history_price_changes",
+        "listing_history",
+        ["recorded_at", "listing_id", "previous_price"],
+        postgresql_where=sa.text("previous_price IS NOT NULL"),
+        sqlite_where=sa.text("previous_price IS NOT NULL"),
+    )
+
+
+def downgrade():
+    # Partitions go with their table
+    op.drop_table("listing_history")
+    op.drop_table("saved_search_matches")
+    op.drop_table("saved_searches")
+    op.drop_table("precomputed_searches")
+    op.drop_table("search_queries")
+    op.drop_table("host_rate_limits")
+    op.drop_table("scrape_jobs")
+    op.drop_table("scraper_checkpoints")
+    op.drop_table("city_crawl_stats")
+    op.drop_table("listing_lsh_buckets")
+
+    op.drop_index("ix_scraper_logs_city", table_name="scraper_logs")
+    with op.batch_alter_table("scraper_logs") as batch:
+        batch.drop_column("city")
+    with op.batch_alter_table("amenities") as batch:
+        batch.drop_column("state")
+    with op.batch_alter_table("listings") as batch:
+        batch.drop_index("ix_listings_canonical_id")
+        batch.drop_index("ix_listings_updated_at")
+        batch.drop_index("ix_listings_url")
+        batch.drop_constraint("listings_canonical_id_fkey", type_="foreignkey")
+        batch.drop_column("minhash")
+        batch.drop_column("canonical_id")
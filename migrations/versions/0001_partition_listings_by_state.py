@@ -0,0 +1,33 @@
+"""Partition listings and amenities by state
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-19
+
+Only changes PostgreSQL databases, and only with LISTINGS_PARTITIONED=true;
+otherwise the revision is recorded and the tables are left as they are. To
+partition later, set LISTINGS_PARTITIONED=true and run
+`alembic downgrade 0000 && alembic upgrade head`.
+"""
+
+from alembic import op
+
+from app.core.config import settings
+from app.db.partitions import partition_listings_by_state, unpartition_listings
+
+revision = "0001"
+down_revision = "0000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql" and settings.LISTINGS_PARTITIONED:
+        partition_listings_by_state(connection)
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == "postgresql":
+        unpartition_listings(connection)
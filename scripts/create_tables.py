@@ -5,19 +5,31 @@ from pathlib import Path
 # Add the parent directory to sys.path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import create_engine
 from app.db.models import Base
 from app.core.config import settings
 
+ROOT = Path(__file__).parent.parent
+
+# The revision create_all matches; later revisions still need `alembic upgrade head`
+BASELINE_REVISION = "0000"
+
 def create_tables():
     """
-    Create all database tables
+    Create all database tables and record them as migrated to the baseline
     """
     # Create engine
     engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
     
     # Create all tables
     Base.metadata.create_all(engine)
+
+    # Stamp the baseline so alembic only runs the revisions after it
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    command.stamp(config, BASELINE_REVISION)
     
     print("Database tables created successfully")
 
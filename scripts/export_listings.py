@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import gzip
+import sys
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.export import EXPORT_ENCODERS, available_formats, encode_export, get_export_encoder
+from app.db.crud import EXPORT_COLUMNS, get_export_watermark, stream_listing_rows
+from app.db.session import AsyncSessionLocal
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+def read_watermark(path: str):
+    """
+    Watermark saved by the last export, or None before the first one
+    """
+    try:
+        text = Path(path).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return datetime.fromisoformat(text) if text else None
+
+async def export_listings(args) -> int:
+    """
+    Write the listings matching the filters to the output, and return how many were written
+    """
+    encoder = get_export_encoder(args.format, EXPORT_COLUMNS, args.row_group_size)
+    filters = {
+        "city": args.city,
+        "state": args.state,
+        "source": args.source,
+        "min_price": args.min_price,
+        "max_price": args.max_price,
+        "min_bedrooms": args.min_bedrooms,
+        "min_bathrooms": args.min_bathrooms,
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    since = args.since
+    if since is None and args.watermark_file:
+        since = read_watermark(args.watermark_file)
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    if args.compress == "gzip":
+        # Each chunk is compressed as it is written, so memory stays constant
+        output = gzip.GzipFile(fileobj=output, mode="wb", compresslevel=args.compress_level)
+
+    count = 0
+    started = time.perf_counter()
+    until = get_export_watermark()
+    async with AsyncSessionLocal() as session:
+
+        async def batches():
+            nonlocal count
+            async for rows in stream_listing_rows(filters, since, until, session, batch_size=args.batch_size):
+                count += len(rows)
+                yield rows
+
+        try:
+            async for chunk in encode_export(batches(), encoder):
+                output.write(chunk)
+        finally:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Exported {count} listings in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    # Saved only once the export is complete, so a failed export is retried from the same point
+    if args.watermark_file:
+        Path(args.watermark_file).write_text(until.isoformat() + "\n")
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export apartment listings as CSV, NDJSON, Arrow or Parquet")
+    parser.add_argument("--format", choices=list(EXPORT_ENCODERS), default="csv", help="Export file format")
+    parser.add_argument("--output", default="-", help="File to write, or - for stdout")
+    parser.add_argument("--compress", choices=["gzip"], help="Compress the output as it is written")
+    parser.add_argument("--compress-level", type=int, default=6, help="gzip compression level")
+    parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Export only listings updated at or after this time (ISO 8601)",
+    )
+    parser.add_argument(
+        "--watermark-file",
+        help="Export only listings updated since the time saved here, and save the new one when done",
+    )
+    parser.add_argument("--city")
+    parser.add_argument("--state")
+    parser.add_argument("--source")
+    parser.add_argument("--min-price", type=float)
+    parser.add_argument("--max-price", type=float)
+    parser.add_argument("--min-bedrooms", type=int)
+    parser.add_argument("--min-bathrooms", type=float)
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE, help="Listings read per batch")
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=settings.EXPORT_ROW_GROUP_SIZE,
+        help="Rows per Parquet row group or Arrow record batch",
+    )
+    args = parser.parse_args()
+
+    if args.format not in available_formats():
+        parser.error(f"--format {args.format} needs the pyarrow package")
+    
+    asyncio.run(export_listings(args))
@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import sys
+import logging
+from datetime import datetime
+from pathlib import Path
+
+# Add the parent directory to sys.path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.partitions import add_months, create_history_partitions, detach_history_partitions, month_start
+from app.db.session import AsyncSessionLocal
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+async def maintain_partitions(keep_months: int = None):
+    """
+    Create the coming months' listing history partitions, and detach those older than keep_months
+    """
+    async with AsyncSessionLocal() as session:
+        await create_history_partitions(session)
+        if keep_months is not None:
+            before = add_months(month_start(datetime.utcnow()), -keep_months)
+            detached = await detach_history_partitions(before, session)
+            logger.info(f"Detached {len(detached)} listing history partitions: {', '.join(detached) or 'none'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of listing history (PostgreSQL)")
+    parser.add_argument(
+        "--keep-months",
+        type=int,
+        help="Detach partitions of months before the last N; detached tables can then be archived or dropped",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(maintain_partitions(args.keep_months))
+    logger.info("Script completed")
@@ -1,4 +1,6 @@
+import argparse
 import asyncio
+import signal
 import sys
 import os
 import logging
@@ -7,7 +9,11 @@ from pathlib import Path
 # Add the parent directory to sys.path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from app.core.config import settings
+from app.scraper.replay import FETCH_MODES
 from app.scraper.zillow_scraper import ZillowScraper
+from app.scraper.scheduler import ScraperScheduler
+from app.scraper.worker import ScrapeWorker, enqueue_city_jobs
 
 # Set up logging
 logging.basicConfig(
@@ -28,13 +34,78 @@ async def run_zillow_scraper():
     
     logger.info("Zillow scraper completed")
 
+async def run_scheduler():
+    """
+    Run the scraper scheduler until SIGINT or SIGTERM
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    scheduler = ScraperScheduler()
+    await scheduler.start()
+    await stop_event.wait()
+    await scheduler.stop()
+
+async def run_worker(concurrency: int, exit_when_idle: bool):
+    """
+    Process jobs from the shared scrape job table until SIGINT or SIGTERM
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    
+    worker = ScrapeWorker(concurrency=concurrency)
+    await worker.run(stop_event, exit_when_idle=exit_when_idle)
+
 if __name__ == "__main__":
-    logger.info("Starting Zillow scraper script")
+    parser = argparse.ArgumentParser(description="Run apartment listing scrapers")
+    parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Keep running and scrape on the configured schedule instead of once",
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Queue the first page of every configured city as jobs for workers",
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Process queued scrape jobs; run any number of these against the same database",
+    )
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs a worker processes at once")
+    parser.add_argument(
+        "--exit-when-idle",
+        action="store_true",
+        help="Stop the worker once no jobs are due instead of polling for more",
+    )
+    parser.add_argument(
+        "--fetch-mode",
+        choices=FETCH_MODES,
+        help="Fetch live, record fetched pages, or replay recorded pages offline (default: SCRAPER_FETCH_MODE)",
+    )
+    args = parser.parse_args()
     
-    # Create and run event loop
-    loop = asyncio.get_event_loop()
+    if args.fetch_mode:
+        settings.SCRAPER_FETCH_MODE = args.fetch_mode
     
-    # Run Zillow scraper
-    loop.run_until_complete(run_zillow_scraper())
+    if args.enqueue:
+        asyncio.run(enqueue_city_jobs())
+    
+    if args.worker:
+        logger.info("Starting scrape worker")
+        asyncio.run(run_worker(args.concurrency, args.exit_when_idle))
+    elif args.schedule:
+        logger.info("Starting scraper scheduler worker")
+        asyncio.run(run_scheduler())
+    elif not args.enqueue:
+        logger.info("Starting Zillow scraper script")
+        
+        # Run Zillow scraper
+        asyncio.run(run_zillow_scraper())
     
-    logger.info("Script completed") 
\ No newline at end of file
+    logger.info("Script completed")
@@ -0,0 +1,26 @@
+"""
+Shared fixtures. Every test that asks for a session gets a fresh SQLite
+database, chosen before the app creates its engines on import.
+"""
+
+import os
+import tempfile
+
+_database_dir = tempfile.mkdtemp(prefix="nlstayfinder-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
+
+import pytest_asyncio
+
+
+@pytest_asyncio.fixture
+async def session():
+    from app.db.models import Base
+    from app.db.session import AsyncSessionLocal, async_engine
+
+    async with async_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        yield session
+    # Pooled connections belong to this test's event loop
+    await async_engine.dispose()
@@ -0,0 +1,77 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.crud import get_listing_city_counts, get_listings, get_shown_listing_ids
+from app.db.models import Listing
+from app.scraper.dedup import MinHasher, find_duplicate, listing_shingles
+from benchmarks.dedup_quality import _pairs, run, synthetic_corpus
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_precision_and_recall_on_synthetic_corpus(seed):
+    listings = synthetic_corpus(1000, seed)
+    roots, _ = run(listings, num_perm=64, bands=16, threshold=0.5)
+
+    truth_pairs = _pairs(Counter(listing["unit"] for listing in listings).values())
+    predicted_pairs = _pairs(Counter(roots).values())
+    true_pairs = _pairs(Counter((root, listing["unit"]) for root, listing in zip(roots, listings)).values())
+    assert true_pairs / predicted_pairs >= 0.99
+    assert true_pairs / truth_pairs >= 0.95
+
+
+def _candidate(listing_id, title, address, price=2400, bedrooms=2, square_footage=850, canonical_id=None):
+    signature = MinHasher(64).signature(listing_shingles(title, address, price, bedrooms, square_footage))
+    return SimpleNamespace(
+        id=listing_id, canonical_id=canonical_id, bedrooms=bedrooms, address=address, minhash=signature.tobytes()
+    )
+
+
+def _match(title, address, candidates, price=2400, bedrooms=2, square_footage=850):
+    signature = MinHasher(64).signature(listing_shingles(title, address, price, bedrooms, square_footage))
+    return find_duplicate(signature, bedrooms, address, candidates, 0.5)
+
+
+def test_same_unit_spelled_differently_is_a_duplicate():
+    original = _candidate(1, "2 Bed at 120 Main St", "120 Main St APT 4")
+    match = _match("2 Bed at 120 Main Street", "120 Main Street #4", [original], price=2425, square_footage=850)
+    assert match is original
+
+
+def test_neighbouring_units_and_other_bedrooms_are_not_duplicates():
+    original = _candidate(1, "120 Main St APT 4", "120 Main St APT 4")
+    assert _match("120 Main St APT 5", "120 Main St APT 5", [original]) is None
+    assert _match("122 Main St APT 4", "122 Main St APT 4", [original]) is None
+    assert _match("120 Main St APT 4", "120 Main St APT 4", [original], bedrooms=3) is None
+
+
+def test_most_similar_candidate_wins():
+    close = _candidate(1, "120 Main St APT 4", "120 Main St APT 4")
+    looser = _candidate(2, "Apartment for Rent", "120 Main St. Unit 4", price=2600, square_footage=900)
+    assert _match("120 Main St APT 4", "120 Main St APT 4", [looser, close]) is close
+
+
+@pytest.mark.asyncio
+async def test_duplicate_stands_in_for_unavailable_canonical(session):
+    def listing(listing_id, canonical_id=None, is_available=True):
+        return Listing(
+            id=listing_id, title="2 Bed at 120 Main St", url=f"https://example.com/{listing_id}", price=2400,
+            city="Seattle", state="WA", canonical_id=canonical_id, is_available=is_available,
+        )
+
+    session.add_all([listing(1), listing(2, canonical_id=1), listing(3, canonical_id=1), listing(4)])
+    await session.commit()
+
+    shown = {result["id"] for result in await get_listings({"city": "Seattle"}, session)}
+    assert shown == {1, 4}
+
+    canonical = await session.get(Listing, 1)
+    canonical.is_available = False
+    await session.commit()
+
+    shown = {result["id"] for result in await get_listings({"city": "Seattle"}, session)}
+    assert shown == {2, 4}
+    assert await get_shown_listing_ids([1, 2, 3], session) == {2}
+    counts, _ = await get_listing_city_counts(session=session)
+    assert counts == [("Seattle", "WA", 2)]
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.db.crud import EXPORT_COLUMNS, get_export_watermark, stream_listing_rows
+from app.db.models import Listing
+from app.db.session import AsyncSessionLocal
+
+ID = EXPORT_COLUMNS.index("id")
+
+
+def _listing(listing_id, updated_at):
+    return Listing(
+        id=listing_id, title=f"Listing {listing_id}", url=f"https://example.com/{listing_id}", price=2000,
+        city="Seattle", updated_at=updated_at,
+    )
+
+
+async def _export(since, session):
+    until = get_export_watermark()
+    ids = [row[ID] async for rows in stream_listing_rows({}, since, until, session) for row in rows]
+    return ids, until
+
+
+@pytest.mark.asyncio
+async def test_update_committed_during_an_export_is_in_the_next_one(session, monkeypatch):
+    monkeypatch.setattr(settings, "CHANGE_WATERMARK_LAG_SECONDS", 1)
+    now = datetime.utcnow()
+    session.add(_listing(1, now - timedelta(seconds=10)))
+    # Stamped after the upsert below, but committed before it
+    session.add(_listing(3, now - timedelta(seconds=0.2)))
+    await session.commit()
+
+    async with AsyncSessionLocal() as writer:
+        # An upsert stamps its listings, then takes a while to commit, while an export runs
+        writer.add(_listing(2, now - timedelta(seconds=0.5)))
+        await writer.flush()
+        exported, watermark = await _export(None, session)
+        assert exported == [1]
+
+        await writer.commit()
+
+    await asyncio.sleep(1)
+    exported, watermark = await _export(watermark, session)
+    assert exported == [2, 3]
+
+    listing = await session.get(Listing, 1)
+    listing.updated_at = datetime.utcnow()
+    await session.commit()
+    await asyncio.sleep(1)
+    exported, _ = await _export(watermark, session)
+    # Each update is exported once
+    assert exported == [1]
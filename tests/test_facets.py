@@ -0,0 +1,69 @@
+import pytest
+
+from app.db.crud import FACET_COLUMNS, _facet_rows_query, get_listing_facets
+from app.db.models import Listing
+
+PRICE_EDGES = [1000, 2000]
+
+
+def _listing(listing_id, city, price, bedrooms, bathrooms, **columns):
+    return Listing(
+        id=listing_id, title=f"Listing {listing_id}", url=f"https://example.com/{listing_id}", city=city,
+        price=price, bedrooms=bedrooms, bathrooms=bathrooms, **columns,
+    )
+
+
+async def _seed(session):
+    session.add_all([
+        _listing(1, "Seattle", 900, 1, 1.0),
+        _listing(2, "Seattle", 1500, 2, 1.5),
+        _listing(3, "Seattle", 2500, 2, None),
+        # On the edge, so in the bucket above it
+        _listing(4, "Portland", 1000, None, 2.0),
+        _listing(5, "Portland", 1200, 3, 1.0, is_available=False),
+    ])
+    await session.flush()
+    # A duplicate of listing 1, hidden behind it
+    session.add(_listing(6, "Seattle", 900, 1, 1.0, canonical_id=1))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_facets_count_the_listings_shown(session):
+    await _seed(session)
+    facets = await get_listing_facets({}, PRICE_EDGES, session=session)
+    assert facets == {
+        # Listings without bedrooms or bathrooms aren't counted in that facet
+        "bedrooms": [{"value": 1, "count": 1}, {"value": 2, "count": 2}],
+        "bathrooms": [{"value": 1.0, "count": 1}, {"value": 1.5, "count": 1}, {"value": 2.0, "count": 1}],
+        "price": [
+            {"min": None, "max": 1000, "count": 1},
+            {"min": 1000, "max": 2000, "count": 2},
+            {"min": 2000, "max": None, "count": 1},
+        ],
+        "city": [{"value": "Seattle", "count": 3}, {"value": "Portland", "count": 1}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_facets_follow_the_filters_and_city_limit(session):
+    await _seed(session)
+    facets = await get_listing_facets({"min_price": 1000}, PRICE_EDGES, city_limit=1, session=session)
+    assert facets["bedrooms"] == [{"value": 2, "count": 2}]
+    # Empty buckets are left out
+    assert facets["price"] == [{"min": 1000, "max": 2000, "count": 2}, {"min": 2000, "max": None, "count": 1}]
+    assert facets["city"] == [{"value": "Seattle", "count": 2}]
+
+
+def test_grouping_masks_mark_every_column_but_the_one_grouped_on():
+    query = _facet_rows_query({}, PRICE_EDGES, "postgresql")
+    columns = FACET_COLUMNS + ("price",)
+    whens = query.selected_columns[0].whens
+    assert [result.value for _, result in whens] == list(columns)
+    for index, (criterion, _) in enumerate(whens):
+        comparison = criterion.element
+        # GROUPING() gives its first argument the highest bit, set when the
+        # row's grouping set leaves that column out
+        assert str(comparison.left) == f"grouping({', '.join(f'matching.{column}' for column in columns)})"
+        expected = "".join("0" if other == index else "1" for other in range(len(columns)))
+        assert comparison.right.value == int(expected, 2)
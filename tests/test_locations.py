@@ -0,0 +1,112 @@
+import random
+import string
+
+import pytest
+
+from app.nlp.locations import LocationIndex, edit_distance
+
+
+def _osa_distance(source, target):
+    """
+    Optimal string alignment distance by the textbook dynamic program
+    """
+    rows = [[0] * (len(target) + 1) for _ in range(len(source) + 1)]
+    for i in range(len(source) + 1):
+        rows[i][0] = i
+    for j in range(len(target) + 1):
+        rows[0][j] = j
+    for i in range(1, len(source) + 1):
+        for j in range(1, len(target) + 1):
+            cost = source[i - 1] != target[j - 1]
+            rows[i][j] = min(rows[i - 1][j] + 1, rows[i][j - 1] + 1, rows[i - 1][j - 1] + cost)
+            if i > 1 and j > 1 and source[i - 1] == target[j - 2] and source[i - 2] == target[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+    return rows[-1][-1]
+
+
+@pytest.mark.parametrize("source, target, expected", [
+    ("seattle", "seattle", 0),
+    ("seattle", "seatle", 1),
+    ("seattle", "seattlee", 1),
+    ("seattle", "seattke", 1),
+    ("seattle", "saettle", 1),
+    ("seattle", "setale", 2),
+    ("", "abc", 3),
+    ("boston", "austin", 3),
+])
+def test_edit_distance(source, target, expected):
+    assert edit_distance(source, target, 3) == expected
+
+
+def test_edit_distance_stops_past_the_limit():
+    assert edit_distance("seattle", "setale", 1) == 2
+    assert edit_distance("portland", "port", 2) == 3
+    assert edit_distance("boston", "austin", 2) == 3
+
+
+def test_edit_distance_matches_dynamic_program():
+    rng = random.Random(0)
+    for _ in range(2000):
+        source = "".join(rng.choice("abcde") for _ in range(rng.randint(1, 12)))
+        target = "".join(rng.choice("abcde") for _ in range(rng.randint(1, 12)))
+        expected = _osa_distance(source, target)
+        assert edit_distance(source, target, 3) == min(expected, 4)
+
+
+def _index():
+    index = LocationIndex(prefix_length=7, max_distance=2)
+    for name, weight in (
+        ("Seattle", 500), ("San Francisco", 400), ("New York", 600), ("York", 20), ("Austin", 300),
+        ("Boston", 300), ("Cody", 5), ("Parkin", 2), ("Portland", 200), ("Ely", 3),
+    ):
+        index.add(name, weight)
+    return index
+
+
+def test_lookup_tolerates_misspellings_by_length():
+    index = _index()
+    assert index.lookup("seattle") == [("Seattle", 0, 500)]
+    assert index.lookup("Seatle") == [("Seattle", 1, 500)]
+    assert index.lookup("san fransisco") == [("San Francisco", 1, 400)]
+    assert index.lookup("portlnad") == [("Portland", 1, 200)]
+    assert index.lookup("san fransico") == [("San Francisco", 2, 400)]
+    assert index.lookup("potrlnd") == []
+    # Short names are matched exactly, and names under eight characters within one edit
+    assert index.lookup("ely") == [("Ely", 0, 3)]
+    assert index.lookup("eli") == []
+    assert index.lookup("bostn") == [("Boston", 1, 300)]
+    assert index.lookup("bsotn") == []
+    assert index.lookup("seatle", max_distance=0) == []
+    assert index.lookup("".join(random.Random(0).choice(string.ascii_lowercase) for _ in range(10))) == []
+
+
+def test_lookup_ranks_by_distance_then_weight():
+    index = LocationIndex(prefix_length=7, max_distance=2)
+    index.add("Auston", 1)
+    index.add("Austen", 50)
+    index.add("Austin", 10)
+    assert index.lookup("austin", limit=3) == [("Austin", 0, 10)]
+    assert index.lookup("austyn", limit=3) == [("Austen", 1, 50), ("Austin", 1, 10), ("Auston", 1, 1)]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("2 bed in seatle under 3000", "Seattle"),
+    ("apartments near new yrok", "New York"),
+    ("cheap place close to portlnad", "Portland"),
+    ("Seattle 2 bed", "Seattle"),
+    ("studio in york", "York"),
+    ("loft in new york", "New York"),
+])
+def test_find_in_query_resolves_places(query, expected):
+    assert _index().find_in_query(query)[0] == expected
+
+
+@pytest.mark.parametrize("query", [
+    "cozy studio with parking",
+    "2 bed with parking under 3000",
+    "pet friendly cozy loft",
+    "in a cozy building",
+    "sunny 1 bedroom",
+])
+def test_find_in_query_ignores_descriptive_words(query):
+    assert _index().find_in_query(query) is None
@@ -0,0 +1,40 @@
+import threading
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app.core.metrics import MetricsMiddleware
+
+
+class RecordingProfiler:
+    """
+    Stand-in for SlowRequestProfiler that records where captures run
+    """
+
+    threshold_seconds = 0
+
+    def __init__(self):
+        self.captures = []
+
+    def capture(self, name, started, elapsed):
+        self.captures.append((name, threading.current_thread()))
+
+
+@pytest.mark.asyncio
+async def test_slow_request_profile_is_captured_off_the_event_loop():
+    async def hello(request):
+        return PlainTextResponse("hello")
+
+    profiler = RecordingProfiler()
+    app = MetricsMiddleware(Starlette(routes=[Route("/hello", hello)]), profiler=profiler)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/hello")
+
+    assert response.status_code == 200
+    assert "total;dur=" in response.headers["server-timing"]
+    [(name, thread)] = profiler.captures
+    assert name == "GET /hello"
+    assert thread is not threading.current_thread()
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+
+from app.api.precomputed import PrecomputedSearches
+from app.search.warmup import serialize_search
+
+
+def _searches():
+    searches = PrecomputedSearches()
+    searches._bodies = {"2 bed in new york": serialize_search({"city": "New York", "min_bedrooms": 2}, [])}
+    return searches
+
+
+def test_body_answers_queries_lower_casing_to_the_query_parsed():
+    searches = _searches()
+    body = searches.get("2 Bed in New York")
+    assert json.loads(body) == {
+        "query": "2 Bed in New York",
+        "parameters": {"city": "New York", "min_bedrooms": 2},
+        "results": [],
+        "count": 0,
+    }
+    assert searches.get("2 bed in new york") is not None
+
+
+def test_search_answers_streamed_queries_with_the_parameters_and_first_page():
+    searches = _searches()
+    assert searches.get_search("2 Bed in New York") == ({"city": "New York", "min_bedrooms": 2}, [])
+    assert searches.get_search("3 bed in new york") is None
+    assert (searches.hits, searches.misses) == (1, 1)
+
+
+def test_other_spacing_is_parsed_again():
+    searches = _searches()
+    # "new  york" isn't the city "new york" to the parser
+    assert searches.get("2 bed in new  york") is None
+    assert searches.get(" 2 bed in new york") is None
+    assert (searches.hits, searches.misses) == (0, 2)
+
+
+def test_scrapers_do_not_import_the_api():
+    modules = subprocess.run(
+        [sys.executable, "-c", "import sys, app.scraper.base; print(' '.join(sys.modules))"],
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    assert "app.search.warmup" in modules
+    assert not [name for name in modules if name.startswith("app.api") or name == "spacy"]
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.crud import get_price_drops
+from app.db.models import Listing, ListingHistory
+
+
+async def _seed(session, listings):
+    now = datetime.utcnow()
+    for listing_id, price, changes, *available in listings:
+        session.add(Listing(
+            id=listing_id, title=f"Listing {listing_id}", url=f"https://example.com/{listing_id}", price=price,
+            city="Seattle", is_available=available[0] if available else True,
+        ))
+        for days_ago, previous_price, new_price in changes:
+            session.add(ListingHistory(
+                listing_id=listing_id, recorded_at=now - timedelta(days=days_ago), price=new_price,
+                previous_price=previous_price,
+            ))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_price_drops_are_measured_from_the_highest_recent_price(session):
+    await _seed(session, [
+        (1, 1600, [(2, 2000, 1600)]),
+        # Dropped twice, from its peak of 3000
+        (2, 1500, [(20, None, 3000), (5, 3000, 2500), (1, 2500, 1500)]),
+        # Unchanged since first seen
+        (3, 2000, [(10, None, 2000)]),
+        (4, 2000, [(3, 1800, 2000)]),
+        # Less than min_drop
+        (5, 1950, [(3, 2000, 1950)]),
+        # Dropped before the period
+        (6, 2000, [(40, 4000, 2000)]),
+        (7, 1000, [(2, 2000, 1000)], False),
+        # Dropped as much as listing 1
+        (8, 2000, [(4, 2500, 2000)]),
+        # Up again after a drop
+        (9, 2200, [(6, 2200, 1500), (2, 1500, 2200)]),
+    ])
+
+    drops = await get_price_drops(min_drop=0.1, days=30, session=session)
+
+    assert [(listing.id, listing.price, peak) for listing, peak in drops] == [
+        (2, 1500, 3000),
+        (1, 1600, 2000),
+        (8, 2000, 2500),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_price_drops_are_limited_to_the_largest(session):
+    await _seed(session, [
+        (1, 1800, [(1, 2000, 1800)]),
+        (2, 1000, [(1, 2000, 1000)]),
+        (3, 1500, [(1, 2000, 1500)]),
+    ])
+    drops = await get_price_drops(min_drop=0.05, days=7, limit=2, session=session)
+    assert [listing.id for listing, _ in drops] == [2, 3]
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from app.scraper.recrawl import allocate_intervals
+
+
+def _freshness(cities, intervals):
+    """
+    Time-averaged fraction of all listings still current
+    """
+    fresh = sum(
+        listings * (1 - math.exp(-rate * intervals[city])) / (rate * intervals[city])
+        for city, (listings, rate) in cities.items()
+    )
+    return fresh / sum(listings for listings, _ in cities.values())
+
+
+def _cost(cities, intervals):
+    return sum(listings / intervals[city] for city, (listings, _) in cities.items())
+
+
+CITIES = {
+    "slow": (400, 0.002),
+    "medium": (300, 0.02),
+    "fast": (200, 0.1),
+    "frantic": (100, 2.0),
+}
+
+
+def test_allocation_spends_the_budget_and_beats_uniform():
+    intervals = allocate_intervals(CITIES, 24, 2, 168)
+    uniform = {city: 24 for city in CITIES}
+
+    assert _cost(CITIES, intervals) == pytest.approx(_cost(CITIES, uniform), rel=1e-3)
+    assert _freshness(CITIES, intervals) > _freshness(CITIES, uniform) + 0.02
+    # A city that changes faster than it can be kept fresh is given up on, within the bounds
+    assert intervals["frantic"] == 168
+    assert intervals["medium"] < intervals["slow"]
+
+
+def test_allocation_keeps_within_bounds():
+    intervals = allocate_intervals({"a": (100, 0.02), "b": (100, 0.03)}, 1, 2, 168)
+    assert intervals == {"a": 2, "b": 2}
+
+    intervals = allocate_intervals({"a": (100, 0.02)}, 1000, 2, 168)
+    assert intervals == {"a": 168}
+
+
+def test_unlearned_cities_keep_the_default_interval():
+    intervals = allocate_intervals({"new": (500, None), "idle": (50, 0.0), "a": (100, 0.02)}, 24, 2, 168)
+    assert intervals["new"] == 24
+    assert intervals["idle"] == 168
+    # The idle city's unspent share goes to the others
+    assert intervals["a"] < 24
@@ -0,0 +1,123 @@
+import random
+import re
+
+from app.scraper.robots import RobotsRules, parse_robots_txt
+
+
+def _reference_allowed(rules, path):
+    """
+    Longest matching pattern decides, Allow winning ties, by regular expressions
+    """
+    best = None
+    for allow, pattern in rules:
+        anchored = pattern.endswith("$")
+        regex = ".*".join(re.escape(part) for part in (pattern[:-1] if anchored else pattern).split("*"))
+        if re.match(regex + ("$" if anchored else ""), path):
+            priority = (len(pattern), allow)
+            if best is None or priority > best:
+                best = priority
+    return best is None or best[1]
+
+
+def test_longest_match_wins():
+    rules = RobotsRules([(False, "/apartments"), (True, "/apartments/seattle"), (False, "/apartments/seattle/old")])
+    assert not rules.is_path_allowed("/apartments/portland")
+    assert rules.is_path_allowed("/apartments/seattle/2-bed")
+    assert not rules.is_path_allowed("/apartments/seattle/old/1")
+    assert rules.is_path_allowed("/about")
+
+
+def test_allow_wins_a_tie():
+    rules = RobotsRules([(False, "/listing"), (True, "/listing")])
+    assert rules.is_path_allowed("/listing/1")
+    rules = RobotsRules([(False, "/*.php"), (True, "/a*.php")])
+    assert rules.is_path_allowed("/a.php")
+
+
+def test_wildcards():
+    rules = RobotsRules([(False, "/*?sort="), (False, "/*.pdf$"), (True, "/search*")])
+    assert not rules.is_path_allowed("/apartments?sort=price")
+    assert rules.is_path_allowed("/apartments?page=2")
+    assert not rules.is_path_allowed("/brochures/floorplan.pdf")
+    # "$" anchors the pattern to the end of the path
+    assert rules.is_path_allowed("/brochures/floorplan.pdf?download=1")
+    # A trailing "*" is a plain prefix match, but counts in the pattern length,
+    # so "/search*" ties with "/*?sort=" and Allow wins
+    assert rules.is_path_allowed("/search")
+    assert rules.is_path_allowed("/search?sort=price")
+
+
+def test_empty_anchored_rule_matches_only_the_root():
+    rules = RobotsRules([(False, "/"), (True, "/$")])
+    assert rules.is_path_allowed("/")
+    assert not rules.is_path_allowed("/index.html")
+
+
+def test_matches_a_regular_expression_reference():
+    generator = random.Random(9309)
+    alphabet = "/ab.*"
+    for _ in range(200):
+        rules = []
+        for _ in range(generator.randint(1, 5)):
+            pattern = "/" + "".join(generator.choice(alphabet) for _ in range(generator.randint(0, 5)))
+            if generator.random() < 0.3:
+                pattern += "$"
+            rules.append((generator.random() < 0.5, pattern))
+        compiled = RobotsRules(rules)
+        for _ in range(20):
+            path = "/" + "".join(generator.choice("/ab.") for _ in range(generator.randint(0, 8)))
+            assert compiled.is_path_allowed(path) == _reference_allowed(rules, path), (rules, path)
+
+
+def test_urls_are_matched_with_their_query_string():
+    rules = RobotsRules([(False, "/*?")])
+    assert rules.is_url_allowed("https://example.com/apartments")
+    assert not rules.is_url_allowed("https://example.com/apartments?page=2")
+    assert rules.is_url_allowed("https://example.com")
+
+
+ROBOTS_TXT = """
+# Comments and unknown fields are ignored
+User-agent: *
+Disallow: /
+
+User-agent: NLStayFinder
+User-agent: OtherBot
+Disallow: /private  # trailing comment
+Crawl-delay: 2.5
+
+User-agent: nlstayfinder-images
+Disallow: /images
+
+User-agent: nlstayfinder
+Allow: /private/listings
+Disallow:
+Crawl-delay: 10
+
+Sitemap: https://example.com/sitemap.xml
+"""
+
+
+def test_the_most_specific_agent_group_is_selected_and_merged():
+    rules = parse_robots_txt(ROBOTS_TXT, "Mozilla/5.0 (compatible; NLStayFinder/1.0)")
+    assert rules.rules == [(False, "/private"), (True, "/private/listings")]
+    assert rules.is_path_allowed("/apartments")
+    assert not rules.is_path_allowed("/private/notes")
+    assert rules.is_path_allowed("/private/listings/1")
+    # The first Crawl-delay of the selected groups applies
+    assert rules.crawl_delay == 2.5
+    assert rules.sitemaps == ["https://example.com/sitemap.xml"]
+
+
+def test_other_agents_fall_back_to_the_star_group():
+    rules = parse_robots_txt(ROBOTS_TXT, "SomeCrawler/2.0")
+    assert not rules.is_path_allowed("/apartments")
+    assert rules.crawl_delay is None
+    rules = parse_robots_txt(ROBOTS_TXT, "NLStayFinder-Images/1.0")
+    assert rules.rules == [(False, "/images")]
+
+
+def test_crawl_delay_parsing():
+    rules = parse_robots_txt("User-agent: *\nCrawl-delay: soon\nCrawl-delay: 3\n", "bot")
+    assert rules.crawl_delay == 3.0
+    assert parse_robots_txt("Crawl-delay: 5\nUser-agent: *\nDisallow: /x\n", "bot").crawl_delay is None
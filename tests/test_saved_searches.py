@@ -0,0 +1,113 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.crud import (
+    add_saved_search_matches,
+    claim_saved_search_matches,
+    create_saved_search,
+    deactivate_saved_search,
+)
+from app.db.models import Listing, SavedSearch
+from app.scraper.saved_searches import IntervalTree, SavedSearchIndex
+
+
+def test_interval_tree_stab_matches_brute_force():
+    rng = random.Random(0)
+    intervals = {}
+    for interval_id in range(500):
+        low = rng.randrange(0, 5000, 50)
+        high = rng.choice([math.inf, low + rng.randrange(0, 3000, 50)])
+        # Searches without a minimum price, as saved searches index them
+        low = rng.choice([-math.inf, low])
+        intervals[interval_id] = (low, high)
+
+    tree = IntervalTree()
+    for interval_id, (low, high) in intervals.items():
+        tree.add(interval_id, low, high)
+    for removed in range(0, 500, 7):
+        tree.remove(removed)
+        del intervals[removed]
+
+    # Endpoints themselves are inside the closed intervals
+    points = [rng.uniform(-100, 8000) for _ in range(200)] + [low for low, _ in intervals.values() if low > -math.inf]
+    for point in points:
+        expected = {interval_id for interval_id, (low, high) in intervals.items() if low <= point <= high}
+        found = tree.stab(point)
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+
+
+def test_interval_tree_rebuilds_after_changes():
+    tree = IntervalTree()
+    assert tree.stab(10) == []
+    tree.add(1, 0, 100)
+    assert tree.stab(10) == [1]
+    tree.add(2, 5, 20)
+    tree.remove(1)
+    assert tree.stab(10) == [2]
+    assert tree.stab(50) == []
+
+
+def test_saved_search_index_match():
+    index = SavedSearchIndex()
+    index.add(1, city="Seattle", max_price=2500)
+    index.add(2, city="seattle ", min_bedrooms=2)
+    index.add(3, min_bathrooms=1.5, min_price=2000, max_price=4000)
+    index.add(4, city="Portland")
+    index.add(5, city="Seattle", min_price=3000, max_price=2000)
+
+    assert sorted(index.match("Seattle", 2, 2.0, 2400)) == [1, 2, 3]
+    assert sorted(index.match("SEATTLE", 1, 1.0, 2400)) == [1]
+    assert sorted(index.match("Seattle", None, None, 3000)) == []
+    assert sorted(index.match("Boise", 3, 2.0, 3000)) == [3]
+    assert sorted(index.match("Portland", None, None, 100)) == [4]
+
+    index.add(1, city="Seattle", max_price=2000)
+    index.remove(2)
+    assert sorted(index.match("Seattle", 2, 2.0, 2400)) == [3]
+    assert len(index) == 3
+
+
+@pytest.mark.asyncio
+async def test_refresh_reads_searches_committed_after_a_later_one(session):
+    index = SavedSearchIndex()
+    session.add(SavedSearch(id=1, query="in seattle", owner_token_hash="x", city="Seattle"))
+    await session.commit()
+    await index.refresh(session)
+    assert index.match("Seattle", None, None, 1000) == [1]
+
+    # Stamped before the refresh above but only committed after it
+    session.add(SavedSearch(
+        id=2, query="in tacoma", owner_token_hash="x", city="Tacoma",
+        updated_at=datetime.utcnow() - timedelta(seconds=5),
+    ))
+    await session.commit()
+    await index.refresh(session)
+    assert index.match("Tacoma", None, None, 1000) == [2]
+
+    saved_search = await session.get(SavedSearch, 1)
+    saved_search.is_active = False
+    await session.commit()
+    await index.refresh(session)
+    assert index.match("Seattle", None, None, 1000) == []
+    assert len(index) == 1
+
+
+@pytest.mark.asyncio
+async def test_owner_token_is_required(session):
+    saved_search = await create_saved_search("in seattle", {"city": "Seattle"}, "secret", session)
+    session.add(Listing(id=1, title="Loft", url="https://example.com/1", price=2000, city="Seattle"))
+    await session.commit()
+    await add_saved_search_matches([(saved_search.id, 1)], session)
+
+    assert saved_search.owner_token_hash != "secret"
+    assert await claim_saved_search_matches(saved_search.id, "guess", session=session) is None
+    assert await deactivate_saved_search(saved_search.id, "guess", session) is False
+
+    matches = await claim_saved_search_matches(saved_search.id, "secret", session=session)
+    assert [listing.id for _, listing in matches] == [1]
+    assert await claim_saved_search_matches(saved_search.id, "secret", session=session) == []
+    assert await deactivate_saved_search(saved_search.id, "secret", session) is True
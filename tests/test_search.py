@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.api.search import listings_flight, stream_search_results
+from app.core.config import settings
+from app.db.models import Listing
+from app.db.session import AsyncSessionLocal
+
+
+async def _seed(session, count):
+    session.add_all(
+        Listing(title=f"Listing {i}", url=f"https://example.com/{i}", price=2000, city="Seattle", state="WA")
+        for i in range(count)
+    )
+    # Not shown in search results
+    session.add(Listing(title="Gone", url="https://example.com/gone", price=2000, city="Seattle", is_available=False))
+    await session.commit()
+
+
+async def _stream(filters, limit, batch_size=50, first_page=None):
+    async with AsyncSessionLocal() as session:
+        batches = [
+            [listing["id"] for listing in listings]
+            async for listings in stream_search_results(
+                filters, session, limit=limit, batch_size=batch_size, first_page=first_page
+            )
+        ]
+    return batches
+
+
+@pytest.mark.asyncio
+async def test_identical_streamed_searches_share_the_first_page(session, monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_COALESCING", True)
+    await _seed(session, 160)
+    before = listings_flight.stats()
+
+    streams = await asyncio.gather(*(_stream({"city": "Seattle"}, limit=130) for _ in range(4)))
+
+    after = listings_flight.stats()
+    assert after["executed"] - before["executed"] == 1
+    assert after["coalesced"] - before["coalesced"] == 3
+    for batches in streams:
+        assert [len(batch) for batch in batches] == [50, 50, 30]
+        ids = [listing_id for batch in batches for listing_id in batch]
+        # The listings after the first page don't repeat any in it
+        assert len(set(ids)) == 130
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_after_a_short_first_page(session):
+    await _seed(session, 30)
+    batches = await _stream({"city": "Seattle"}, limit=500, batch_size=20)
+    assert [len(batch) for batch in batches] == [20, 10]
+
+
+@pytest.mark.asyncio
+async def test_stream_reads_every_listing_past_the_first_page(session):
+    await _seed(session, 240)
+    batches = await _stream({"city": "Seattle"}, limit=1000)
+    ids = [listing_id for batch in batches for listing_id in batch]
+    assert len(ids) == len(set(ids)) == 240
+
+
+@pytest.mark.asyncio
+async def test_precomputed_first_page_is_sent_without_looking_it_up(session):
+    await _seed(session, 130)
+    first_page = [{"id": listing_id} for listing_id in range(1, 101)]
+    before = listings_flight.stats()
+
+    batches = await _stream({"city": "Seattle"}, limit=1000, first_page=first_page)
+
+    assert listings_flight.stats()["executed"] == before["executed"]
+    assert batches[:2] == [list(range(1, 51)), list(range(51, 101))]
+    assert sorted(listing_id for batch in batches[2:] for listing_id in batch) == list(range(101, 131))
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.singleflight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def coalescing(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_COALESCING", True)
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return ["result"]
+
+    waiters = [asyncio.ensure_future(flight.do("key", call)) for _ in range(5)]
+    other = asyncio.ensure_future(flight.do("other", call))
+    await asyncio.sleep(0)
+    assert flight.stats() == {"executed": 2, "coalesced": 4, "in_flight": 2}
+
+    release.set()
+    results = await asyncio.gather(*waiters)
+    assert len(calls) == 2
+    assert all(result is results[0] for result in results)
+    assert await other == ["result"]
+    assert flight.stats() == {"executed": 2, "coalesced": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_an_exception_reaches_every_waiter_and_releases_the_key():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("lookup failed")
+
+    waiters = [asyncio.ensure_future(flight.do("key", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert flight.stats()["in_flight"] == 0
+
+    # A later call runs again rather than reusing the failure
+    async def succeeding():
+        return "ok"
+
+    assert await flight.do("key", succeeding) == "ok"
+    assert flight.stats() == {"executed": 2, "coalesced": 2, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_key_is_released_after_success():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return len(calls)
+
+    assert await flight.do("key", call) == 1
+    assert await flight.do("key", call) == 2
+    assert flight.stats() == {"executed": 2, "coalesced": 0, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_a_caller_going_away_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(flight.do("key", call))
+    second = asyncio.ensure_future(flight.do("key", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "done"
+
+
+@pytest.mark.asyncio
+async def test_calls_run_separately_with_coalescing_off(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_COALESCING", False)
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+
+    waiters = [asyncio.ensure_future(flight.do("key", call)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*waiters)
+    assert len(calls) == 3
+    assert flight.stats() == {"executed": 3, "coalesced": 0, "in_flight": 0}
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.db.crud import add_search_query_counts
+from app.db.models import Listing, SearchQuery
+from app.nlp.suggest import PrefixIndex, SuggestIndex
+
+
+def test_prefix_lookup_returns_best_entries_first():
+    index = PrefixIndex(top_size=3)
+    for key, weight in (("seattle", 50), ("seaside", 5), ("sea tac", 20), ("spokane", 10)):
+        index.set(key, key.title(), weight)
+
+    assert index.lookup("sea", 3) == [(50, "Seattle"), (20, "Sea Tac"), (5, "Seaside")]
+    assert index.lookup("s", 2) == [(50, "Seattle"), (20, "Sea Tac")]
+    assert index.lookup("seat", 3) == [(50, "Seattle")]
+    assert index.lookup("tacoma", 3) == []
+
+
+def test_removal_prunes_empty_nodes():
+    index = PrefixIndex(top_size=3)
+    index.set("seattle", "Seattle", 50)
+    index.set("seaside", "Seaside", 5)
+    index.set("seaside", "", 0)
+
+    assert index.size == 1
+    assert index.lookup("sea", 3) == [(50, "Seattle")]
+    assert index.lookup("seas", 3) == []
+    # Only the edge to the split node and its remaining child are left
+    _, middle = index.root.edges["s"]
+    assert list(middle.edges) == ["t"]
+
+    index.set("seattle", "", 0)
+    assert index.size == 0
+    assert index.root.edges == {}
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_the_most_searched_queries(session, monkeypatch):
+    monkeypatch.setattr(settings, "SUGGEST_MIN_QUERY_COUNT", 1)
+    monkeypatch.setattr(settings, "SUGGEST_MAX_QUERIES", 2)
+    index = SuggestIndex()
+
+    await add_search_query_counts({"studio in seattle": 5, "seattle lofts": 3, "seattle pets": 1}, session)
+    await index.refresh(session)
+    assert index.queries.size == 2
+    assert index.queries.lookup("seattle", 8) == [(3, "seattle lofts")]
+
+    # Searches since the first load are indexed, and the least searched go
+    for _ in range(4):
+        index.record_query("Seattle  Pets")
+    await index.refresh(session)
+    assert index.queries.size == 2
+    assert index.queries.lookup("s", 8) == [(5, "seattle pets"), (5, "studio in seattle")]
+
+
+@pytest.mark.asyncio
+async def test_refresh_reads_rows_committed_after_later_ones(session, monkeypatch):
+    monkeypatch.setattr(settings, "SUGGEST_MIN_QUERY_COUNT", 1)
+    index = SuggestIndex()
+    session.add(Listing(title="Loft", url="https://example.com/1", price=2000, city="Seattle", state="WA"))
+    session.add(SearchQuery(query="seattle lofts", count=3, last_searched_at=datetime.utcnow()))
+    await session.commit()
+    await index.refresh(session)
+    assert index.locations.lookup("seattle", 8) == [(1, "Seattle, WA")]
+
+    # Stamped before the refresh above by another process, but only committed after it
+    earlier = datetime.utcnow() - timedelta(seconds=5)
+    session.add(Listing(
+        title="Flat", url="https://example.com/2", price=1500, city="Tacoma", state="WA", updated_at=earlier,
+    ))
+    session.add(SearchQuery(query="tacoma flats", count=2, last_searched_at=earlier))
+    await session.commit()
+    await index.refresh(session)
+    assert index.locations.lookup("tacoma", 8) == [(1, "Tacoma, WA")]
+    assert index.queries.lookup("tacoma", 8) == [(2, "tacoma flats")]
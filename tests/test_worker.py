@@ -0,0 +1,128 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.crud import claim_scrape_job, enqueue_scrape_jobs
+from app.db.models import Listing, ScrapeJob
+from app.scraper.replay import PageStore
+from app.scraper.worker import ScrapeWorker, enqueue_city_jobs
+from app.scraper.zillow_scraper import ZillowScraper
+from benchmarks.sample_pages import make_sample_page
+
+CITIES = ["alpha-wa", "beta-wa", "gamma-wa", "delta-wa"]
+PAGES_PER_CITY = 3
+CARDS_PER_PAGE = 5
+
+
+class RecordingZillowScraper(ZillowScraper):
+    """
+    ZillowScraper that counts the (source, city, page) of every page it ingests
+    """
+
+    ingested = Counter()
+
+    def __init__(self):
+        super().__init__()
+        self._page_of = {}
+
+    async def scrape_page(self, city, page):
+        listings = await super().scrape_page(city, page)
+        if listings:
+            self._page_of[id(listings)] = page
+        return listings
+
+    async def _ingest_page(self, city, listings, session):
+        await super()._ingest_page(city, listings, session)
+        self.ingested[(self.source_name, city, self._page_of.pop(id(listings)))] += 1
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """
+    Replay a recorded crawl of PAGES_PER_CITY pages of each city
+    """
+    monkeypatch.setattr(settings, "SCRAPER_FETCH_MODE", "replay")
+    monkeypatch.setattr(settings, "SCRAPER_RECORDINGS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SCRAPER_PARSE_WORKERS", 0)
+    monkeypatch.setattr(settings, "SCRAPER_MAX_PAGES", PAGES_PER_CITY + 2)
+    monkeypatch.setattr(settings, "SCRAPER_CITIES", CITIES)
+    monkeypatch.setattr(settings, "SCRAPER_WORKER_POLL_SECONDS", 0.05)
+    RecordingZillowScraper.ingested = Counter()
+
+    scraper = ZillowScraper()
+    store = PageStore(tmp_path / scraper.source_name)
+    for city_index, city in enumerate(CITIES):
+        for page in range(1, PAGES_PER_CITY + 1):
+            seed = city_index * 100 + page
+            store.save(scraper._page_url(city, page), make_sample_page(CARDS_PER_PAGE, seed=seed, city=city))
+    return {"zillow.com": RecordingZillowScraper}
+
+
+@pytest.mark.asyncio
+async def test_workers_ingest_each_page_once(session, replay):
+    await enqueue_city_jobs(["zillow.com"], CITIES)
+
+    workers = [ScrapeWorker(f"worker{i}", factories=replay, concurrency=2) for i in range(4)]
+    await asyncio.wait_for(
+        asyncio.gather(*(worker.run(exit_when_idle=True) for worker in workers)), timeout=120
+    )
+
+    expected = {("zillow.com", city, page) for city in CITIES for page in range(1, PAGES_PER_CITY + 1)}
+    assert set(RecordingZillowScraper.ingested) == expected
+    assert set(RecordingZillowScraper.ingested.values()) == {1}
+
+    jobs = (await session.execute(select(ScrapeJob.status, ScrapeJob.page))).all()
+    assert {status for status, _ in jobs} == {"done"}
+    # The page after the last recorded one ends each city's crawl
+    assert len(jobs) == len(CITIES) * (PAGES_PER_CITY + 1)
+    listings = (await session.execute(select(Listing.url))).scalars().all()
+    assert len(listings) == len(set(listings)) == len(CITIES) * PAGES_PER_CITY * CARDS_PER_PAGE
+    assert sum(worker.jobs_completed for worker in workers) == len(jobs)
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_stops_without_queueing_next_page(session, replay):
+    await enqueue_scrape_jobs("zillow.com", ["alpha-wa"], 1, session)
+    job = await claim_scrape_job("worker0-0", 300, ["zillow.com"], session)
+
+    # The lease expired and another worker took the job over
+    job_row = await session.get(ScrapeJob, job.id)
+    job_row.worker_id = "worker1-0"
+    await session.commit()
+
+    worker = ScrapeWorker("worker0", factories=replay)
+    await worker._process_job(job, RecordingZillowScraper(), "worker0-0")
+
+    session.expire_all()
+    jobs = (await session.execute(select(ScrapeJob))).scalars().all()
+    assert [(job.page, job.status, job.worker_id) for job in jobs] == [(1, "running", "worker1-0")]
+    assert worker.jobs_completed == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_job_fails_after_max_attempts(session):
+    now = datetime.utcnow()
+    session.add_all([
+        ScrapeJob(
+            source="zillow.com", city="alpha-wa", page=1, status="running", attempts=3,
+            worker_id="dead", lease_expires_at=now - timedelta(seconds=1), next_attempt_at=now,
+        ),
+        ScrapeJob(
+            source="zillow.com", city="beta-wa", page=1, status="running", attempts=2,
+            worker_id="dead", lease_expires_at=now - timedelta(seconds=1), next_attempt_at=now,
+        ),
+    ])
+    await session.commit()
+
+    job = await claim_scrape_job("worker0-0", 300, ["zillow.com"], session, max_attempts=3)
+    assert (job.city, job.attempts, job.worker_id) == ("beta-wa", 3, "worker0-0")
+    assert await claim_scrape_job("worker0-0", 300, ["zillow.com"], session, max_attempts=3) is None
+
+    failed = (await session.execute(select(ScrapeJob).where(ScrapeJob.city == "alpha-wa"))).scalar()
+    await session.refresh(failed)
+    assert failed.status == "failed"
+    assert failed.attempts == 3